@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+PVZ Checkpoints - atomic, background saving of agent state
+
+Agents hand save() a snapshot function instead of writing files themselves:
+
+    writer = pvz_checkpoint.writer('q_learning_data.json')
+    writer.save(self._snapshot)          # every Nth call is written
+    data = pvz_checkpoint.load('q_learning_data.json')
+
+The snapshot is taken on the caller's thread, so it must copy whatever the
+agent keeps mutating; encoding and writing happen on a background thread.
+Files are written to a temporary file beside the target and renamed over it,
+so a crash or kill mid-write leaves the previous checkpoint intact. If the
+writer falls behind, only the newest snapshot is kept. Pending and skipped
+saves are written when the process exits.
+
+Formats: "json" (compact, readable) or "pickle" (binary, keeps tuple keys and
+bytes as they are, several times faster to write and load).
+"""
+
+import atexit
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+FORMATS = ("json", "pickle")
+EXTENSIONS = {"json": ".json", "pickle": ".pkl"}
+
+# Settings for writers created from here on, see configure()
+_settings = {"every": 1, "format": None, "background": True}
+_writers = {}
+_writers_lock = threading.Lock()
+
+# mkstemp creates files readable by the owner only; checkpoints get the usual mode
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def configure(every=None, fmt=None, background=None):
+    """Set the save interval, format and threading used by every writer"""
+    if fmt is not None and fmt not in FORMATS:
+        raise ValueError(f"unknown checkpoint format {fmt!r}, expected one of {FORMATS}")
+    for key, value in (("every", every), ("format", fmt), ("background", background)):
+        if value is not None:
+            _settings[key] = value
+    for writer_ in list(_writers.values()):
+        writer_.every = max(1, _settings["every"])
+
+
+def resolve(path):
+    """`path` with the extension of the configured format, if one is set"""
+    if _settings["format"] is None:
+        return path
+    return os.path.splitext(path)[0] + EXTENSIONS[_settings["format"]]
+
+
+def format_of(path):
+    return "pickle" if os.path.splitext(path)[1] in (".pkl", ".pickle") else "json"
+
+
+def write_atomic(path, data):
+    """Write `data` (bytes) to `path` so readers see either the old or the new file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def encode(data, fmt):
+    if fmt == "pickle":
+        return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def decode(raw, fmt):
+    if fmt == "pickle":
+        return pickle.loads(raw)
+    return json.loads(raw)
+
+
+class Checkpointer:
+    """Saves snapshots of one file, every `every` requests, off the calling thread"""
+
+    def __init__(self, path, every=1, background=True):
+        self.path = path
+        self.format = format_of(path)
+        self.every = max(1, every)
+        self.background = background
+        self.requests = 0
+        self.writes = 0
+        self.error = None  # Last write failure, also printed
+        self._skipped = None  # Snapshot function of a request not yet written
+        self._pending = None  # Snapshot waiting for the writer thread
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def save(self, snapshot, force=False):
+        """Count a save request; every `every`-th one (or a forced one) is written
+
+        `snapshot(fmt)` returns the data to store for format `fmt`.
+        """
+        self.requests += 1
+        if not force and self.requests % self.every:
+            self._skipped = snapshot
+            return False
+        self._skipped = None
+        data = snapshot(self.format)
+        if not self.background:
+            self._write(data)
+            return True
+        with self._cond:
+            self._pending = data  # A newer snapshot replaces one not yet written
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"checkpoint:{self.path}",
+                                                daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return True
+
+    def flush(self):
+        """Write a skipped request, then wait until nothing is pending"""
+        if self._skipped is not None:
+            self.save(self._skipped, force=True)
+        with self._cond:
+            while self._pending is not None or self._busy:
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                data, self._pending = self._pending, None
+                self._busy = True
+            try:
+                self._write(data)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write(self, data):
+        try:
+            write_atomic(self.path, encode(data, self.format))
+            self.writes += 1
+        except Exception as e:
+            self.error = e
+            print(f"Could not save {self.path}: {e}")
+
+
+def writer(path):
+    """The shared Checkpointer for `path` (after resolve()), created on first use"""
+    path = resolve(path)
+    key = os.path.abspath(path)
+    with _writers_lock:
+        if key not in _writers:
+            _writers[key] = Checkpointer(path, _settings["every"], _settings["background"])
+        return _writers[key]
+
+
+def load(path):
+    """Data of the checkpoint at `path` (after resolve()), or None if there is none
+
+    Waits for any save to that file still in flight, so a reload sees it.
+    """
+    path = resolve(path)
+    pending = _writers.get(os.path.abspath(path))
+    if pending is not None:
+        pending.flush()
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return decode(f.read(), format_of(path))
+
+
+@atexit.register
+def flush_all():
+    """Write everything pending or skipped; runs at interpreter exit"""
+    for writer_ in list(_writers.values()):
+        writer_.flush()
+
+
+def from_args(args):
+    configure(args.checkpoint_every, args.checkpoint_format, not args.sync_save)
+
+
+def add_arguments(parser):
+    """Add the --checkpoint options shared by the trainers"""
+    group = parser.add_argument_group("checkpoints")
+    group.add_argument("--checkpoint-every", type=int, default=1, metavar="N",
+                       help="write agent checkpoints every N games (always on exit)")
+    group.add_argument("--checkpoint-format", choices=FORMATS,
+                       help="json (default) or pickle, a binary format that is faster to write")
+    group.add_argument("--sync-save", action="store_true",
+                       help="write checkpoints on the training thread")
+    return group
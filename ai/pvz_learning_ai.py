@@ -5,14 +5,24 @@ Uses genetic algorithm to learn optimal strategies
 """
 
 import pygame
+import functools
 import random
 import time
 import math
-import json
 import os
+import sys
+import base64
+import struct
+import argparse
+import numpy as np
 
-# Initialize
-pygame.init()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from pvz_profile import Capture, add_arguments as add_profile_arguments
+from pvz_memory import MemoryReport, add_arguments as add_memory_arguments
+from pvz_game import make_rng
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import pvz_checkpoint
 
 # Constants
 SCREEN_WIDTH = 1200
@@ -26,6 +36,30 @@ GRID_OFFSET_Y = 85
 TOP_BAR_HEIGHT = 75
 SIDEBAR_WIDTH = 110
 
+# Placeable plants, in the order the AI scores them
+PLANT_TYPES = ["sunflower", "peashooter", "wallnut"]
+PLANT_COSTS = np.array([50, 100, 50])
+
+# Legal-action mask layout (Game.action_mask): wait, collect a sun, or place
+# PLANT_TYPES[t] at (col, row), in the (col, row, type) order of LearningAI's scores.
+# Not the ActionLog codes below, nor pvz_game's action space
+MASK_WAIT = 0
+MASK_COLLECT = 1
+MASK_PLACE = 2  # + (col * GRID_ROWS + row) * len(PLANT_TYPES) + t
+MASK_SIZE = MASK_PLACE + GRID_COLS * GRID_ROWS * len(PLANT_TYPES)
+
+# Event counters (Game.events), running totals for the game; diff two copies for a step
+EVENTS = ("damage", "kills", "plants_lost", "sun_gained", "sun_spent", "waves_cleared")
+EVENT_DAMAGE = 0  # Pea damage to live zombies
+EVENT_KILLS = 1
+EVENT_PLANTS_LOST = 2
+EVENT_SUN_GAINED = 3  # Sun collected
+EVENT_SUN_SPENT = 4
+EVENT_WAVES_CLEARED = 5
+
+# Independent random streams each game draws from
+RNG_STREAMS = ("spawn", "economy", "cosmetic", "agent")
+
 # Color Palette
 BLACK = (20, 20, 20)
 WHITE = (250, 248, 240)
@@ -39,28 +73,152 @@ GRASS_1 = (180, 220, 120)
 GRASS_2 = (160, 200, 100)
 GRASS_3 = (140, 180, 80)
 
-# Setup screen
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("PVZ - AI Learning Edition")
-clock = pygame.time.Clock()
+# Setup screen: opened on first draw, so headless trainers and their workers get no window
+def open_display():
+    """Create the game window (once per process) and return its surface"""
+    pygame.init()
+    surface = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("PVZ - AI Learning Edition")
+    return surface
+
+def display():
+    """The window surface, opened if there is none yet"""
+    return pygame.display.get_surface() or open_display()
 
-font = pygame.font.Font(None, 24)
-title_font = pygame.font.Font(None, 36)
-small_font = pygame.font.Font(None, 18)
+@functools.lru_cache(maxsize=None)
+def fonts():
+    """(font, title_font, small_font), loaded on first use"""
+    if not pygame.font.get_init():
+        pygame.font.init()
+    return pygame.font.Font(None, 24), pygame.font.Font(None, 36), pygame.font.Font(None, 18)
 
 # ============================================
 # AI LEARNING SYSTEM
 # ============================================
 
+# Success patterns are counted per level tier: levels 1-2, 3-4 and 5+
+PATTERN_TIERS = ('level_1_strategies', 'level_3_strategies', 'level_5_strategies')
+MAX_TRACKED_WAVES = 100  # Outcome histogram bins; longer games share the last one
+
+# Action codes of the decisions LearningAI.decide() returns
+ACTION_NAMES = ["wait", "collect_sun"] + [f"place_{ptype}" for ptype in PLANT_TYPES]
+ACTION_PLACE = 2  # First place_* code; code - ACTION_PLACE is the plant type index
+
+def encode_action(decision):
+    """(code, cell) of a decision string; cell is col * GRID_ROWS + row, or -1"""
+    if not decision.startswith("place_"):
+        return ACTION_NAMES.index(decision), -1
+    _, plant_type, col, row = decision.split('_')
+    return ACTION_PLACE + PLANT_TYPES.index(plant_type), int(col) * GRID_ROWS + int(row)
+
+class ActionLog:
+    """The actions of one game in typed columns, with a fixed capacity
+    
+    Columns are preallocated and reused across games via clear(). to_bytes()
+    packs the filled rows as a small header followed by each column's raw
+    little-endian values.
+    """
+    
+    MAGIC = b"PVZA"
+    VERSION = 1
+    HEADER = struct.Struct("<4sBI")  # magic, version, row count
+    COLUMNS = (
+        ('code', '<u1'),  # Index into ACTION_NAMES
+        ('cell', '<i2'),  # col * GRID_ROWS + row, -1 when the action has no cell
+        ('level', '<u2'),
+        ('wave', '<u2'),
+        ('sun', '<i4'),
+        ('zombies', '<u2'),
+        ('result', '<u1'),
+    )
+    
+    def __init__(self, capacity=2000):
+        self.capacity = capacity
+        self.size = 0
+        self.columns = {name: np.zeros(capacity, dtype) for name, dtype in self.COLUMNS}
+    
+    def __len__(self):
+        return self.size
+    
+    def append(self, code, cell, level, wave, sun, zombies, result):
+        """Add one row; returns False, recording nothing, once the log is full"""
+        if self.size >= self.capacity:
+            return False
+        i = self.size
+        columns = self.columns
+        columns['code'][i] = code
+        columns['cell'][i] = cell
+        columns['level'][i] = level
+        columns['wave'][i] = wave
+        columns['sun'][i] = sun
+        columns['zombies'][i] = zombies
+        columns['result'][i] = result
+        self.size = i + 1
+        return True
+    
+    def clear(self):
+        self.size = 0
+    
+    def column(self, name):
+        """The filled part of one column (a view, valid until the next clear)"""
+        return self.columns[name][:self.size]
+    
+    def to_bytes(self):
+        parts = [self.HEADER.pack(self.MAGIC, self.VERSION, self.size)]
+        parts.extend(self.column(name).tobytes() for name, _ in self.COLUMNS)
+        return b"".join(parts)
+    
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, size = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("not an action log")
+        log = cls(size)
+        pos = cls.HEADER.size
+        for name, dtype in cls.COLUMNS:
+            column = np.frombuffer(data, dtype, size, pos)
+            log.columns[name][:] = column
+            pos += column.nbytes
+        log.size = size
+        return log
+    
+    @classmethod
+    def from_dicts(cls, actions):
+        """Convert the per-action dicts of old save files; returns (log, dicts skipped)
+        
+        Those dicts did not record the level, so every action counts as level 1.
+        """
+        log = cls(len(actions))
+        skipped = 0
+        for action in actions:
+            try:
+                code, cell = encode_action(action['action'])
+                log.append(code, cell, 1, action.get('wave', 1), action.get('sun', 0),
+                           action.get('zombies', 0), bool(action.get('result')))
+            except (KeyError, TypeError, ValueError, AttributeError):
+                skipped += 1
+        return log, skipped
+
 class LearningAI:
     """AI that learns from experience using genetic algorithm principles"""
     
-    def __init__(self):
+    # What accumulates across games is aggregated or sampled, so memory and
+    # save size stay the same however many games are played
+    sample_size = 20  # Full games kept, a uniform sample of all games played
+    data_path = 'ai_learning_data.json'  # Extension follows --checkpoint-format
+    max_actions = 2000  # Actions recorded per game; later ones are counted only
+    
+    def __init__(self, rng=random, seed=None, worker=0):
+        self.rng = rng  # Mutation draws
+        # Run seed and worker of the reservoir draws, see _sample_game
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.worker = worker
         self.generation = 1
         self.games_played = 0
         self.best_wave = 0
         self.best_level = 1
-        self.history = []
+        self.game_sample = []  # Reservoir of full games, see _sample_game
+        self.wave_counts = np.zeros(MAX_TRACKED_WAVES + 1, dtype=np.int64)  # Games per total waves
         
         # Level system
         self.current_level = 1
@@ -78,13 +236,12 @@ class LearningAI:
             'aggressive': 0.6,
         }
         
-        self.success_patterns = {
-            'level_1_strategies': [],
-            'level_3_strategies': [],
-            'level_5_strategies': [],
-        }
+        # Placements made in successful games, by (tier, plant type, col, row)
+        self.success_patterns = np.zeros((len(PATTERN_TIERS), len(PLANT_TYPES), GRID_COLS, GRID_ROWS),
+                                         dtype=np.int64)
         
-        self.current_actions = []
+        self.current_actions = ActionLog(self.max_actions)
+        self.dropped_actions = 0
     
     def get_level_difficulty(self, level):
         """Get difficulty multipliers for a given level"""
@@ -102,14 +259,11 @@ class LearningAI:
         }
         
     def record_action(self, action, result):
-        """Record an action and its result"""
-        self.current_actions.append({
-            'action': action,
-            'result': result,
-            'wave': self.wave,
-            'sun': self.sun_count,
-            'zombies': len(self.zombies)
-        })
+        """Record an action (a decide() result) and whether it succeeded"""
+        code, cell = encode_action(action)
+        if not self.current_actions.append(code, cell, self.level, self.wave, self.sun_count,
+                                           len(self.zombies), result):
+            self.dropped_actions += 1
     
     def learn_from_game(self, level_reached, wave_reached_in_level):
         """Learn from the completed game"""
@@ -130,47 +284,50 @@ class LearningAI:
             'level_reached': level_reached,
             'wave_reached': wave_reached_in_level,
             'total_waves': total_waves,
-            'actions': self.current_actions.copy(),
+            'actions': self.current_actions.to_bytes(),
+            'dropped_actions': self.dropped_actions,
             'timestamp': time.time()
         }
         
-        self.history.append(game_data)
+        self.wave_counts[min(total_waves, MAX_TRACKED_WAVES)] += 1
+        self._sample_game(game_data)
         
         # Extract successful patterns
         if level_reached >= 2:
-            self._extract_success_patterns(game_data)
+            self._extract_success_patterns(self.current_actions)
         
         # Adapt strategy based on results
         self._adapt_strategy(level_reached, wave_reached_in_level)
         
         # Reset for next game
-        self.current_actions = []
+        self.current_actions.clear()
+        self.dropped_actions = 0
         
         # Evolve every 5 games
         if self.games_played % 5 == 0:
             self._evolve()
     
-    def _extract_success_patterns(self, game_data):
+    def _sample_game(self, game_data):
+        """Keep `game_data` in the reservoir with probability sample_size / games_played"""
+        if len(self.game_sample) < self.sample_size:
+            self.game_sample.append(game_data)
+            return
+        # A stream of its own per game, not self.rng, so sampling leaves the
+        # mutation stream untouched
+        rng = make_rng(self.seed, 'sample', self.worker, self.games_played)
+        slot = rng.randrange(self.games_played)
+        if slot < self.sample_size:
+            self.game_sample[slot] = game_data
+    
+    def _extract_success_patterns(self, actions):
         """Extract what worked in successful games"""
-        level = game_data['level_reached']
-        
-        # Count plant placements
-        placements_by_level = {}
-        for action in game_data['actions']:
-            if action['action'].startswith('Placed'):
-                lvl = action.get('level', 1)
-                if lvl not in placements_by_level:
-                    placements_by_level[lvl] = []
-                placements_by_level[lvl].append(action['action'])
-        
-        # Store by level tiers
-        for lvl, actions in placements_by_level.items():
-            if lvl <= 2:
-                self.success_patterns['level_1_strategies'].extend(actions)
-            elif lvl <= 4:
-                self.success_patterns['level_3_strategies'].extend(actions)
-            else:
-                self.success_patterns['level_5_strategies'].extend(actions)
+        # Count successful plant placements by the level tier they were made in
+        code = actions.column('code')
+        placed = (code >= ACTION_PLACE) & (actions.column('result') != 0)
+        cell = actions.column('cell')[placed]
+        tier = np.digitize(actions.column('level')[placed], [3, 5])  # 1-2, 3-4, 5+
+        np.add.at(self.success_patterns,
+                  (tier, code[placed] - ACTION_PLACE, cell // GRID_ROWS, cell % GRID_ROWS), 1)
     
     def _adapt_strategy(self, level_reached, wave_reached):
         """Adjust strategy based on performance"""
@@ -199,9 +356,9 @@ class LearningAI:
         self.generation += 1
         
         # Mutation: randomly adjust some genes
-        if random.random() < 0.3:
-            gene = random.choice(list(self.strategy_genes.keys()))
-            mutation = random.uniform(0.9, 1.1)
+        if self.rng.random() < 0.3:
+            gene = self.rng.choice(list(self.strategy_genes.keys()))
+            mutation = self.rng.uniform(0.9, 1.1)
             self.strategy_genes[gene] *= mutation
             print(f"EVOLUTION: Mutation in {gene} = {self.strategy_genes[gene]:.2f}")
         
@@ -217,132 +374,152 @@ class LearningAI:
         self.grid = game_state['grid']
         self.plants = game_state['plants']
         
-        # Get situational scores
-        sunflowers = sum(1 for p in self.plants if p.type == "sunflower")
-        peashooters_by_row = [0] * GRID_ROWS
-        wallnuts_by_row = [0] * GRID_ROWS
+        # Collecting suns always wins, so skip scoring entirely
+        action_mask = game_state['action_mask']
+        if action_mask[MASK_COLLECT]:
+            return "collect_sun"
         
-        for plant in self.plants:
-            if plant.type == "peashooter":
-                peashooters_by_row[plant.row] += 1
-            elif plant.type == "wallnut":
-                wallnuts_by_row[plant.row] += 1
+        # Situational counts are maintained by the game as it runs
+        plant_counts = game_state['plant_counts']
+        sunflowers = sum(plant_counts['sunflower'])
+        peashooters_by_row = np.array(plant_counts['peashooter'])
+        wallnuts_by_row = np.array(plant_counts['wallnut'])
+        zombies_by_row = np.array(game_state['zombies_by_row'])
         
-        # Score each possible action
-        best_action = None
-        best_score = -1
+        # Score every (col, row, plant type) placement at once
+        scores = self._score_actions(sunflowers, peashooters_by_row,
+                                     wallnuts_by_row, zombies_by_row)
         
-        # Evaluate all possible placements
-        for col in range(GRID_COLS):
-            for row in range(GRID_ROWS):
-                if self.grid[col][row] is None:
-                    for plant_type in ["sunflower", "peashooter", "wallnut"]:
-                        score = self._score_action(col, row, plant_type, 
-                                                 sunflowers, peashooters_by_row, 
-                                                 wallnuts_by_row)
-                        if score > best_score and self._can_afford(plant_type):
-                            best_score = score
-                            best_action = (col, row, plant_type)
-        
-        # Also consider collecting suns
-        suns_available = len([s for s in game_state['suns'] if s.active])
-        if suns_available > 0:
-            return "collect_sun"
+        # Only legal (empty, affordable) placements that beat the baseline are candidates
+        valid = action_mask[MASK_PLACE:].reshape(scores.shape) & (scores > -1)
         
-        if best_action:
-            col, row, plant_type = best_action
-            return f"place_{plant_type}_{col}_{row}"
+        if valid.any():
+            # argmax keeps the first maximum in (col, row, type) order,
+            # matching the tie-breaking of a nested scan
+            best = np.argmax(np.where(valid, scores, -np.inf))
+            col, row, type_idx = np.unravel_index(best, scores.shape)
+            return f"place_{PLANT_TYPES[type_idx]}_{col}_{row}"
         
         return "wait"
     
-    def _score_action(self, col, row, plant_type, sunflowers, 
-                     peashooters_by_row, wallnuts_by_row):
-        """Score a potential action based on learned strategy"""
-        score = 0
+    def _score_actions(self, sunflowers, peashooters_by_row, wallnuts_by_row,
+                       zombies_by_row):
+        """Score all potential placements based on learned strategy
+        
+        Returns a (GRID_COLS, GRID_ROWS, len(PLANT_TYPES)) array.
+        """
+        cols = np.arange(GRID_COLS, dtype=float)[:, None]
+        col_is_front = cols <= 3
         
         # Level-based difficulty adjustment
         level_difficulty = (self.level - 1) * 0.2
         
-        # Base scores from genes
-        if plant_type == "sunflower":
-            score = 50 * self.strategy_genes['sunflower_priority']
-            score += (3 - col) * 10
-            score -= sunflowers * 5
-            # Higher levels need more economy
-            score += self.level * 3
-        
-        elif plant_type == "peashooter":
-            score = 60 * self.strategy_genes['row_coverage']
-            score += (5 - abs(col - 4)) * 5
-            
-            # Check for zombies in this row
-            zombies_in_row = sum(1 for z in self.zombies if z.row == row and not z.dying)
-            if zombies_in_row > 0:
-                score *= (1.5 + level_difficulty)
-            
-            score -= peashooters_by_row[row] * 20
-            
-            # Early defense more important at higher levels
-            if self.wave <= 2 and col <= 3:
-                score *= self.strategy_genes['early_defense'] * (1 + level_difficulty * 0.5)
-        
-        elif plant_type == "wallnut":
-            score = 40 * self.strategy_genes['wallnut_timing']
-            if peashooters_by_row[row] > 0:
-                score *= 2
-            score += col * 3
-            score -= wallnuts_by_row[row] * 25
-            # Wallnuts more important at higher levels
-            score *= (1 + level_difficulty * 0.8)
+        # Sunflower: depends on column only
+        sunflower = 50 * self.strategy_genes['sunflower_priority']
+        sunflower = sunflower + (3 - cols) * 10
+        sunflower = sunflower - sunflowers * 5
+        # Higher levels need more economy
+        sunflower = sunflower + self.level * 3
+        sunflower = np.broadcast_to(sunflower, (GRID_COLS, GRID_ROWS))
+        
+        # Peashooter
+        peashooter = 60 * self.strategy_genes['row_coverage']
+        peashooter = peashooter + (5 - np.abs(cols - 4)) * 5
+        
+        # Rows with zombies get a boost
+        peashooter = np.where(zombies_by_row > 0,
+                              peashooter * (1.5 + level_difficulty),
+                              peashooter)
+        
+        peashooter = peashooter - peashooters_by_row * 20
+        
+        # Early defense more important at higher levels
+        if self.wave <= 2:
+            early = self.strategy_genes['early_defense'] * (1 + level_difficulty * 0.5)
+            peashooter = np.where(col_is_front, peashooter * early, peashooter)
+        
+        # Wallnut
+        wallnut = 40 * self.strategy_genes['wallnut_timing']
+        wallnut = np.where(peashooters_by_row > 0, wallnut * 2, wallnut)
+        wallnut = wallnut + cols * 3
+        wallnut = wallnut - wallnuts_by_row * 25
+        # Wallnuts more important at higher levels
+        wallnut = wallnut * (1 + level_difficulty * 0.8)
         
         # Wave and level adjustments
         if self.level >= 3:
-            if plant_type in ["peashooter", "wallnut"]:
-                score *= 1.4
+            peashooter = peashooter * 1.4
+            wallnut = wallnut * 1.4
         
         if self.wave >= 4:
-            if plant_type in ["peashooter", "wallnut"]:
-                score *= 1.3
+            peashooter = peashooter * 1.3
+            wallnut = wallnut * 1.3
         
-        return score
+        return np.stack([sunflower, peashooter, wallnut], axis=-1)
     
-    def _can_afford(self, plant_type):
-        costs = {"sunflower": 50, "peashooter": 100, "wallnut": 50}
-        return self.sun_count >= costs.get(plant_type, 999)
+    def save(self, force=False):
+        """Save learning data (in the background, every few games; see pvz_checkpoint)"""
+        pvz_checkpoint.writer(self.data_path).save(self._snapshot, force)
     
-    def save(self):
-        """Save learning data"""
-        data = {
+    def _snapshot(self, fmt):
+        """A copy of the learning data that later games cannot change"""
+        binary = fmt != "json"
+        return {
             'generation': self.generation,
             'games_played': self.games_played,
             'best_wave': self.best_wave,
-            'strategy_genes': self.strategy_genes,
-            'history': self.history[-50:]  # Keep last 50 games
+            'strategy_genes': dict(self.strategy_genes),
+            'success_patterns': self.success_patterns.copy() if binary else self.success_patterns.tolist(),
+            'wave_counts': self.wave_counts.copy() if binary else self.wave_counts.tolist(),
+            # Action logs are binary; base64 keeps them in a JSON file
+            'game_sample': [game if binary else
+                            dict(game, actions=base64.b64encode(game['actions']).decode('ascii'))
+                            for game in self.game_sample],
         }
-        with open('ai_learning_data.json', 'w') as f:
-            json.dump(data, f, indent=2)
     
     def load(self):
         """Load learning data"""
-        if os.path.exists('ai_learning_data.json'):
-            try:
-                with open('ai_learning_data.json', 'r') as f:
-                    data = json.load(f)
-                    self.generation = data.get('generation', 1)
-                    self.games_played = data.get('games_played', 0)
-                    self.best_wave = data.get('best_wave', 0)
-                    self.strategy_genes = data.get('strategy_genes', self.strategy_genes)
-                    self.history = data.get('history', [])
-                    print(f"Loaded AI: Gen {self.generation}, Best Wave {self.best_wave}")
-            except Exception as e:
-                print(f"Could not load AI data: {e}")
+        try:
+            data = pvz_checkpoint.load(self.data_path)
+            if data is None:
+                return
+            self.generation = data.get('generation', 1)
+            self.games_played = data.get('games_played', 0)
+            self.best_wave = data.get('best_wave', 0)
+            self.strategy_genes = data.get('strategy_genes', self.strategy_genes)
+            # Older files kept recent games, with per-action dicts, under 'history'
+            self.game_sample = []
+            skipped = 0
+            for game in data.get('game_sample', data.get('history', []))[-self.sample_size:]:
+                actions = game.get('actions')
+                if isinstance(actions, str):
+                    actions = base64.b64decode(actions)
+                elif isinstance(actions, list):
+                    log, dropped = ActionLog.from_dicts(actions)
+                    actions = log.to_bytes()
+                    skipped += dropped
+                elif not isinstance(actions, bytes):
+                    actions = ActionLog(0).to_bytes()
+                self.game_sample.append(dict(game, actions=actions))
+            if skipped:
+                print(f"Warning: dropped {skipped} unreadable actions from old saved games")
+            # Counts saved for another grid or tier layout are dropped
+            patterns = np.array(data.get('success_patterns', []), dtype=np.int64)
+            if patterns.shape == self.success_patterns.shape:
+                self.success_patterns = patterns
+            wave_counts = np.array(data.get('wave_counts', []), dtype=np.int64)
+            if wave_counts.shape == self.wave_counts.shape:
+                self.wave_counts = wave_counts
+            print(f"Loaded AI: Gen {self.generation}, Best Wave {self.best_wave}")
+        except Exception as e:
+            print(f"Could not load AI data: {e}")
 
 # ============================================
 # GAME CLASSES (simplified for readability)
 # ============================================
 
 class Plant:
-    def __init__(self, col, row, plant_type):
+    def __init__(self, col, row, plant_type, rng=random):
         self.col = col
         self.row = row
         self.type = plant_type
@@ -362,7 +539,7 @@ class Plant:
             self.cost = 50
         
         self.max_hp = self.hp
-        self.anim_offset = random.random() * math.pi * 2
+        self.anim_offset = rng.random() * math.pi * 2
     
     def draw(self, surface):
         bounce = math.sin(time.time() * 2 + self.anim_offset) * 3
@@ -378,6 +555,7 @@ class Plant:
             # Countdown
             time_until_sun = 10 - (time.time() - self.last_sun)
             if time_until_sun > 0:
+                _, _, small_font = fonts()
                 timer = small_font.render(str(int(time_until_sun)), True, YELLOW_PENCIL)
                 surface.blit(timer, (self.x - 5, int(self.y - 50 + bounce)))
         
@@ -413,7 +591,7 @@ class Plant:
             pygame.draw.rect(surface, health_color, (self.x - bar_width//2 + 2, y_pos + 2, (bar_width - 4) * hp_percent, bar_height - 4))
 
 class Zombie:
-    def __init__(self, row, level=1):
+    def __init__(self, row, level=1, rng=random):
         self.row = row
         self.x = SCREEN_WIDTH + 50
         self.y = GRID_OFFSET_Y + row * CELL_HEIGHT + CELL_HEIGHT // 2
@@ -430,7 +608,7 @@ class Zombie:
         self.last_attack = time.time()
         self.attack_speed = 0.5
         self.walk_cycle = 0
-        self.blink_timer = random.random() * 3
+        self.blink_timer = rng.random() * 3
         self.dying = False
         self.death_timer = 0
         self.death_duration = 1.5
@@ -522,14 +700,16 @@ class Pea:
         pygame.draw.circle(surface, BLACK, (int(self.x), int(self.y)), 10, 2)
 
 class Sun:
-    def __init__(self, x, y, value=25, is_bright=False):
+    def __init__(self, x, y, value=25, is_bright=False, target_y=None):
+        if target_y is None:
+            target_y = y if y > 50 else random.randint(120, SCREEN_HEIGHT - 100)
         self.x = x
         self.y = y
         self.value = value
         self.radius = 25
         self.active = True
         self.spawn_time = time.time()
-        self.target_y = y if y > 50 else random.randint(120, SCREEN_HEIGHT - 100)
+        self.target_y = target_y
         self.is_bright = is_bright
     
     def update(self):
@@ -550,12 +730,19 @@ class Sun:
 # ============================================
 
 class Game:
-    def __init__(self):
+    def __init__(self, seed=None, worker=0, episode=0):
+        # Per-subsystem random streams, re-derived for every episode
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.worker = worker
+        self.episode = episode
+        self._seed_streams()
+        
         self.grid = [[None for _ in range(GRID_ROWS)] for _ in range(GRID_COLS)]
         self.plants = []
         self.zombies = []
         self.peas = []
         self.suns = []
+        self._reset_counters()
         self.sun_count = 350  # Enough for immediate defense setup
         self.selected_plant = None
         self.game_over = False
@@ -575,7 +762,7 @@ class Game:
         self.last_sun_spawn = time.time()
         
         # Learning AI
-        self.learning_ai = LearningAI()
+        self.learning_ai = LearningAI(self.agent_rng, self.seed, self.worker)
         self.learning_ai.load()
         
         # AI logging
@@ -599,6 +786,65 @@ class Game:
                 grass_surf.fill(bg_color)
                 self.grass_textures.append(grass_surf)
     
+    def memory_structures(self):
+        """What a memory report measures: the board, the logs and what the AI keeps"""
+        return {
+            'plants': self.plants,
+            'zombies': self.zombies,
+            'peas': self.peas,
+            'suns': self.suns,
+            'ai_logs': self.ai_logs,
+            'game_sample': self.learning_ai.game_sample,
+            'success_patterns': self.learning_ai.success_patterns,
+            'current_actions': self.learning_ai.current_actions,
+        }
+    
+    def _seed_streams(self):
+        self.spawn_rng, self.economy_rng, self.cosmetic_rng, self.agent_rng = (
+            make_rng(self.seed, stream, self.worker, self.episode) for stream in RNG_STREAMS)
+    
+    def _reset_counters(self):
+        """Running board statistics, updated on place/death/spawn/sun changes"""
+        self.plant_counts = {ptype: [0] * GRID_ROWS for ptype in PLANT_TYPES}
+        self.zombies_by_row = [0] * GRID_ROWS
+        self.live_zombies = 0
+        self.events = np.zeros(len(EVENTS), dtype=np.int64)
+        
+        # Legal actions on an empty board with no sun; sun_count fills in what is affordable
+        self.empty_cells = np.ones((GRID_COLS, GRID_ROWS), dtype=bool)
+        self.affordable = np.zeros(len(PLANT_TYPES), dtype=bool)
+        self.action_mask = np.zeros(MASK_SIZE, dtype=bool)
+        self.action_mask[MASK_WAIT] = True
+        self.place_mask = self.action_mask[MASK_PLACE:].reshape(GRID_COLS, GRID_ROWS, len(PLANT_TYPES))
+        self._sun_count = 0
+    
+    @property
+    def sun_count(self):
+        return self._sun_count
+    
+    @sun_count.setter
+    def sun_count(self, value):
+        self._sun_count = value
+        affordable = value >= PLANT_COSTS
+        changed = affordable != self.affordable
+        if changed.any():
+            self.affordable = affordable
+            self.place_mask[:, :, changed] = self.empty_cells[:, :, None] & affordable[changed]
+    
+    def _add_sun(self, sun):
+        self.suns.append(sun)
+        self.action_mask[MASK_COLLECT] = True
+    
+    def _remove_sun(self, sun):
+        """Take a collected or expired sun off the lawn"""
+        self.suns.remove(sun)
+        self.action_mask[MASK_COLLECT] = len(self.suns) > 0
+    
+    def _collect_sun(self, sun):
+        self.sun_count += sun.value
+        self.events[EVENT_SUN_GAINED] += sun.value
+        self._remove_sun(sun)
+    
     def ai_log(self, message):
         self.ai_logs.append(message)
         if len(self.ai_logs) > self.max_logs:
@@ -623,7 +869,10 @@ class Game:
             'zombies': self.zombies,
             'grid': self.grid,
             'plants': self.plants,
-            'suns': self.suns
+            'suns': self.suns,
+            'plant_counts': self.plant_counts,
+            'zombies_by_row': self.zombies_by_row,
+            'action_mask': self.action_mask
         }
         
         # Add level to game state
@@ -636,8 +885,8 @@ class Game:
         if decision == "collect_sun":
             for sun in self.suns[:]:
                 if sun.active:
-                    self.sun_count += sun.value
-                    self.suns.remove(sun)
+                    self._collect_sun(sun)
+                    self.learning_ai.record_action(decision, True)
                     self.ai_log(f"Collected sun (+{sun.value}) = {self.sun_count}")
                     return
         elif decision.startswith("place_"):
@@ -646,18 +895,28 @@ class Game:
             col = int(parts[2])
             row = int(parts[3])
             
-            if self.grid[col][row] is None:
-                plant = Plant(col, row, plant_type)
-                self.plants.append(plant)
-                self.grid[col][row] = plant
-                
-                costs = {"sunflower": 50, "peashooter": 100, "wallnut": 50}
-                self.sun_count -= costs[plant_type]
+            if self._place_plant(col, row, plant_type):
+                self.learning_ai.record_action(decision, True)
                 self.ai_log(f"Placed {plant_type} at ({col},{row})")
                 return
         
         self.ai_log(f"Waiting | L{self.level}-{self.wave} | Sun {self.sun_count}")
     
+    def _place_plant(self, col, row, plant_type):
+        """Place a plant if the cell is free and affordable; returns whether it was placed"""
+        cost = int(PLANT_COSTS[PLANT_TYPES.index(plant_type)])
+        if self.grid[col][row] is not None or self.sun_count < cost:
+            return False
+        plant = Plant(col, row, plant_type, self.cosmetic_rng)
+        self.plants.append(plant)
+        self.grid[col][row] = plant
+        self.plant_counts[plant_type][row] += 1
+        self.empty_cells[col, row] = False
+        self.place_mask[col, row] = False
+        self.sun_count -= cost
+        self.events[EVENT_SUN_SPENT] += cost
+        return True
+    
     def update(self):
         if self.game_over or self.paused:
             return
@@ -671,31 +930,34 @@ class Game:
         # Spawn zombies
         if current_time - self.last_spawn > self.spawn_interval:
             if self.zombies_spawned < self.zombies_to_spawn:
-                row = random.randint(0, GRID_ROWS - 1)
-                self.zombies.append(Zombie(row, self.level))
+                row = self.spawn_rng.randint(0, GRID_ROWS - 1)
+                self.zombies.append(Zombie(row, self.level, self.cosmetic_rng))
                 self.zombies_spawned += 1
+                self.zombies_by_row[row] += 1
+                self.live_zombies += 1
             self.last_spawn = current_time
         
         # Wave completion
         if self.zombies_spawned >= self.zombies_to_spawn:
-            alive_zombies = [z for z in self.zombies if not z.dying]
-            if len(alive_zombies) == 0:
+            if self.live_zombies == 0:
                 self.wave += 1
+                self.events[EVENT_WAVES_CLEARED] += 1
                 self.zombies_spawned = 0
                 self.zombies_to_spawn = 3 + self.wave
                 self.spawn_interval = max(3, 8 - self.wave * 0.5)
         
         # Natural sun
         if current_time - self.last_sun_spawn > 10:
-            x = random.randint(GRID_OFFSET_X, GRID_OFFSET_X + GRID_COLS * CELL_WIDTH - 50)
-            self.suns.append(Sun(x, -30))
+            x = self.economy_rng.randint(GRID_OFFSET_X, GRID_OFFSET_X + GRID_COLS * CELL_WIDTH - 50)
+            target_y = self.economy_rng.randint(120, SCREEN_HEIGHT - 100)
+            self._add_sun(Sun(x, -30, target_y=target_y))
             self.last_sun_spawn = current_time
         
         # Update plants
         for plant in self.plants[:]:
             if plant.type == "sunflower":
                 if current_time - plant.last_sun > 10:
-                    self.suns.append(Sun(plant.x, plant.y - 30, is_bright=True))
+                    self._add_sun(Sun(plant.x, plant.y - 30, is_bright=True))
                     plant.last_sun = current_time
             elif plant.type == "peashooter":
                 has_zombie = any(z.row == plant.row and z.x > plant.x for z in self.zombies if not z.dying)
@@ -706,6 +968,10 @@ class Game:
             if plant.hp <= 0:
                 self.plants.remove(plant)
                 self.grid[plant.col][plant.row] = None
+                self.plant_counts[plant.type][plant.row] -= 1
+                self.empty_cells[plant.col, plant.row] = True
+                self.place_mask[plant.col, plant.row] = self.affordable
+                self.events[EVENT_PLANTS_LOST] += 1
         
         # Update zombies
         for zombie in self.zombies[:]:
@@ -728,6 +994,9 @@ class Game:
             
             if zombie.hp <= 0:
                 zombie.dying = True
+                self.zombies_by_row[zombie.row] -= 1
+                self.live_zombies -= 1
+                self.events[EVENT_KILLS] += 1
                 continue
             
             if zombie.x < GRID_OFFSET_X - 20:
@@ -740,6 +1009,8 @@ class Game:
             pea.move()
             for zombie in self.zombies:
                 if zombie.row == pea.row and abs(zombie.x - pea.x) < 25:
+                    if not zombie.dying:
+                        self.events[EVENT_DAMAGE] += pea.damage
                     zombie.hp -= pea.damage
                     pea.active = False
                     break
@@ -750,7 +1021,7 @@ class Game:
         for sun in self.suns[:]:
             sun.update()
             if not sun.active:
-                self.suns.remove(sun)
+                self._remove_sun(sun)
     
     def _handle_game_over(self):
         """Handle game over in auto-play mode"""
@@ -808,6 +1079,7 @@ class Game:
         self.zombies = []
         self.peas = []
         self.suns = []
+        self._reset_counters()
         self.sun_count = 350  # Enough for immediate defense setup
         self.game_over = False
         self.level = 1
@@ -819,9 +1091,13 @@ class Game:
         self.last_spawn = time.time()
         self.spawn_interval = 20  # Very slow to give AI time to build
         self.last_sun_spawn = time.time()
+        self.episode += 1
+        self._seed_streams()
+        self.learning_ai.rng = self.agent_rng
         # Don't clear ai_logs, keep them for visibility
     
     def draw(self):
+        screen = display()
         screen.fill(PAPER_COLOR)
         
         # Draw grid
@@ -850,6 +1126,7 @@ class Game:
         self._draw_ui()
         
         # Game over
+        font, title_font, _ = fonts()
         if self.game_over and not self.auto_play:
             overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
             overlay.fill((0, 0, 0, 200))
@@ -869,6 +1146,8 @@ class Game:
             screen.blit(info, (SCREEN_WIDTH//2 - info.get_width()//2, 10))
     
     def _draw_ui(self):
+        screen = display()
+        font, _, small_font = fonts()
         # Top bar
         pygame.draw.rect(screen, PAPER_COLOR, (0, 0, SCREEN_WIDTH, TOP_BAR_HEIGHT))
         pygame.draw.line(screen, BLACK, (0, TOP_BAR_HEIGHT), (SCREEN_WIDTH, TOP_BAR_HEIGHT), 3)
@@ -890,7 +1169,7 @@ class Game:
         pygame.draw.rect(screen, (230, 230, 230), (wave_x, progress_y, progress_width, 14))
         pygame.draw.rect(screen, BLACK, (wave_x, progress_y, progress_width, 14), 2)
         
-        zombies_killed = self.zombies_spawned - len([z for z in self.zombies if not z.dying])
+        zombies_killed = self.zombies_spawned - self.live_zombies
         progress_percent = zombies_killed / self.zombies_to_spawn if self.zombies_to_spawn > 0 else 0
         pygame.draw.rect(screen, GREEN_PENCIL, (wave_x + 2, progress_y + 2, (progress_width - 4) * progress_percent, 10))
         
@@ -943,11 +1222,11 @@ class Game:
             
             # Plant count
             if name == "Sunflower":
-                count = sum(1 for p in self.plants if p.type == "sunflower")
+                count = sum(self.plant_counts["sunflower"])
             elif name == "Peashooter":
-                count = sum(1 for p in self.plants if p.type == "peashooter")
+                count = sum(self.plant_counts["peashooter"])
             else:
-                count = sum(1 for p in self.plants if p.type == "wallnut")
+                count = sum(self.plant_counts["wallnut"])
             
             count_surf = small_font.render(f"x{count}", True, BLACK)
             screen.blit(count_surf, (card_x + card_width - count_surf.get_width() - 5, card_y + card_height - 12))
@@ -1002,7 +1281,23 @@ class Game:
                 screen.blit(log_text, (log_x + 10, log_y + 30 + i * 16))
 
 def main():
+    parser = argparse.ArgumentParser(description="PVZ learning AI")
+    add_profile_arguments(parser)
+    add_memory_arguments(parser)
+    pvz_checkpoint.add_arguments(parser)
+    args = parser.parse_args()
+    pvz_checkpoint.from_args(args)
+    capture = Capture.from_args(args)
+    if capture:
+        capture.start()
+    memory = MemoryReport.from_args(args)
+    if memory:
+        memory.start()
+    
+    open_display()
+    clock = pygame.time.Clock()
     game = Game()
+    games_seen = game.auto_play_count
     
     running = True
     while running:
@@ -1086,7 +1381,21 @@ def main():
                 game.update()
         
         clock.tick(60)
+        
+        # Each finished auto-play game is one episode for the profiler
+        finished = game.auto_play_count > games_seen
+        games_seen = game.auto_play_count  # Also follows restarts
+        if capture:
+            if finished:
+                capture.episode_done()
+            capture.poll()
+        if memory and finished:
+            memory.episode_done(f"game {game.learning_ai.games_played}", game.memory_structures())
     
+    if capture:
+        capture.stop()
+    if memory:
+        memory.stop()
     pygame.quit()
 
 if __name__ == "__main__":
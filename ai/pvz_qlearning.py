@@ -8,28 +8,39 @@ import pygame
 import random
 import time
 import math
-import json
+import os
+import sys
+import argparse
+import multiprocessing
+import queue
 import numpy as np
 
-# Initialize pygame
-pygame.init()
-screen = pygame.display.set_mode((1200, 700))
-pygame.display.set_caption("PVZ Q-Learning AI")
-
 # Import base game
-try:
-    exec(open('/home/vboxuser/.openclaw/workspace/pvz_learning_ai.py').read())
-except Exception as e:
-    print(f"Error loading game: {e}")
-    import sys
-    sys.exit(1)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pvz_learning_ai import *
+import pvz_checkpoint
+from pvz_profile import Capture, add_arguments as add_profile_arguments
+from pvz_memory import MemoryReport, add_arguments as add_memory_arguments
+import pvz_kernels
+import pvz_vecenv
+# The rules engine's action space, apart from this game's mask layout (MASK_*)
+from pvz_game import place_action, ACTION_WAIT as ENV_WAIT, ACTION_COLLECT as ENV_COLLECT, PLANE_PLANT
 
 class QLearningAgent:
     """Q-Learning Agent for PVZ"""
     
-    def __init__(self):
+    max_states = 100000  # Q-table size cap; the least visited states are evicted past it
+    evict_fraction = 0.1  # Share of the table dropped per eviction, so it runs rarely
+    data_path = 'q_learning_data.json'  # Extension follows --checkpoint-format
+    env_data_path = 'q_learning_env.json'  # Tables of the full-game trainers, whose states differ
+    
+    def __init__(self, rng=random, load=True, count_visits=True, data_path=None):
         # Q-table: state -> action values
         self.q_table = {}
+        self.rng = rng  # Agent stream: Q-value init and exploration
+        self.count_visits = count_visits  # Off in actors; their learner counts
+        if data_path:
+            self.data_path = data_path
         
         # Learning parameters
         self.learning_rate = 0.1  # Alpha
@@ -53,14 +64,16 @@ class QLearningAgent:
             'place_peashooter_mid',
             'place_wallnut_front'
         ]
+        self.action_index = {action: i for i, action in enumerate(self.actions)}
         
         # Statistics
         self.state_visits = {}
         self.total_rewards = 0
         self.episodes = 0
         
-        # Load if exists
-        self.load()
+        # Load if exists; actor copies get their table from the learner instead
+        if load:
+            self.load()
     
     def get_state(self, game_state):
         """Discretize continuous state into bins"""
@@ -69,9 +82,9 @@ class QLearningAgent:
         wave = game_state['wave']
         
         # Bin the values
-        sun_bin = min(i for i, val in enumerate(self.sun_bins) if sun < val)
-        zombie_bin = min(i for i, val in enumerate(self.zombie_bins) if zombies < val)
-        wave_bin = min(i for i, val in enumerate(self.wave_bins) if wave < val)
+        sun_bin = min((i for i, val in enumerate(self.sun_bins) if sun < val), default=len(self.sun_bins))
+        zombie_bin = min((i for i, val in enumerate(self.zombie_bins) if zombies < val), default=len(self.zombie_bins))
+        wave_bin = min((i for i, val in enumerate(self.wave_bins) if wave < val), default=len(self.wave_bins))
         
         # Count plants by row
         plant_counts = [0] * 5
@@ -84,80 +97,114 @@ class QLearningAgent:
         """Get Q-values for all actions in a state"""
         if state not in self.q_table:
             # Initialize with small random values
-            self.q_table[state] = {action: random.uniform(-0.1, 0.1) for action in self.actions}
+            self.q_table[state] = {action: self.rng.uniform(-0.1, 0.1) for action in self.actions}
         
         return self.q_table[state]
     
-    def choose_action(self, state, available_actions):
-        """Epsilon-greedy action selection"""
-        if random.random() < self.epsilon:
+    def choose_action(self, state, available):
+        """Epsilon-greedy action selection
+        
+        `available` is a boolean array aligned with self.actions.
+        """
+        if self.count_visits:
+            self.state_visits[state] = self.state_visits.get(state, 0) + 1
+        if self.rng.random() < self.epsilon:
             # Explore: random action
-            return random.choice(available_actions)
+            return self.actions[self.rng.choice(np.flatnonzero(available))]
         else:
-            # Exploit: best action
+            # Exploit: best action, a masked argmax
             q_values = self.get_q_values(state)
-            available_q = {a: q_values[a] for a in available_actions}
-            return max(available_q, key=available_q.get)
+            values = np.fromiter((q_values[a] for a in self.actions), float, len(self.actions))
+            return self.actions[np.argmax(np.where(available, values, -np.inf))]
     
-    def update_q(self, state, action, reward, next_state):
-        """Q-Learning update rule"""
+    def update_q(self, state, action, reward, next_state, done=False):
+        """Q-Learning update rule; a `done` transition has no future value"""
         current_q = self.get_q_values(state)[action]
-        max_next_q = max(self.get_q_values(next_state).values())
+        max_next_q = 0.0 if done else max(self.get_q_values(next_state).values())
         
         # Q(s,a) = Q(s,a) + alpha * [reward + gamma * max(Q(s',a')) - Q(s,a)]
         new_q = current_q + self.learning_rate * (reward + self.discount_factor * max_next_q - current_q)
         
         self.q_table[state][action] = new_q
     
+    def evict_states(self):
+        """Drop the least visited states once the Q-table is over max_states
+
+        Call between episodes: update_q holds on to the states it touches.
+        Returns the states dropped.
+        """
+        excess = len(self.q_table) - self.max_states
+        if excess <= 0:
+            return []
+        count = excess + int(self.max_states * self.evict_fraction)
+        coldest = sorted(self.q_table, key=lambda state: self.state_visits.get(state, 0))[:count]
+        for state in coldest:
+            del self.q_table[state]
+            self.state_visits.pop(state, None)
+        return coldest
+    
     def decay_epsilon(self):
         """Decay exploration rate"""
         self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay)
     
+    # Plant and columns each placement action fills, first empty cell first, as in _execute_action
+    PLACEMENTS = {
+        'place_sunflower_back': ('sunflower', range(2)),
+        'place_peashooter_mid': ('peashooter', range(2, 5)),
+        'place_wallnut_front': ('wallnut', range(6, 8)),
+    }
+    
     def get_available_actions(self, game_state):
-        """Get actions available in current state"""
-        actions = ['wait']
-        
-        sun = game_state['sun']
-        grid = game_state['grid']
-        plants = game_state['plants']
-        
-        # Can collect sun?
-        if any(s.active for s in game_state['suns']):
-            actions.append('collect_sun')
-        
-        # Plant actions
-        if sun >= 50:
-            # Find empty spots
-            for col in range(2):  # Back columns
-                for row in range(5):
-                    if grid[col][row] is None:
-                        actions.append('place_sunflower_back')
-                        break
-                else:
-                    break
-        
-        if sun >= 100:
-            for col in range(2, 5):  # Mid columns
-                for row in range(5):
-                    if grid[col][row] is None:
-                        actions.append('place_peashooter_mid')
-                        break
-                else:
-                    break
-        
-        if sun >= 50:
-            for col in range(6, 8):  # Front columns
-                for row in range(5):
-                    if grid[col][row] is None:
-                        actions.append('place_wallnut_front')
-                        break
-                else:
-                    break
-        
-        return list(set(actions))  # Remove duplicates
+        """Boolean array of the actions possible now, aligned with self.actions
+        
+        Read off the game's action mask: a placement is possible when any cell
+        of its columns is legal for its plant.
+        """
+        action_mask = game_state['action_mask']
+        place_mask = action_mask[MASK_PLACE:].reshape(GRID_COLS, GRID_ROWS, len(PLANT_TYPES))
+        available = np.zeros(len(self.actions), dtype=bool)
+        available[self.action_index['wait']] = True
+        available[self.action_index['collect_sun']] = action_mask[MASK_COLLECT]
+        for name, (plant_type, cols) in self.PLACEMENTS.items():
+            cells = place_mask[cols.start:cols.stop, :, PLANT_TYPES.index(plant_type)]
+            available[self.action_index[name]] = cells.any()
+        return available
+    
+    def get_env_actions(self, action_mask):
+        """pvz_game action for each of self.actions under a pvz_game action mask, -1 if illegal
+        
+        A placement's cells are a contiguous run of the env action space, so
+        its first legal cell is one argmax.
+        """
+        env_actions = np.full(len(self.actions), -1, dtype=np.int64)
+        env_actions[self.action_index['wait']] = ENV_WAIT
+        if action_mask[ENV_COLLECT]:
+            env_actions[self.action_index['collect_sun']] = ENV_COLLECT
+        for name, (plant_type, cols) in self.PLACEMENTS.items():
+            first = place_action(plant_type, cols.start, 0)
+            cells = action_mask[first:place_action(plant_type, cols.stop - 1, GRID_ROWS - 1) + 1]
+            cell = int(np.argmax(cells))
+            if cells[cell]:
+                env_actions[self.action_index[name]] = first + cell
+        return env_actions
     
-    def calculate_reward(self, game_state, action, next_game_state):
-        """Calculate reward for an action"""
+    def get_state_from_obs(self, obs):
+        """get_state() for a pvz_vecenv observation row"""
+        sun, wave, zombies = obs[0], obs[1], obs[3]
+        sun_bin = min((i for i, val in enumerate(self.sun_bins) if sun < val), default=len(self.sun_bins))
+        zombie_bin = min((i for i, val in enumerate(self.zombie_bins) if zombies < val), default=len(self.zombie_bins))
+        wave_bin = min((i for i, val in enumerate(self.wave_bins) if wave < val), default=len(self.wave_bins))
+        plants = pvz_vecenv.planes(obs)[:, :, PLANE_PLANT]
+        plant_counts = tuple(int(n) for n in np.count_nonzero(plants, axis=1))
+        return (sun_bin, zombie_bin, wave_bin, plant_counts)
+    
+    def calculate_reward(self, action, events, game_state):
+        """Calculate reward for an action
+        
+        `events` are the game's event counts since the action was taken (see
+        EVENTS) and `game_state` the state now, with 'game_over' set when the
+        game was lost in between.
+        """
         reward = 0
         
         # Basic reward/penalties
@@ -173,80 +220,104 @@ class QLearningAgent:
             if 'peashooter' in action and 'mid' in action:
                 reward += 0.3
         
-        # Check if zombie was damaged
-        old_zombies = len([z for z in game_state['zombies'] if not z.dying])
-        new_zombies = len([z for z in next_game_state['zombies'] if not z.dying])
-        if new_zombies < old_zombies:
-            reward += 2.0  # Bonus for damaging zombies
+        # Bonus per zombie killed, penalty per plant lost
+        reward += 2.0 * events[EVENT_KILLS]
+        reward -= 1.0 * events[EVENT_PLANTS_LOST]
         
-        # Penalty if plant died
-        old_plants = len(game_state['plants'])
-        new_plants = len(next_game_state['plants'])
-        if new_plants < old_plants:
-            reward -= 1.0
+        # Wave completion bonus
+        reward += 5.0 * events[EVENT_WAVES_CLEARED]
         
-        # Check if game progressed
-        if next_game_state['wave'] > game_state['wave']:
-            reward += 5.0  # Wave completion bonus
-        
-        # Game over penalty
-        if next_game_state.get('game_over', False):
-            reward = -50.0
+        # Game over penalty, on top of what the last interval earned
+        if game_state.get('game_over', False):
+            reward -= 50.0
         
         # Progress reward
-        total_waves = (next_game_state['level'] - 1) * 5 + next_game_state['wave']
+        total_waves = (game_state['level'] - 1) * 5 + game_state['wave']
         reward += total_waves * 0.1
         
-        return reward
+        return float(reward)
     
-    def save(self):
-        """Save Q-table"""
-        # Convert tuple keys to strings for JSON
-        serializable = {}
-        for state, actions in self.q_table.items():
-            state_str = str(state)
-            serializable[state_str] = actions
-        
-        data = {
-            'q_table': serializable,
+    def save(self, force=False):
+        """Save Q-table (in the background, every few episodes; see pvz_checkpoint)"""
+        pvz_checkpoint.writer(self.data_path).save(self._snapshot, force)
+    
+    def _snapshot(self, fmt):
+        """A copy of the Q-table and statistics that later updates cannot change"""
+        # JSON needs string keys; pickle keeps the state tuples
+        key = str if fmt == "json" else (lambda state: state)
+        return {
+            'q_table': {key(state): dict(actions) for state, actions in self.q_table.items()},
+            'state_visits': {key(state): visits for state, visits in self.state_visits.items()},
             'epsilon': self.epsilon,
             'episodes': self.episodes
         }
-        
-        with open('q_learning_data.json', 'w') as f:
-            json.dump(data, f, indent=2)
     
     def load(self):
         """Load Q-table"""
-        if os.path.exists('q_learning_data.json'):
-            try:
-                with open('q_learning_data.json', 'r') as f:
-                    data = json.load(f)
-                    
-                # Convert string keys back to tuples
-                self.q_table = {}
-                for state_str, actions in data['q_table'].items():
-                    self.q_table[eval(state_str)] = actions
-                
-                self.epsilon = data.get('epsilon', 0.3)
-                self.episodes = data.get('episodes', 0)
-                print(f"Loaded Q-Learning agent: {len(self.q_table)} states, epsilon={self.epsilon:.3f}")
-            except Exception as e:
-                print(f"Could not load Q-table: {e}")
+        try:
+            data = pvz_checkpoint.load(self.data_path)
+            if data is None:
+                return
+            
+            # Convert string keys back to tuples
+            def state_of(key):
+                return eval(key) if isinstance(key, str) else key
+            
+            self.q_table = {state_of(key): actions for key, actions in data['q_table'].items()}
+            self.state_visits = {state_of(key): visits
+                                 for key, visits in data.get('state_visits', {}).items()}
+            self.epsilon = data.get('epsilon', 0.3)
+            self.episodes = data.get('episodes', 0)
+            print(f"Loaded Q-Learning agent: {len(self.q_table)} states, epsilon={self.epsilon:.3f}")
+        except Exception as e:
+            print(f"Could not load Q-table: {e}")
 
 # Use Q-Learning agent in game
 class QLearningGame(Game):
     """Game wrapper for Q-Learning"""
     
-    def __init__(self):
-        super().__init__()
-        self.q_agent = QLearningAgent()
+    def __init__(self, seed=None, worker=0, episode=0, q_agent=None):
+        super().__init__(seed, worker, episode)
+        # A trainer passes its agent on to each new episode instead of reloading it
+        self.q_agent = QLearningAgent(self.agent_rng) if q_agent is None else q_agent
+        self.q_agent.rng = self.agent_rng
         self.previous_state = None
         self.previous_action = None
+        self.previous_events = None  # Game.events when previous_action was taken
+    
+    def _reset_game(self):
+        super()._reset_game()
+        self.q_agent.rng = self.agent_rng
+        # Nothing leads from the last game into this one
+        self.previous_state = self.previous_action = self.previous_events = None
+    
+    def _handle_game_over(self):
+        """Learn from the loss before auto-play starts the next game"""
+        self._learn_loss()
+        super()._handle_game_over()
+    
+    def _learn_loss(self):
+        """Apply the pending update as a terminal transition with the loss penalty"""
+        if self.previous_state is None:
+            return
+        game_state = {'wave': self.wave, 'level': self.level, 'game_over': True}
+        reward = self.q_agent.calculate_reward(self.previous_action,
+                                               self.events - self.previous_events, game_state)
+        self.q_agent.update_q(self.previous_state, self.previous_action, reward, None, done=True)
+        self.previous_state = self.previous_action = self.previous_events = None
+    
+    def memory_structures(self):
+        structures = super().memory_structures()
+        structures['q_table'] = self.q_agent.q_table
+        structures['state_visits'] = self.q_agent.state_visits
+        return structures
     
     def auto_play_ai_decide(self):
         """Q-Learning decision making"""
-        if self.game_over or self.paused:
+        if self.game_over:
+            self._learn_loss()  # Outside auto-play nothing else sees the loss
+            return
+        if self.paused:
             return
         
         current_time = time.time()
@@ -263,7 +334,9 @@ class QLearningGame(Game):
             'grid': self.grid,
             'suns': self.suns,
             'wave': self.wave,
-            'level': self.level
+            'level': self.level,
+            'game_over': self.game_over,
+            'action_mask': self.action_mask
         }
         
         state = self.q_agent.get_state(game_state)
@@ -272,35 +345,26 @@ class QLearningGame(Game):
         # Choose and execute action
         action = self.q_agent.choose_action(state, available_actions)
         
-        # Execute action and calculate reward
-        next_game_state = self._simulate_action(action, game_state)
-        
+        # Reward the previous action with what happened since it was taken
         if self.previous_state is not None:
-            reward = self.q_agent.calculate_reward(
-                {k: game_state[k] for k in ['sun', 'zombies', 'plants', 'grid', 'suns', 'wave', 'level']},
-                self.previous_action,
-                {k: next_game_state[k] for k in ['sun', 'zombies', 'plants', 'grid', 'suns', 'wave', 'level', 'game_over']}
-            )
+            reward = self.q_agent.calculate_reward(self.previous_action,
+                                                   self.events - self.previous_events, game_state)
             self.q_agent.update_q(self.previous_state, self.previous_action, reward, state)
         
         self.previous_state = state
         self.previous_action = action
+        self.previous_events = self.events.copy()
         
-        # Actually execute the action
+        # Execute the action
         self._execute_action(action, game_state)
         
         # Decay exploration
         self.q_agent.decay_epsilon()
         
         # Log
-        if random.random() < 0.1:  # Log 10% of actions
+        if self.cosmetic_rng.random() < 0.1:  # Log 10% of actions
             self.ai_log(f"Q: {action[:15]}... | e={self.q_agent.epsilon:.2f}")
     
-    def _simulate_action(self, action, game_state):
-        """Simulate action result for reward calculation"""
-        # Simplified simulation - just return current state
-        return {k: game_state[k] for k in ['sun', 'zombies', 'plants', 'grid', 'suns', 'wave', 'level', 'game_over']}
-    
     def _execute_action(self, action, game_state):
         """Execute the chosen action"""
         if action == 'wait':
@@ -308,33 +372,216 @@ class QLearningGame(Game):
         elif action == 'collect_sun':
             for sun in self.suns[:]:
                 if sun.active:
-                    self.sun_count += sun.value
-                    self.suns.remove(sun)
+                    self._collect_sun(sun)
                     break
         elif action.startswith('place_'):
-            # Parse action
-            if 'sunflower_back' in action:
-                plant_type = 'sunflower'
-                cols, rows = range(2), range(5)
-            elif 'peashooter_mid' in action:
-                plant_type = 'peashooter'
-                cols, rows = range(2, 5), range(5)
-            elif 'wallnut_front' in action:
-                plant_type = 'wallnut'
-                cols, rows = range(6, 8), range(5)
-            else:
+            if action not in self.q_agent.PLACEMENTS:
                 return
+            plant_type, cols = self.q_agent.PLACEMENTS[action]
             
             # Find first empty spot
             for col in cols:
-                for row in rows:
+                for row in range(GRID_ROWS):
                     if self.grid[col][row] is None:
                         self._place_plant(col, row, plant_type)
                         return
 
+def run_vec_q_learning(games=100, seed=None, envs=8, workers=None, memory=None):
+    """Train the Q-learning agent on `envs` headless full games in worker processes
+    
+    Games run in a pvz_vecenv.VecEnv; the agent acts for every env after each
+    step and learns from the rewards the env computes. Stops once `games`
+    episodes have finished.
+    """
+    if seed is None:
+        seed = random.getrandbits(32)
+    print(f"Vector Q-learning: {envs} games on {workers or 'all'} workers, seed {seed}")
+    agent = QLearningAgent(make_rng(seed, 'agent'), data_path=QLearningAgent.env_data_path)
+    if memory:
+        memory.start()
+    
+    with pvz_vecenv.VecEnv(envs, workers, seed) as env:
+        obs = env.reset()
+        states = [agent.get_state_from_obs(row) for row in obs]
+        finished = steps = 0
+        while finished < games:
+            choices = []
+            actions = np.empty(envs, dtype=np.int32)
+            for i in range(envs):
+                env_actions = agent.get_env_actions(env.masks[i])
+                choices.append(agent.choose_action(states[i], env_actions >= 0))
+                actions[i] = env_actions[agent.action_index[choices[i]]]
+            
+            obs, rewards, dones = env.step(actions)
+            steps += 1
+            for i in range(envs):
+                next_state = agent.get_state_from_obs(obs[i])
+                agent.update_q(states[i], choices[i], float(rewards[i]), next_state, bool(dones[i]))
+                states[i] = next_state
+            agent.decay_epsilon()
+            
+            for _ in range(int(dones.sum())):
+                finished += 1
+                agent.episodes += 1
+                evicted = agent.evict_states()
+                if evicted:
+                    print(f"Evicted {len(evicted)} rarely visited states from the Q-table")
+                agent.save()
+                if memory:
+                    memory.episode_done(f"episode {finished}", {'q_table': agent.q_table,
+                                                                'state_visits': agent.state_visits})
+            if steps % 100 == 0:
+                print(f"Step {steps}: {finished}/{games} episodes, Q-states: {len(agent.q_table)}, "
+                      f"Epsilon: {agent.epsilon:.3f}")
+    
+    agent.save(force=True)
+    if memory:
+        memory.stop()
+    print(f"Done: {finished} episodes in {steps} steps, Q-states: {len(agent.q_table)}")
+    return agent
+
+def _actor(index, seed, envs, batch_size, transitions, policy, stop):
+    """Actor process: play `envs` headless games with a local copy of the policy
+    
+    Sends lists of (state, action, reward, next_state, done) transitions to
+    `transitions` every `batch_size` steps, and before each batch applies the
+    learner's updates from `policy`: states it evicted, newest Q-values and
+    epsilon. The local table thus stays within the learner's max_states.
+    """
+    agent = QLearningAgent(make_rng(seed, 'agent', index), load=False, count_visits=False)
+    games = [pvz_vecenv.Game(headless=True, seed=seed, worker=index * envs + i) for i in range(envs)]
+    episodes = [0] * envs
+    obs = np.zeros((envs, pvz_vecenv.OBS_SIZE), dtype=np.float32)
+    for i, game in enumerate(games):
+        pvz_vecenv.observe(game, obs[i])
+    states = [agent.get_state_from_obs(row) for row in obs]
+    
+    batch = []
+    while not stop.is_set():
+        try:
+            while True:  # Only the newest update matters, but each carries its own states
+                q_values, evicted, agent.epsilon = policy.get_nowait()
+                for state in evicted:
+                    agent.q_table.pop(state, None)
+                agent.q_table.update(q_values)
+        except queue.Empty:
+            pass
+        
+        for i, game in enumerate(games):
+            env_actions = agent.get_env_actions(game.action_mask)
+            action = agent.choose_action(states[i], env_actions >= 0)
+            reward, done = pvz_vecenv.step_game(game, int(env_actions[agent.action_index[action]]))
+            if done:
+                episodes[i] += 1
+                games[i] = game = pvz_vecenv.Game(headless=True, seed=seed, worker=index * envs + i,
+                                                  episode=episodes[i])
+            pvz_vecenv.observe(game, obs[i])
+            next_state = agent.get_state_from_obs(obs[i])
+            batch.append((states[i], action, reward, next_state, done))
+            states[i] = next_state
+        
+        if len(batch) >= batch_size:
+            transitions.put(batch)
+            batch = []
+
+def run_actor_learner(games=100, seed=None, actors=None, envs=4, batch_size=256, sync_every=4,
+                      memory=None):
+    """Q-learning with `actors` acting processes and this process as the learner
+    
+    Each actor plays `envs` headless full games with its own copy of the
+    policy and streams transitions back in batches. The learner applies them
+    in arrival order, and after every `sync_every` batches sends each actor
+    the Q-values it changed since the last sync, the states it evicted, and
+    epsilon. Training stops once `games` episodes have finished, and fails
+    if every actor exits before that. Which transitions arrive first depends
+    on process timing, so runs are not bit-for-bit repeatable.
+    """
+    if seed is None:
+        seed = random.getrandbits(32)
+    actors = actors or max(1, (os.cpu_count() or 2) - 1)
+    print(f"Actor/learner Q-learning: {actors} actors x {envs} games, seed {seed}")
+    agent = QLearningAgent(make_rng(seed, 'agent'), data_path=QLearningAgent.env_data_path)
+    if memory:
+        memory.start()
+    
+    ctx = multiprocessing.get_context()
+    transitions = ctx.Queue(maxsize=4 * actors)  # Actors wait when the learner falls behind
+    policies = [ctx.Queue() for _ in range(actors)]
+    stop = ctx.Event()
+    changed = set(agent.q_table)  # Actors start from the loaded table
+    
+    def publish(evicted=()):
+        update = {state: dict(agent.q_table[state]) for state in changed if state in agent.q_table}
+        for policy in policies:
+            policy.put((update, list(evicted), agent.epsilon))
+        changed.clear()
+    
+    publish()
+    procs = [ctx.Process(target=_actor, name=f"pvz-actor-{i}", daemon=True,
+                         args=(i, seed, envs, batch_size, transitions, policies[i], stop))
+             for i in range(actors)]
+    for proc in procs:
+        proc.start()
+    
+    finished = batches = steps = 0
+    try:
+        while finished < games:
+            try:
+                batch = transitions.get(timeout=1.0)
+            except queue.Empty:
+                if not any(proc.is_alive() for proc in procs):
+                    codes = ", ".join(str(proc.exitcode) for proc in procs)
+                    raise RuntimeError(f"all actors exited before training finished (exit codes {codes})")
+                continue
+            batches += 1
+            for state, action, reward, next_state, done in batch:
+                agent.update_q(state, action, reward, next_state, done)
+                agent.state_visits[state] = agent.state_visits.get(state, 0) + 1  # Actors choose, so count here
+                changed.add(state)
+                steps += 1
+                if not done:
+                    continue
+                finished += 1
+                agent.episodes += 1
+                agent.save()
+                if memory:
+                    memory.episode_done(f"episode {finished}", {'q_table': agent.q_table,
+                                                                'state_visits': agent.state_visits})
+                if finished == games:  # The rest of the batch belongs to unfinished games
+                    break
+            agent.decay_epsilon()
+            
+            if batches % sync_every == 0:
+                evicted = agent.evict_states()
+                if evicted:
+                    print(f"Evicted {len(evicted)} rarely visited states from the Q-table")
+                publish(evicted)
+            if batches % 50 == 0:
+                print(f"Batch {batches}: {finished}/{games} episodes, {steps} transitions, "
+                      f"Q-states: {len(agent.q_table)}, Epsilon: {agent.epsilon:.3f}")
+    finally:
+        stop.set()
+        # Actors blocked on a full queue need it drained before they can see `stop`
+        while any(proc.is_alive() for proc in procs):
+            try:
+                transitions.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for proc in procs:
+            proc.join()
+    
+    agent.save(force=True)
+    if memory:
+        memory.stop()
+    print(f"Done: {finished} episodes from {steps} transitions, Q-states: {len(agent.q_table)}")
+    return agent
+
 # Run Q-Learning training
-def run_q_learning_training(games=100):
-    """Run Q-Learning training"""
+def run_q_learning_training(games=100, seed=None, capture=None, memory=None):
+    """Run Q-Learning training, optionally profiling the first episodes
+    
+    `memory`, a MemoryReport, is sampled after each episode.
+    """
     
     print("="*70)
     print(" " * 20 + "Q-LEARNING TRAINING" + " " * 20)
@@ -346,14 +593,19 @@ def run_q_learning_training(games=100):
     print("  - Reward-based learning")
     print("="*70)
     
-    game = QLearningGame()
+    if seed is None:
+        seed = random.getrandbits(32)
+    print(f"Seed: {seed}")
+    agent = QLearningAgent(make_rng(seed, 'agent'))  # Each episode's game swaps in its own agent stream
+    if capture:
+        capture.start()
+    if memory:
+        memory.start()
     
     for episode in range(games):
-        # Reset game
-        game = QLearningGame()
+        # Fresh game on this episode's streams, keeping the agent
+        game = QLearningGame(seed, episode=episode, q_agent=agent)
         game.auto_play = True
-        game.game_over = False
-        game._reset_game()
         
         # Run one episode
         step = 0
@@ -363,28 +615,42 @@ def run_q_learning_training(games=100):
             step += 1
             
             if step % 100 == 0:
-                print(f"Episode {episode+1}/{games}: Step {step}, Epsilon: {game.q_agent.epsilon:.3f}, "
-                      f"Q-table size: {len(game.q_agent.q_table)}")
+                print(f"Episode {episode+1}/{games}: Step {step}, Epsilon: {agent.epsilon:.3f}, "
+                      f"Q-table size: {len(agent.q_table)}")
         
         # Update agent
-        game.q_agent.episodes += 1
-        game.q_agent.save()
+        agent.episodes += 1
+        evicted = agent.evict_states()
+        if evicted:
+            print(f"Evicted {len(evicted)} rarely visited states from the Q-table")
+        agent.save()
+        if capture:
+            capture.episode_done()
+        if memory:
+            memory.episode_done(f"episode {episode+1}", game.memory_structures())
         
         # Log result
         total_waves = (game.level - 1) * 5 + game.current_level_waves
+        events = dict(zip(EVENTS, game.events.tolist()))
         print(f"Episode {episode+1}: {total_waves} waves completed | "
-              f"Q-states: {len(game.q_agent.q_table)} | "
-              f"Epsilon: {game.q_agent.epsilon:.3f}")
+              f"Kills: {events['kills']} | Plants lost: {events['plants_lost']} | "
+              f"Sun: +{events['sun_gained']}/-{events['sun_spent']} | "
+              f"Q-states: {len(agent.q_table)} | "
+              f"Epsilon: {agent.epsilon:.3f}")
     
     print("\n" + "="*70)
     print("Training Complete!")
     print("="*70)
-    game.q_agent.save()
+    agent.save(force=True)
+    if capture:
+        capture.stop()
+    if memory:
+        memory.stop()
     
     # Show top Q-values for some states
     print("\nSample Q-Values:")
     state_count = 0
-    for state, actions in list(game.q_agent.items())[:10]:
+    for state, actions in list(agent.q_table.items())[:10]:
         print(f"  State {state}:")
         for action, value in sorted(actions.items(), key=lambda x: x[1], reverse=True)[:3]:
             print(f"    {action}: {value:.3f}")
@@ -393,4 +659,30 @@ def run_q_learning_training(games=100):
             break
 
 if __name__ == "__main__":
-    run_q_learning_training(games=100)
+    parser = argparse.ArgumentParser(description="PVZ Q-learning training")
+    parser.add_argument("--games", type=int, default=100, help="episodes to train")
+    parser.add_argument("--seed", type=int, help="base seed for the per-episode streams")
+    parser.add_argument("--vec-envs", type=int, metavar="N",
+                        help="train on N headless full games in worker processes instead")
+    parser.add_argument("--workers", type=int, help="worker processes for --vec-envs (default: all cores)")
+    parser.add_argument("--actors", type=int, metavar="N",
+                        help="learn in this process from N actor processes playing full games")
+    parser.add_argument("--actor-envs", type=int, default=4, help="games per actor")
+    parser.add_argument("--sync-every", type=int, default=4,
+                        help="transition batches between policy updates sent to the actors")
+    pvz_kernels.add_arguments(parser)
+    add_profile_arguments(parser)
+    add_memory_arguments(parser)
+    pvz_checkpoint.add_arguments(parser)
+    args = parser.parse_args()
+    pvz_kernels.from_args(args)
+    pvz_checkpoint.from_args(args)
+    if args.actors:
+        run_actor_learner(args.games, args.seed, args.actors, args.actor_envs,
+                          sync_every=args.sync_every, memory=MemoryReport.from_args(args))
+    elif args.vec_envs:
+        run_vec_q_learning(args.games, args.seed, args.vec_envs, args.workers,
+                           MemoryReport.from_args(args))
+    else:
+        run_q_learning_training(args.games, args.seed, Capture.from_args(args),
+                                MemoryReport.from_args(args))
@@ -1,16 +1,36 @@
 #!/usr/bin/env python3
-"""PVZ AI Training - Simple 1000 episodes"""
+"""PVZ AI Training - Simple 1000 episodes
 
-import random, time, json, threading
+    python ai/train.py              # fresh run, checkpointed to train_checkpoint.json
+    python ai/train.py --resume     # continue an interrupted run where it stopped
+
+The checkpoint holds everything a run depends on: the episode counter, genes,
+score history, mutation trail, evolution RNG state and the progress display's
+clock. Episodes draw from streams seeded per episode, so a resumed run ends
+with exactly the scores and genes of an uninterrupted one.
+"""
+
+import random, time, json, threading, argparse, os, sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from pvz_profile import Capture, add_arguments as add_profile_arguments
+from pvz_memory import MemoryReport, add_arguments as add_memory_arguments
+import pvz_checkpoint
+import pvz_threads
+from pvz_game import make_rng
 
 TOTAL = 1000
-current = [0]
-scores = []
-best = [0]
-genes = {'sun': 1.0, 'def': 1.0, 'row': 1.0, 'wall': 1.0, 'aggro': 1.0}
+SEED = 0
+CHECKPOINT = 'train_checkpoint.json'
+EVOLVE_EVERY = 150
+REPORT_EVERY = 100
+GENES = {'sun': 1.0, 'def': 1.0, 'row': 1.0, 'wall': 1.0, 'aggro': 1.0}
 
-def episode(g):
+def episode(g, rng):
+    """Score of one toy-model game: waves reached plus kill and wave bonuses, or -100 if lost"""
     sun, wave, level = 350, 1, 1
+    score = 0
     grid = [[None]*5 for _ in range(9)]
     zombies = []
     plants = []
@@ -18,8 +38,8 @@ def episode(g):
     for step in range(300):
         # Spawn
         if step % 25 == 0 and len(zombies) < 3 + wave:
-            row = random.randint(0, 4)
-            zombies.append([row, 120, 800])
+            row = rng.randint(0, 4)
+            zombies.append([row, 800, 120])  # row, x, hp
         
         # AI
         actions = []
@@ -47,16 +67,16 @@ def episode(g):
         for a in actions:
             s = 0
             if a[0] == 'sf':
-                s = 50 * genes['sun'] + (2 - a[1]) * 10
+                s = 50 * g['sun'] + (2 - a[1]) * 10
             elif a[0] == 'ps':
                 row = a[2]
-                s = 100 * genes['row']
+                s = 100 * g['row']
                 if any(z[0] == row for z in zombies):
                     s *= 2
                 s -= abs(4 - a[1]) * 5
             elif a[0] == 'wn':
-                s = 40 * genes['wall'] + a[1] * 5
-            s += genes['aggro'] * 10
+                s = 40 * g['wall'] + a[1] * 5
+            s += g['aggro'] * 10
             
             if s > best_score:
                 best_score = s
@@ -117,56 +137,300 @@ def episode(g):
                 level += 1
                 wave = 1
                 score += 10
-        
-        return (level - 1) * 5 + wave
+    
+    return (level - 1) * 5 + wave + score
+
+STEPS = 300
+SPAWN_EVERY = 25
+MAX_SPAWNS = -(-STEPS // SPAWN_EVERY)  # At most one zombie per spawn step
+
+def episodes(g, rngs):
+    """episode() for a batch of games at once, one per generator in `rngs`
+
+    Genes in `g` are scalars or arrays with one value per game, so a batch can
+    evaluate many gene settings together. Returns an array of scores equal to
+    [episode(g_i, rng) for each game] given generators in the same states.
+    """
+    n = len(rngs)
+    g = {k: np.broadcast_to(np.asarray(v, dtype=float), (n,)) for k, v in g.items()}
+    games = np.arange(n)
+    # Spawn rows are the only draws, made in spawn order, so draw them up front
+    spawn_rows = np.array([[rng.randint(0, 4) for _ in range(MAX_SPAWNS)] for rng in rngs],
+                          dtype=np.int64).reshape(n, MAX_SPAWNS)
+
+    sun = np.full(n, 350)
+    wave = np.ones(n, dtype=np.int64)
+    level = np.ones(n, dtype=np.int64)
+    score = np.zeros(n, dtype=np.int64)
+    result = np.zeros(n, dtype=np.int64)
+    done = np.zeros(n, dtype=bool)
+
+    # The AI only scans column 0 for sunflowers and column 2 for peashooters,
+    # so the board is those two columns by row. A cell stays taken after its
+    # plant dies; the plant is in play while its hp > 0.
+    sf_taken = np.zeros((n, 5), dtype=bool)
+    ps_taken = np.zeros((n, 5), dtype=bool)
+    sf_hp = np.zeros((n, 5))
+    ps_hp = np.zeros((n, 5))
+    # Zombies by spawn slot, which is also their order in episode()'s list
+    z_row = np.zeros((n, MAX_SPAWNS), dtype=np.int64)
+    z_x = np.zeros((n, MAX_SPAWNS))
+    z_hp = np.zeros((n, MAX_SPAWNS))
+    z_alive = np.zeros((n, MAX_SPAWNS), dtype=bool)
+    spawned = np.zeros(n, dtype=np.int64)
+    bite_x = 120 + np.arange(5) * 80 + 40
+
+    for step in range(STEPS):
+        live = ~done
+
+        # Spawn
+        if step % SPAWN_EVERY == 0:
+            spawn = live & (z_alive.sum(axis=1) < 3 + wave)
+            idx, slot = games[spawn], spawned[spawn]
+            z_row[idx, slot] = spawn_rows[idx, slot]
+            z_x[idx, slot] = 800
+            z_hp[idx, slot] = 120
+            z_alive[idx, slot] = True
+            spawned += spawn
+
+        # AI: first free row of each column
+        sf_row = np.argmin(sf_taken, axis=1)
+        ps_row = np.argmin(ps_taken, axis=1)
+        can_sf = live & (sun >= 50) & ~sf_taken[games, sf_row]
+        can_ps = live & (sun >= 100) & ~ps_taken[games, ps_row]
+        zombie_in_ps_row = (z_alive & (z_row == ps_row[:, None])).any(axis=1)
+
+        # Score, in episode()'s order of operations so floats round the same
+        s_sf = 50 * g['sun'] + (2 - 0) * 10 + g['aggro'] * 10
+        s_ps = 100 * g['row']
+        s_ps = np.where(zombie_in_ps_row, s_ps * 2, s_ps)
+        s_ps = s_ps - abs(4 - 2) * 5 + g['aggro'] * 10
+        s_w = 0 + g['aggro'] * 10
+
+        # Candidates in order sf, ps, wait: the first one starts as the pick and
+        # a later one replaces it only with a strictly higher score
+        pick = np.where(can_sf, 0, np.where(can_ps, 1, 2))
+        best_score = np.full(n, -999.0)
+        for action, allowed, s in ((0, can_sf, s_sf), (1, can_ps, s_ps), (2, True, s_w)):
+            better = allowed & (s > best_score)
+            pick = np.where(better, action, pick)
+            best_score = np.where(better, s, best_score)
+        place_sf = live & (pick == 0)
+        place_ps = live & (pick == 1)
+
+        # Execute
+        idx = games[place_sf]
+        sf_taken[idx, sf_row[idx]] = True
+        sf_hp[idx, sf_row[idx]] = 80
+        sun = sun - 50 * place_sf
+        idx = games[place_ps]
+        ps_taken[idx, ps_row[idx]] = True
+        ps_hp[idx, ps_row[idx]] = 100
+        sun = sun - 100 * place_ps
+
+        # Zombies
+        sf_in_play = sf_taken & (sf_hp > 0) & live[:, None]
+        ps_in_play = ps_taken & (ps_hp > 0) & live[:, None]
+        z_x = np.where(z_alive, z_x - 0.35, z_x)
+
+        # Attack: episode() matches plants with (row, col) swapped, so a plant
+        # in columns 0-4 is bitten by every zombie near x = 160 + 80 * its row
+        # Those spots are 80 apart, so a zombie can only be near the closest one
+        spot = np.clip(np.floor((z_x - 130) / 80), 0, 4).astype(np.int64)
+        near = z_alive & (np.abs(z_x - bite_x[spot]) < 30)
+        bites = 1.5 * np.bincount((games[:, None] * 5 + spot)[near], minlength=n * 5).reshape(n, 5)
+        sf_hp -= np.where(sf_in_play, bites, 0)
+        ps_hp -= np.where(ps_in_play, bites, 0)
+
+        # Peashooter: the one in column 2 of a zombie's row hits it once it is past x = 280
+        hits = z_alive & ps_in_play[games[:, None], z_row] & (z_x > 120 + 2 * 80)
+        # A hit that leaves the zombie at or below 0 hp scores 5
+        score += 5 * (hits & (z_hp <= 25)).sum(axis=1)
+        z_hp -= 25 * hits
+
+        # Cleanup
+        z_alive &= z_hp > 0
+
+        # Game over?
+        lost = live & (z_alive & (z_x < 100)).any(axis=1)
+        result[lost] = -100
+        done |= lost
+
+        # Wave
+        if step % SPAWN_EVERY == 0:
+            cleared = ~done & ~z_alive.any(axis=1)
+            wave += cleared
+            score += 5 * cleared
+            up = cleared & (wave > 5)
+            level += up
+            wave[up] = 1
+            score += 10 * up
+
+    return np.where(done, result, (level - 1) * 5 + wave + score)
+
+# ---- Run state ----
+
+def new_run(seed=SEED):
+    return {
+        'seed': seed,
+        'episode': 0,  # Episodes finished
+        'genes': dict(GENES),
+        'scores': [],
+        'mutations': [],  # (episode, gene, new value)
+        'evolve_rng': make_rng(seed, 'agent'),
+        'elapsed': 0.0,  # Training seconds before this process, for the display
+        'started': time.time(),
+    }
+
+def snapshot(run, fmt):
+    """A checkpoint of `run` that later episodes cannot change"""
+    return {
+        'seed': run['seed'],
+        'episode': run['episode'],
+        'genes': dict(run['genes']),
+        'scores': list(run['scores']),
+        'mutations': list(run['mutations']),
+        'evolve_rng': run['evolve_rng'].getstate(),
+        'elapsed': elapsed(run),
+    }
+
+def restore(data):
+    """A run continuing from checkpoint `data`"""
+    run = new_run(data['seed'])
+    run.update(episode=data['episode'], genes=data['genes'], scores=data['scores'],
+               mutations=[tuple(m) for m in data['mutations']], elapsed=data['elapsed'])
+    # JSON turns the state's tuples into lists
+    version, internal, gauss_next = data['evolve_rng']
+    run['evolve_rng'].setstate((version, tuple(internal), gauss_next))
+    return run
+
+def elapsed(run):
+    return run['elapsed'] + time.time() - run['started']
+
+# ---- Display ----
+
+def display(run, total, stop):
+    while not stop.wait(2):
+        ep = run['episode']
+        scores = run['scores']
 
-def display():
-    while current[0] < TOTAL:
-        time.sleep(2)
-        ep = current[0]
-        
         if scores:
             avg = sum(scores[-100:]) / min(len(scores), 100)
             best = max(scores)
         else:
             avg = best = 0
-        
-        pct = (ep / TOTAL) * 100
+
+        pct = (ep / total) * 100
         bar = '[' + '=' * int(pct / 2) + ' ' * (50 - int(pct / 2)) + ']'
-        
-        print(f"\r{bar} {ep}/{TOTAL} ({pct:.0f}%) | Avg: {avg:.1f} | Best: {best} | "
-              f"{time.strftime('%H:%M:%S')}", end='', flush=True)
-        
-        if ep % 100 == 0 and ep > 0:
-            print(f"\n{'='*55}\nEp {ep-99}-{ep}:\n")
-            recent = scores[-100:]
-            print(f"Avg: {sum(recent)/len(recent):.1f}")
-            print(f"Best: {max(recent)}")
-            print(f"Genes: {genes}")
-            
-            with open('result.json', 'w') as f:
-                json.dump({'episode': ep, 'best': best, 'genes': genes}, f)
-        
-        if ep >= TOTAL:
-            print(f"\nDone! Best: {best[0]}")
 
-# Train
-thread = threading.Thread(target=display, daemon=True)
-thread.start()
+        print(f"\r{bar} {ep}/{total} ({pct:.0f}%) | Avg: {avg:.1f} | Best: {best} | "
+              f"{elapsed(run):.0f}s", end='', flush=True)
 
-for i in range(TOTAL):
-    sc = episode(genes)
-    scores.append(sc)
-    current[0] = i + 1
-    
-    # Evolve every 150
-    if i > 0 and i % 150 == 0:
-        # Mutation
-        k = random.choice(list(genes.keys()))
-        genes[k] *= random.uniform(0.85, 1.15)
-        print(f"\nEvolution at {i}: {k} -> {genes[k]:.3f}")
+def report_block(run):
+    """Summary of the last REPORT_EVERY episodes, also written to result.json"""
+    ep = run['episode']
+    recent = run['scores'][-REPORT_EVERY:]
+    best = max(run['scores'])
+    print(f"\n{'='*55}\nEp {ep-REPORT_EVERY+1}-{ep}:\n")
+    print(f"Avg: {sum(recent)/len(recent):.1f}")
+    print(f"Best: {max(recent)}")
+    print(f"Genes: {run['genes']}")
+    pvz_checkpoint.write_atomic('result.json', json.dumps(
+        {'episode': ep, 'best': best, 'genes': run['genes']}).encode())
+
+# ---- Training ----
+
+def train(total=TOTAL, seed=SEED, resume=False, capture=None, memory=None, scalar=False,
+          threads=0):
+    """Run (or continue) training up to `total` episodes; returns the run state
+
+    Episodes run in batches through episodes(), or one by one through
+    episode() with `scalar`; both give the same scores. With `threads` the
+    episodes (or slices of the batch) are spread over a thread pool, see
+    pvz_threads; the scores do not depend on it.
+    """
+    data = pvz_checkpoint.load(CHECKPOINT) if resume else None
+    if data is not None:
+        run = restore(data)
+        print(f"Resuming at episode {run['episode']} (seed {run['seed']})")
+    else:
+        run = new_run(seed)
+    checkpoint = pvz_checkpoint.writer(CHECKPOINT)
+
+    if capture:
+        capture.start()
+    if memory:
+        memory.start()
+    stop = threading.Event()
+    thread = threading.Thread(target=display, args=(run, total, stop), daemon=True)
+    thread.start()
+
+    genes = run['genes']
+    while run['episode'] < total:
+        # Genes only change after an evolution episode, so every episode up to
+        # the next one (or the next report) is simulated as one batch
+        i = run['episode']
+        evolution = max(EVOLVE_EVERY, -(-i // EVOLVE_EVERY) * EVOLVE_EVERY)
+        end = min(total, evolution + 1, (i // REPORT_EVERY + 1) * REPORT_EVERY)
+        rngs = [make_rng(run['seed'], 'spawn', episode=j) for j in range(i, end)]
+        if scalar:
+            batch = pvz_threads.run_episodes(lambda rng: episode(genes, rng), rngs, threads)
+        else:
+            parts = pvz_threads.run_episodes(lambda chunk: episodes(genes, chunk).tolist(),
+                                             pvz_threads.split(rngs, threads or pvz_threads.default_threads()),
+                                             threads)
+            batch = [sc for part in parts for sc in part]
+        for j, sc in enumerate(batch, i):
+            run['scores'].append(sc)
+            run['episode'] = j + 1
+            if capture:
+                capture.episode_done()
+            if memory:
+                memory.episode_done(f"episode {j + 1}", {'scores': run['scores'], 'genes': genes})
+
+        # Evolve every 150
+        if end - 1 == evolution:
+            # Mutation
+            k = run['evolve_rng'].choice(list(genes.keys()))
+            genes[k] *= run['evolve_rng'].uniform(0.85, 1.15)
+            run['mutations'].append((evolution, k, genes[k]))
+            print(f"\nEvolution at {evolution}: {k} -> {genes[k]:.3f}")
+
+        if end % REPORT_EVERY == 0:
+            report_block(run)
+        checkpoint.save(lambda fmt: snapshot(run, fmt))
+
+    checkpoint.save(lambda fmt: snapshot(run, fmt), force=True)
+    checkpoint.flush()
+    stop.set()
+    thread.join()
+    if capture:
+        capture.stop()
+    if memory:
+        memory.stop()
+    return run
+
+def main():
+    parser = argparse.ArgumentParser(description="Simple genetic training")
+    parser.add_argument("--episodes", type=int, default=TOTAL, help="train until this many episodes")
+    parser.add_argument("--seed", type=int, default=SEED, help="base seed of a fresh run")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"continue from {CHECKPOINT} if it exists")
+    parser.add_argument("--scalar", action="store_true",
+                        help="simulate one episode at a time (the reference model)")
+    pvz_threads.add_arguments(parser)
+    add_profile_arguments(parser)
+    add_memory_arguments(parser)
+    pvz_checkpoint.add_arguments(parser)
+    args = parser.parse_args()
+    pvz_checkpoint.from_args(args)
 
-thread.join()
+    run = train(args.episodes, args.seed, args.resume, Capture.from_args(args),
+                MemoryReport.from_args(args), args.scalar, args.threads)
+    scores = run['scores']
+    print(f"\nDone! Best: {max(scores) if scores else 0}")
+    if scores:
+        print(f"Avg: {sum(scores)/len(scores):.1f}")
 
-print(f"\nFinal: {best[0]}")
-print(f"Avg: {sum(scores)/len(scores):.1f}")
+if __name__ == "__main__":
+    main()
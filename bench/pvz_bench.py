@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+PVZ Benchmark - simulation and rendering throughput on fixed scenarios
+
+    python bench/pvz_bench.py                       # all scenarios, JSON to stdout
+    python bench/pvz_bench.py -s pea_storm -t 600   # one scenario, 600 ticks
+    python bench/pvz_bench.py -o results.json
+
+Every scenario is built from a fixed seed and measured on four paths:
+  step      windowed rules, Game.update() once per tick (what the game runs)
+  headless  Game(headless=True).update() once per tick, analytic peas
+  simulate  Game(headless=True).simulate(), skipping quiet stretches
+  render    Game.draw() only, on a frozen board
+plus the cost of one rule-based AI decision (Game.ai_decide) on that board.
+--compare-kernels also runs step and headless once per contact kernel backend
+(see src/pvz_kernels.py) and checks that every backend ends on the same board,
+after checking each array kernel against the reference loop (kernel_check).
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+# Runs without a display on Linux servers
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import pygame
+import pvz_kernels
+from pvz_game import (Game, Plant, Zombie, GRID_COLS, GRID_ROWS, PHASE_AI, PHASE_SPAWN,
+                      PHASE_ECONOMY, PHASE_PLANTS, PHASE_PLANT_DEATH, PHASE_ZOMBIES,
+                      PHASE_PEAS, PHASE_SUNS)
+
+SEED = 1234
+
+# Scheduler phases as reported; the inline loops are timed under their method names
+PHASE_NAMES = {
+    PHASE_AI: "ai",
+    PHASE_SPAWN: "spawn",
+    PHASE_ECONOMY: "economy",
+    PHASE_PLANTS: "plants",
+    PHASE_PLANT_DEATH: "plant_death",
+    PHASE_ZOMBIES: "bites",
+    PHASE_PEAS: "shots",
+    PHASE_SUNS: "sun_expiry",
+}
+UPDATE_METHODS = {
+    "_update_zombies": "zombies",
+    "_update_peas": "peas",
+    "_replan_lanes": "lanes",
+    "_update_suns": "suns",
+}
+DRAW_METHODS = {
+    "draw_grid": "grid",
+    "draw_ui": "ui",
+}
+
+
+# ---- Scenarios ----
+
+def _plant(game, col, row, plant_type, hp=None):
+    plant = Plant(col, row, plant_type, game.cosmetic_rng)
+    if hp is not None:
+        plant.hp = plant.max_hp = hp
+    game._add_plant(plant)
+
+
+def _stop_spawning(game):
+    """Keep the current zombies as the last of the wave"""
+    game.scheduler.cancel(game.spawn_event)
+    game.zombies_to_spawn = game.zombies_spawned
+    game.zombies_left = len(game.zombies)
+
+
+def empty_lawn(headless):
+    """Fresh game, nothing planted: spawning, natural sun and walking zombies"""
+    return Game(headless=headless, seed=SEED)
+
+
+def full_defense(headless):
+    """Every one of the 15x5 cells planted, normal waves"""
+    game = Game(headless=headless, seed=SEED)
+    layout = (["sunflower"] * 3 + ["peashooter", "repeater"] * 4 + ["peashooter"]
+              + ["wallnut"] * 3)
+    for col, plant_type in enumerate(layout):
+        for row in range(GRID_ROWS):
+            _plant(game, col, row, plant_type)
+    game.wave = 6
+    return game
+
+
+def late_waves(headless):
+    """Wave 12 with 150 zombies released in quick succession against a thin defense"""
+    game = Game(headless=headless, seed=SEED)
+    for row in range(GRID_ROWS):
+        _plant(game, 2, row, "peashooter")
+        _plant(game, 6, row, "wallnut", hp=10 ** 9)
+    game.wave = 12
+    game.zombies_to_spawn = game.zombies_left = 150
+    game.spawn_interval = 0.1
+    game._schedule_spawn()
+    for _ in range(900):
+        game.update()
+    return game
+
+
+def pea_storm(headless):
+    """Rows of repeaters firing at unkillable zombies, so the lawn is full of peas"""
+    game = Game(headless=headless, seed=SEED)
+    for row in range(GRID_ROWS):
+        for col in range(GRID_COLS - 2):
+            _plant(game, col, row, "repeater")
+        _plant(game, GRID_COLS - 1, row, "wallnut", hp=10 ** 9)
+        zombie = Zombie(row, "football", game.cosmetic_rng)
+        zombie.hp = zombie.max_hp = 10 ** 9
+        game._add_zombie(zombie)
+    _stop_spawning(game)
+    for _ in range(600):
+        game.update()
+    return game
+
+
+SCENARIOS = {
+    "empty_lawn": empty_lawn,
+    "full_defense": full_defense,
+    "late_waves": late_waves,
+    "pea_storm": pea_storm,
+}
+
+
+# ---- Phase timing ----
+
+class PhaseClock:
+    """Wraps a game's scheduler phases and update/draw helpers with timers"""
+
+    def __init__(self, game, methods, alloc=False):
+        self.alloc = alloc
+        self.time_ns = {}
+        self.peak_bytes = {}
+        self._run_due = game.scheduler.run_due
+        game.scheduler.run_due = self._timed_run_due
+        for method, name in methods.items():
+            setattr(game, method, self._wrap(name, getattr(game, method)))
+
+    def _record(self, name, start):
+        self.time_ns[name] = self.time_ns.get(name, 0) + time.perf_counter_ns() - start
+        if self.alloc:
+            peak = tracemalloc.get_traced_memory()[1] - self._base
+            self.peak_bytes[name] = max(self.peak_bytes.get(name, 0), peak)
+
+    def _begin(self):
+        if self.alloc:
+            tracemalloc.reset_peak()
+            self._base = tracemalloc.get_traced_memory()[0]
+        return time.perf_counter_ns()
+
+    def _timed_run_due(self, now, phase):
+        start = self._begin()
+        self._run_due(now, phase)
+        self._record(PHASE_NAMES[phase], start)
+
+    def _wrap(self, name, method):
+        def timed(*args):
+            start = self._begin()
+            result = method(*args)
+            self._record(name, start)
+            return result
+        return timed
+
+
+def _entities(game):
+    return {
+        "plants": len(game.plants),
+        "zombies": len(game.zombies),
+        "peas": len(game.peas) + sum(len(shots) for shots in game.shots),
+        "suns": len(game.suns),
+        "game_over": game.game_over,
+    }
+
+
+# ---- Measurements ----
+
+def _run(build, mode, ticks):
+    game = build(mode != "step")
+    first = game.ticks
+    start = time.perf_counter()
+    if mode == "simulate":
+        game.simulate(first + ticks)
+    else:
+        for _ in range(ticks):
+            game.update()
+    done = game.ticks - first  # Short of `ticks` if the game was lost
+    elapsed = time.perf_counter() - start
+    return game, done, elapsed
+
+
+def bench_sim(build, mode, ticks, repeat):
+    """Best-of-`repeat` ticks/sec for one path, plus a timed run for the phase split"""
+    samples = []
+    for _ in range(repeat):
+        game, done, elapsed = _run(build, mode, ticks)
+        samples.append(round(done / elapsed if elapsed else 0.0, 1))
+
+    result = {"ticks_per_sec": max(samples), "samples": samples, "end": _entities(game)}
+    if mode != "simulate":
+        game = build(mode != "step")
+        clock = PhaseClock(game, UPDATE_METHODS)
+        start = time.perf_counter_ns()
+        for _ in range(ticks):
+            game.update()
+        total = time.perf_counter_ns() - start
+        result["phase_us_per_tick"] = _per_tick(clock.time_ns, total, ticks)
+    return result
+
+
+def bench_render(build, frames, repeat):
+    game = build(False)
+    game.draw()  # Warm font and surface caches
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(frames):
+            game.draw()
+        elapsed = time.perf_counter() - start
+        samples.append(round(frames / elapsed if elapsed else 0.0, 1))
+
+    clock = PhaseClock(game, DRAW_METHODS)
+    start = time.perf_counter_ns()
+    for _ in range(frames):
+        game.draw()
+    total = time.perf_counter_ns() - start
+    phases = _per_tick(clock.time_ns, total, frames)
+    phases["entities"] = phases.pop("other")
+    return {"frames_per_sec": max(samples), "samples": samples, "phase_us_per_frame": phases}
+
+
+def bench_agent(build, calls, repeat):
+    """Cost of one Game.ai_decide() call, replayed from the same board each run"""
+    samples = []
+    for _ in range(repeat):
+        game = build(True)
+        start = time.perf_counter()
+        for _ in range(calls):
+            game.ai_decide()
+        samples.append(round((time.perf_counter() - start) / calls * 1e6, 2))
+    return {"decide_us": min(samples), "samples": samples}
+
+
+def bench_alloc(build, mode, ticks):
+    """Memory allocated while running: net growth, overall peak, per-phase transient peak"""
+    game = build(mode == "headless")
+    methods = UPDATE_METHODS if mode != "render" else DRAW_METHODS
+    tracemalloc.start()
+    clock = PhaseClock(game, methods, alloc=True)
+    blocks = sys.getallocatedblocks()
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for _ in range(ticks):
+        if mode == "render":
+            game.draw()
+        else:
+            game.update()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "net_bytes": current - start,
+        "peak_bytes": peak - start,
+        "net_blocks": sys.getallocatedblocks() - blocks,
+        "phase_peak_bytes": dict(sorted(clock.peak_bytes.items())),
+    }
+
+
+def _board(game):
+    """Positions and hit points of everything on the board, to compare runs exactly"""
+    return ([(z.row, z.x, z.hp, z.dying) for z in game.zombies],
+            [(p.col, p.row, p.hp) for p in game.plants],
+            [(p.row, p.x) for p in game.peas], game.ticks, game.game_over)
+
+
+def bench_kernels(build, ticks, repeat):
+    """Step and headless ticks/sec per kernel backend; backends not installed are listed as null"""
+    previous = pvz_kernels.backend
+    results = {}
+    boards = {}
+    try:
+        for name in pvz_kernels.BACKENDS:
+            if name not in pvz_kernels.available():
+                results[name] = None
+                continue
+            pvz_kernels.set_backend(name)
+            _run(build, "step", 1)  # Compile or warm the kernel outside the timing
+            entry = {}
+            for mode in ("step", "headless"):
+                samples = []
+                for _ in range(repeat):
+                    game, done, elapsed = _run(build, mode, ticks)
+                    samples.append(round(done / elapsed if elapsed else 0.0, 1))
+                    boards.setdefault(mode, {})[name] = _board(game)
+                entry[mode] = {"ticks_per_sec": max(samples), "samples": samples}
+            results[name] = entry
+    finally:
+        pvz_kernels.set_backend(previous)
+    results["identical"] = all(len(set(map(repr, runs.values()))) == 1 for runs in boards.values())
+    return results
+
+
+def _per_tick(time_ns, total_ns, ticks):
+    phases = {name: round(ns / ticks / 1000, 2) for name, ns in sorted(time_ns.items())}
+    phases["other"] = round(max(0, total_ns - sum(time_ns.values())) / ticks / 1000, 2)
+    phases["total"] = round(total_ns / ticks / 1000, 2)
+    return phases
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "pygame": pygame.version.ver,
+        "sdl_video": os.environ.get("SDL_VIDEODRIVER"),
+        "kernels": pvz_kernels.backend,
+    }
+
+
+def run_benchmarks(scenarios=None, ticks=1200, frames=60, repeat=3, alloc=True, kernels=False):
+    """Run the suite and return the results as a JSON-ready dict"""
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "settings": {"ticks": ticks, "frames": frames, "repeat": repeat, "seed": SEED},
+        "scenarios": {},
+    }
+    if kernels:
+        results["kernel_check"] = pvz_kernels.check()
+        print(f"kernel check against the reference loop: {results['kernel_check']}", file=sys.stderr)
+    for name in scenarios or SCENARIOS:
+        build = SCENARIOS[name]
+        entry = {"start": _entities(build(True))}
+        entry["sim"] = {mode: bench_sim(build, mode, ticks, repeat)
+                        for mode in ("step", "headless", "simulate")}
+        entry["render"] = bench_render(build, frames, repeat)
+        entry["agent"] = bench_agent(build, 200, repeat)
+        if alloc:
+            entry["alloc"] = {
+                "step": bench_alloc(build, "step", min(ticks, 300)),
+                "render": bench_alloc(build, "render", min(frames, 20)),
+            }
+        if kernels:
+            entry["kernels"] = bench_kernels(build, ticks, repeat)
+            print(f"{name} kernels: " + ", ".join(
+                f"{backend} {entry['kernels'][backend]['step']['ticks_per_sec']} t/s"
+                for backend in pvz_kernels.available())
+                + ("" if entry["kernels"]["identical"] else " (BOARDS DIFFER)"), file=sys.stderr)
+        results["scenarios"][name] = entry
+        print(f"{name}: step {entry['sim']['step']['ticks_per_sec']} t/s, "
+              f"headless {entry['sim']['headless']['ticks_per_sec']} t/s, "
+              f"simulate {entry['sim']['simulate']['ticks_per_sec']} t/s, "
+              f"render {entry['render']['frames_per_sec']} fps, "
+              f"decide {entry['agent']['decide_us']} us", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PVZ simulation and rendering")
+    parser.add_argument("-s", "--scenario", action="append", choices=list(SCENARIOS),
+                        help="scenario to run (repeatable; default all)")
+    parser.add_argument("-t", "--ticks", type=int, default=1200, help="ticks per simulation run")
+    parser.add_argument("-f", "--frames", type=int, default=60, help="frames per render run")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs per path, best is kept")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--compare-kernels", action="store_true",
+                        help="also time every installed contact kernel backend")
+    pvz_kernels.add_arguments(parser)
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+    pvz_kernels.from_args(args)
+
+    results = run_benchmarks(args.scenario, args.ticks, args.frames, args.repeat,
+                             alloc=not args.no_alloc, kernels=args.compare_kernels)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
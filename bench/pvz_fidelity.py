@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+PVZ Fidelity - how well ai/train.py's surrogate ranks policies for the real game
+
+    python bench/pvz_fidelity.py                 # 24 policies x 4 seeds, JSON to stdout
+    python bench/pvz_fidelity.py -p 50 -k 8 -o fidelity.json
+
+train.py tunes genes against a toy model: 9 columns at 120 + c*80, no sun
+income, one decision per step. This runs the same gene-driven policies through
+that surrogate (train.episodes) and through the full rules engine
+(src/pvz_game.py, headless) on shared seeds: episode i of both uses seed
+--seed and episode number i. Both are scored with train.episode()'s formula:
+waves reached, +5 per kill, +5 per wave cleared, +10 per five waves, or -100
+when the zombies get in.
+
+The report gives the Pearson and rank (Spearman) correlation of the mean score
+per policy and of single games, how often both agree on the better of two
+policies, and games per second on each side. A surrogate whose rank
+correlation stays above --safe-correlation can pick genes on its own; below it,
+candidates need checking in the full game.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+# Runs without a display on Linux servers
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "ai"))
+
+import pvz_kernels
+import pvz_threads
+from pvz_game import Game, AI_ACTION_TICKS, EVENT_KILLS, GRID_ROWS
+import train
+
+SEED = 1234
+SAFE_CORRELATION = 0.7
+GENE_RANGE = (0.25, 4.0)  # Genes are drawn log-uniformly from this range
+
+
+# ---- Policies ----
+
+def random_policies(count, seed):
+    """`count` gene settings; genes the toy model ignores stay at their defaults"""
+    rng = random.Random(f"{seed}/policies")
+    low, high = np.log(GENE_RANGE)
+    return [{gene: (float(np.exp(rng.uniform(low, high))) if gene in ("sun", "row", "aggro") else value)
+             for gene, value in train.GENES.items()}
+            for _ in range(count)]
+
+
+def decide(game, g):
+    """train.episode()'s decision rule on the full game's board
+
+    Sunflowers go in the first free row of column 0, peashooters in column 2,
+    scored exactly as in the surrogate. Unlike the surrogate the full game only
+    earns sun by collecting it, so every sun on the lawn is collected first.
+    """
+    for sun in list(game.suns):
+        game.collect_sun(sun)
+
+    actions = []
+    if game.sun_count >= 50:
+        row = next((r for r in range(GRID_ROWS) if game.grid[0][r] is None), None)
+        if row is not None:
+            actions.append(("sunflower", 0, row, 50 * g['sun'] + (2 - 0) * 10))
+    if game.sun_count >= 100:
+        row = next((r for r in range(GRID_ROWS) if game.grid[2][r] is None), None)
+        if row is not None:
+            s = 100 * g['row']
+            if game.zombies_by_row[row] > 0:
+                s *= 2
+            actions.append(("peashooter", 2, row, s - abs(4 - 2) * 5))
+    actions.append((None, None, None, 0))
+
+    best, best_score = actions[0], -999
+    for action in actions:
+        s = action[3] + g['aggro'] * 10
+        if s > best_score:
+            best, best_score = action, s
+    if best[0] is not None:
+        game.place_plant(best[1], best[2], best[0])
+
+
+def outcome(wave, kills):
+    """train.episode()'s score for a game that ends alive on `wave`"""
+    cleared = wave - 1
+    return wave + 5 * kills + 5 * cleared + 10 * (cleared // 5)
+
+
+# ---- Runs ----
+
+def run_full(g, seed, episode, steps):
+    """Score of one full-rules game: one decision every AI_ACTION_TICKS for `steps` decisions"""
+    game = Game(headless=True, seed=seed, episode=episode)
+    for _ in range(steps):
+        decide(game, g)
+        game.simulate(game.ticks + AI_ACTION_TICKS)
+        if game.game_over:
+            return -100
+    return outcome(game.wave, int(game.events[EVENT_KILLS]))
+
+
+def run_surrogate(policies, seed, seeds_per_policy):
+    """Scores of every (policy, seed) pair in one batch, shape (policies, seeds)"""
+    genes = {gene: np.repeat([p[gene] for p in policies], seeds_per_policy) for gene in train.GENES}
+    rngs = [train.make_rng(seed, 'spawn', episode=k)
+            for _ in policies for k in range(seeds_per_policy)]
+    return train.episodes(genes, rngs).reshape(len(policies), seeds_per_policy)
+
+
+def _ranks(values):
+    """Ranks with ties averaged, for the Spearman correlation"""
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(values, kind="stable")
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(len(values))
+    for value in np.unique(values):
+        tied = values == value
+        ranks[tied] = ranks[tied].mean()
+    return ranks
+
+
+def _correlation(a, b):
+    """Pearson correlation, or None when either side does not vary"""
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    if len(a) < 2 or a.std() == 0 or b.std() == 0:
+        return None
+    return round(float(np.corrcoef(a, b)[0, 1]), 3)
+
+
+def pairwise_agreement(a, b):
+    """Share of policy pairs that both sides order the same way (ties in either skipped)"""
+    agree = total = 0
+    for i in range(len(a)):
+        for j in range(i + 1, len(a)):
+            da, db = np.sign(a[i] - a[j]), np.sign(b[i] - b[j])
+            if da and db:
+                total += 1
+                agree += da == db
+    return round(agree / total, 3) if total else None
+
+
+def run_fidelity(policies=24, seeds=4, seed=SEED, steps=train.STEPS, safe=SAFE_CORRELATION,
+                 threads=0):
+    """Run the comparison and return the results as a JSON-ready dict
+
+    Full games run on `threads` threads (see pvz_threads); scores do not depend on it.
+    """
+    genes = random_policies(policies, seed)
+
+    start = time.perf_counter()
+    surrogate = run_surrogate(genes, seed, seeds)
+    surrogate_time = time.perf_counter() - start
+
+    jobs = [(g, k) for g in genes for k in range(seeds)]
+    start = time.perf_counter()
+    full = np.array(pvz_threads.run_episodes(lambda job: run_full(job[0], seed, job[1], steps),
+                                             jobs, threads), dtype=np.int64).reshape(policies, seeds)
+    full_time = time.perf_counter() - start
+    for i in range(policies):
+        print(f"policy {i + 1}/{policies}: surrogate {surrogate[i].mean():.1f}, "
+              f"full {full[i].mean():.1f}", file=sys.stderr)
+
+    games = policies * seeds
+    surrogate_means, full_means = surrogate.mean(axis=1), full.mean(axis=1)
+    rank = _correlation(_ranks(surrogate_means), _ranks(full_means))
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {"policies": policies, "seeds": seeds, "seed": seed, "steps": steps,
+                     "ticks_per_step": AI_ACTION_TICKS, "threads": threads,
+                     "gil": pvz_threads.gil_enabled()},
+        "correlation": {
+            "policy_pearson": _correlation(surrogate_means, full_means),
+            "policy_spearman": rank,
+            "game_pearson": _correlation(surrogate.ravel(), full.ravel()),
+            "pairwise_agreement": pairwise_agreement(surrogate_means, full_means),
+        },
+        "speed": {
+            "surrogate_games_per_sec": round(games / surrogate_time, 1),
+            "full_games_per_sec": round(games / full_time, 2),
+            "speed_ratio": round(full_time / surrogate_time, 1),
+        },
+        "safe": rank is not None and rank >= safe,
+        "policies": [{"genes": g, "surrogate": surrogate[i].tolist(), "full": full[i].tolist()}
+                     for i, g in enumerate(genes)],
+    }
+    corr, speed = results["correlation"], results["speed"]
+    print(f"rank correlation {corr['policy_spearman']}, pearson {corr['policy_pearson']}, "
+          f"per game {corr['game_pearson']}, pairs agree {corr['pairwise_agreement']}; "
+          f"surrogate {speed['surrogate_games_per_sec']} games/s vs full "
+          f"{speed['full_games_per_sec']} games/s ({speed['speed_ratio']}x); "
+          f"{'surrogate is safe to rank genes' if results['safe'] else 'check candidates in the full game'}",
+          file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the training surrogate with the full game")
+    parser.add_argument("-p", "--policies", type=int, default=24, help="gene settings to compare")
+    parser.add_argument("-k", "--seeds", type=int, default=4, help="games per policy on each side")
+    parser.add_argument("--seed", type=int, default=SEED, help="shared base seed")
+    parser.add_argument("--steps", type=int, default=train.STEPS,
+                        help=f"full-game decisions, {AI_ACTION_TICKS} ticks apart")
+    parser.add_argument("--safe-correlation", type=float, default=SAFE_CORRELATION,
+                        help="rank correlation above which the surrogate counts as safe")
+    pvz_kernels.add_arguments(parser)
+    pvz_threads.add_arguments(parser)
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+    pvz_kernels.from_args(args)
+
+    results = run_fidelity(args.policies, args.seeds, args.seed, args.steps, args.safe_correlation,
+                           args.threads)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 0 if results["safe"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
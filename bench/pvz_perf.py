@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+PVZ Perf Tracker - stored benchmark baselines and regression reports
+
+    python bench/pvz_perf.py run                  # benchmark and store under bench/results/
+    python bench/pvz_perf.py run --set-baseline   # ... and make it the baseline
+    python bench/pvz_perf.py compare              # latest stored run vs the baseline
+    python bench/pvz_perf.py check                # run, then compare; exits 1 on a regression
+    python bench/pvz_perf.py baseline FILE        # use a stored run as the baseline
+
+Each run records Game.update cost per scenario (windowed and headless),
+render cost, rule-AI and LearningAI decision time, every repeat of each, and
+the machine and library versions it ran on. Each metric is compared on its
+best sample, the one least disturbed by the rest of the machine, and only
+counts as slower or faster when the change beats both the threshold and
+the run-to-run noise of the samples themselves.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BASELINE_NAME = "baseline.json"
+
+THRESHOLD = 0.05  # Changes below 5% are never reported
+NOISE_FACTOR = 2.0  # ... nor below twice the noise of either run
+
+# Environment keys that make two runs incomparable when they differ
+ENV_KEYS = ("python", "implementation", "machine", "cpu", "cpu_count", "pygame", "numpy",
+            "sdl_video")
+
+
+# ---- Collecting ----
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT_DIR, capture_output=True,
+                              text=True, timeout=30).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def environment(bench_env):
+    """The benchmark's own environment plus what identifies code and machine"""
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    env = dict(bench_env)
+    env.update({
+        "cpu": _cpu_model(),
+        "numpy": numpy_version,
+        "hostname": platform.node(),
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+    })
+    return env
+
+
+def run_game_bench(scenarios, ticks, frames, repeat):
+    """Run pvz_bench.py in a fresh interpreter and load its JSON"""
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "bench.json")
+        cmd = [sys.executable, os.path.join(BENCH_DIR, "pvz_bench.py"), "--no-alloc",
+               "-t", str(ticks), "-f", str(frames), "-r", str(repeat), "-o", out]
+        for name in scenarios or ():
+            cmd += ["-s", name]
+        subprocess.run(cmd, check=True)
+        with open(out) as f:
+            return json.load(f)
+
+
+def bench_learning_ai(repeat, boards=50):
+    """Cost of one LearningAI.decide() call over seeded random 9x5 boards"""
+    sys.path.insert(0, os.path.join(ROOT_DIR, "ai"))
+    import pvz_learning_ai as lai
+
+    rng = random.Random(0)
+    states = []
+    for _ in range(boards):
+        grid = [[None] * lai.GRID_ROWS for _ in range(lai.GRID_COLS)]
+        plant_counts = {ptype: [0] * lai.GRID_ROWS for ptype in lai.PLANT_TYPES}
+        for col in range(lai.GRID_COLS):
+            for row in range(lai.GRID_ROWS):
+                if rng.random() < 0.4:
+                    plant_type = rng.choice(lai.PLANT_TYPES)
+                    grid[col][row] = lai.Plant(col, row, plant_type, rng)
+                    plant_counts[plant_type][row] += 1
+        wave, sun = rng.randint(1, 5), rng.randint(0, 400)  # Drawn in the order boards always used
+        empty = np.array([[cell is None for cell in column] for column in grid])
+        action_mask = np.zeros(lai.MASK_SIZE, dtype=bool)
+        action_mask[lai.MASK_WAIT] = True
+        action_mask[lai.MASK_PLACE:] = (empty[:, :, None] & (sun >= lai.PLANT_COSTS)).ravel()
+        states.append({
+            'level': 1, 'wave': wave, 'sun': sun,
+            'zombies': [], 'grid': grid, 'suns': [], 'action_mask': action_mask,
+            'plants': [p for column in grid for p in column if p is not None],
+            'plant_counts': plant_counts,
+            'zombies_by_row': [rng.randint(0, 3) for _ in range(lai.GRID_ROWS)],
+        })
+
+    ai = lai.LearningAI(rng)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for state in states:
+            ai.decide(state)
+        samples.append(round((time.perf_counter() - start) / len(states) * 1e6, 2))
+    return {"decide_us": min(samples), "samples": samples}
+
+
+def collect(scenarios=None, ticks=600, frames=30, repeat=5):
+    game = run_game_bench(scenarios, ticks, frames, repeat)
+    return {
+        "timestamp": game["timestamp"],
+        "environment": environment(game["environment"]),
+        "settings": game["settings"],
+        "scenarios": game["scenarios"],
+        "learning_ai": bench_learning_ai(repeat),
+    }
+
+
+def metrics(run):
+    """Flatten a run into {name: (unit, samples)}, every metric a cost (lower is better)"""
+    out = {}
+    for name, entry in run["scenarios"].items():
+        for mode, label in (("step", "update"), ("headless", "update_headless")):
+            samples = entry["sim"][mode].get("samples", [entry["sim"][mode]["ticks_per_sec"]])
+            out[f"{name}/{label}"] = ("us/tick", [1e6 / s for s in samples if s])
+        render = entry["render"]
+        out[f"{name}/render"] = ("ms/frame", [1e3 / s for s in render.get("samples", [render["frames_per_sec"]]) if s])
+        if "agent" in entry:
+            out[f"{name}/decide"] = ("us", entry["agent"]["samples"])
+    if "learning_ai" in run:
+        out["learning_ai/decide"] = ("us", run["learning_ai"]["samples"])
+    return out
+
+
+# ---- Storage ----
+
+def save_run(run, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = run["timestamp"].replace(":", "").replace("-", "")
+    commit = run["environment"].get("commit") or "nogit"
+    path = os.path.join(results_dir, f"{stamp}-{commit}.json")
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+    return path
+
+
+def load_run(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def latest_run(results_dir=RESULTS_DIR):
+    runs = sorted(p for p in glob.glob(os.path.join(results_dir, "*.json"))
+                  if os.path.basename(p) != BASELINE_NAME)
+    return runs[-1] if runs else None
+
+
+def set_baseline(path, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    target = os.path.join(results_dir, BASELINE_NAME)
+    shutil.copyfile(path, target)
+    return target
+
+
+# ---- Comparing ----
+
+def _noise(samples):
+    """How far a typical sample strays from the best one, relative to the best"""
+    best = min(samples)
+    return (statistics.median(samples) - best) / best if best else 0.0
+
+
+def compare(base, new, threshold=THRESHOLD, noise_factor=NOISE_FACTOR):
+    """Per-metric verdicts: "slower", "faster", "same", or "missing" on one side"""
+    base_metrics = metrics(base)
+    new_metrics = metrics(new)
+    rows = []
+    for name in sorted(set(base_metrics) | set(new_metrics)):
+        if name not in base_metrics or name not in new_metrics:
+            rows.append({"metric": name, "status": "missing"})
+            continue
+        unit, before = base_metrics[name]
+        _, after = new_metrics[name]
+        b, n = min(before), min(after)
+        change = n / b - 1 if b else 0.0
+        limit = max(threshold, noise_factor * max(_noise(before), _noise(after)))
+        if change > limit:
+            status = "slower"
+        elif change < -limit:
+            status = "faster"
+        else:
+            status = "same"
+        rows.append({"metric": name, "unit": unit, "base": b, "new": n, "change": change,
+                     "limit": limit, "speedup": b / n if n else 0.0, "status": status})
+    return rows
+
+
+def env_differences(base, new):
+    base_env, new_env = base["environment"], new["environment"]
+    return {key: (base_env.get(key), new_env.get(key)) for key in ENV_KEYS
+            if base_env.get(key) != new_env.get(key)}
+
+
+def report(base, new, rows):
+    lines = [f"Baseline: {base['timestamp']} ({base['environment'].get('commit') or '?'})",
+             f"New:      {new['timestamp']} ({new['environment'].get('commit') or '?'}"
+             f"{', dirty' if new['environment'].get('dirty') else ''})"]
+    for key, (was, now) in env_differences(base, new).items():
+        lines.append(f"WARNING: {key} differs: {was} -> {now}; results may not be comparable")
+    lines.append("")
+    lines.append(f"{'metric':<32} {'base':>10} {'new':>10} {'change':>8} {'noise':>7}  status")
+    for row in rows:
+        if row["status"] == "missing":
+            lines.append(f"{row['metric']:<32} {'':>10} {'':>10} {'':>8} {'':>7}  missing")
+            continue
+        mark = {"slower": "REGRESSION", "faster": f"{row['speedup']:.2f}x faster"}.get(row["status"], "")
+        lines.append(f"{row['metric']:<32} {row['base']:>10.2f} {row['new']:>10.2f} "
+                     f"{row['change']:>+7.1%} {row['limit']:>6.1%}  {mark}")
+    slower = sum(row["status"] == "slower" for row in rows)
+    faster = sum(row["status"] == "faster" for row in rows)
+    lines.append("")
+    lines.append(f"{slower} regressions, {faster} improvements, {len(rows) - slower - faster} unchanged or missing")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Track PVZ performance against a stored baseline")
+    parser.add_argument("--results", default=RESULTS_DIR, help="results directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("run", "check"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("-s", "--scenario", action="append", help="scenario (repeatable; default all)")
+        cmd.add_argument("-t", "--ticks", type=int, default=600)
+        cmd.add_argument("-f", "--frames", type=int, default=30)
+        cmd.add_argument("-r", "--repeat", type=int, default=5, help="samples per metric")
+        cmd.add_argument("--threshold", type=float, default=THRESHOLD)
+        if name == "run":
+            cmd.add_argument("--set-baseline", action="store_true")
+
+    cmp = sub.add_parser("compare")
+    cmp.add_argument("new", nargs="?", help="stored run (default: latest)")
+    cmp.add_argument("--baseline", help="baseline file (default: results/baseline.json)")
+    cmp.add_argument("--threshold", type=float, default=THRESHOLD)
+
+    base = sub.add_parser("baseline")
+    base.add_argument("path", help="stored run to use as the baseline")
+
+    args = parser.parse_args()
+    baseline_path = os.path.join(args.results, BASELINE_NAME)
+
+    if args.command == "baseline":
+        print(f"Baseline set: {set_baseline(args.path, args.results)}")
+        return 0
+
+    if args.command in ("run", "check"):
+        new = collect(args.scenario, args.ticks, args.frames, args.repeat)
+        path = save_run(new, args.results)
+        print(f"Saved {path}")
+        if args.command == "run":
+            if args.set_baseline or not os.path.exists(baseline_path):
+                print(f"Baseline set: {set_baseline(path, args.results)}")
+            return 0
+    else:
+        path = args.new or latest_run(args.results)
+        if path is None:
+            print("No stored runs; use 'run' first")
+            return 2
+        new = load_run(path)
+        baseline_path = args.baseline or baseline_path
+
+    if not os.path.exists(baseline_path):
+        print("No baseline; use 'run --set-baseline' or 'baseline FILE' first")
+        return 2
+    base = load_run(baseline_path)
+    rows = compare(base, new, args.threshold)
+    print(report(base, new, rows))
+    return 1 if any(row["status"] == "slower" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
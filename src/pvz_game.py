@@ -9,9 +9,16 @@ import pygame
 import random
 import time
 import math
+import heapq
+import bisect
+import functools
+from collections import deque
 
-# Initialize
-pygame.init()
+import numpy as np
+
+import pvz_kernels
+from pvz_profile import Capture
+from pvz_memory import MemoryReport
 
 # Constants
 SCREEN_WIDTH = 1920
@@ -25,6 +32,57 @@ GRID_OFFSET_Y = 100   # Top bar height
 TOP_BAR_HEIGHT = 75
 SIDEBAR_WIDTH = 130
 
+# Game timing, in ticks of the fixed-rate game loop
+FPS = 60
+SUN_PRODUCTION_TICKS = 15 * FPS  # Sunflowers and natural sun
+SHOT_COOLDOWN_TICKS = 90  # 1.5 s between shots
+SUN_LIFETIME_TICKS = 12 * FPS
+AI_ACTION_TICKS = 30  # AI makes decisions every 0.5 seconds
+PROFILE_SECONDS = 10  # F9/F10 captures stop by themselves after this long
+
+# Update phases; events due on the same tick run in this order
+PHASE_AI = 0
+PHASE_SPAWN = 1
+PHASE_ECONOMY = 2
+PHASE_PLANTS = 3
+PHASE_PLANT_DEATH = 4
+PHASE_ZOMBIES = 5
+PHASE_PEAS = 6
+PHASE_SUNS = 7
+
+# Plant types tracked by the board counters, and what the placeable ones cost
+PLANT_TYPES = ["sunflower", "peashooter", "repeater", "wallnut"]
+PLANT_COSTS = {"sunflower": 50, "peashooter": 100, "wallnut": 50}
+
+# Per-cell observation planes (Game.planes), rows x cols x PLANES
+PLANES = ("plant", "plant_hp", "zombies", "zombie_hp", "peas")
+PLANE_PLANT = 0  # 0 empty, else 1 + PLANT_TYPES index
+PLANE_PLANT_HP = 1
+PLANE_ZOMBIES = 2  # Live zombies whose x falls in the cell's column
+PLANE_ZOMBIE_HP = 3  # ... and their summed hp
+PLANE_PEAS = 4  # Peas in flight over the cell
+
+# Agent action space: wait, collect a sun, or place a plant on a cell (see Game.act)
+PLACEABLE = list(PLANT_COSTS)
+ACTION_WAIT = 0
+ACTION_COLLECT = 1
+ACTION_PLACE = 2  # + (PLACEABLE index * GRID_COLS + col) * GRID_ROWS + row
+NUM_ACTIONS = ACTION_PLACE + len(PLACEABLE) * GRID_COLS * GRID_ROWS
+PLACE_COSTS = np.array([PLANT_COSTS[ptype] for ptype in PLACEABLE])
+
+# Event counters (Game.events), running totals for the game; diff two copies for a step
+EVENTS = ("damage", "kills", "plants_lost", "sun_gained", "sun_spent", "waves_cleared")
+EVENT_DAMAGE = 0  # Pea damage to live zombies
+EVENT_KILLS = 1
+EVENT_PLANTS_LOST = 2
+EVENT_SUN_GAINED = 3  # Sun collected
+EVENT_SUN_SPENT = 4
+EVENT_WAVES_CLEARED = 5
+
+# Independent random streams each game draws from
+RNG_STREAMS = ("spawn", "economy", "cosmetic", "agent")
+GRASS_STREAM = "grass"  # Drawn only when the lawn is first rendered
+
 # Doodle Color Palette
 BLACK = (20, 20, 20)
 WHITE = (250, 248, 240)
@@ -41,21 +99,32 @@ GRASS_1 = (180, 220, 120)
 GRASS_2 = (160, 200, 100)
 GRASS_3 = (140, 180, 80)
 
-# Setup screen
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("PVZ - Doodle Edition")
-clock = pygame.time.Clock()
+# The window and fonts are created on first draw, so headless games never touch
+# pygame's display and can run on any thread
+def open_display():
+    """Create the game window (once per process) and return its surface"""
+    pygame.init()
+    surface = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("PVZ - Doodle Edition")
+    return surface
+
+def display():
+    """The window surface, opened if there is none yet"""
+    return pygame.display.get_surface() or open_display()
 
-font = pygame.font.Font(None, 36)
-title_font = pygame.font.Font(None, 54)
-small_font = pygame.font.Font(None, 28)
+@functools.lru_cache(maxsize=None)
+def fonts():
+    """(font, title_font, small_font), loaded on first use"""
+    if not pygame.font.get_init():
+        pygame.font.init()
+    return pygame.font.Font(None, 36), pygame.font.Font(None, 54), pygame.font.Font(None, 28)
 
-def draw_thick_line(surface, color, start, end, width=3):
-    """Draw a doodle-style thick line"""
+def draw_thick_line(surface, color, start, end, width=3, rng=None):
+    """Draw a doodle-style thick line, wobbled by `rng` if given"""
     pygame.draw.line(surface, color, start, end, width)
-    if width > 2:
-        offset_x = random.randint(-1, 1)
-        offset_y = random.randint(-1, 1)
+    if width > 2 and rng is not None:
+        offset_x = rng.randint(-1, 1)
+        offset_y = rng.randint(-1, 1)
         pygame.draw.line(surface, color, 
                         (start[0] + offset_x, start[1] + offset_y),
                         (end[0] + offset_x, end[1] + offset_y), 1)
@@ -79,8 +148,129 @@ def draw_doodle_rect(surface, color, rect, filled=False, outline=3):
         # Only draw once without random offset
         pygame.draw.rect(surface, color, (x, y, w, h), outline)
 
+def place_action(plant_type, col, row):
+    """Index of placing `plant_type` at (col, row) in the action space"""
+    return ACTION_PLACE + (PLACEABLE.index(plant_type) * GRID_COLS + col) * GRID_ROWS + row
+
+def decode_action(action):
+    """(plant_type, col, row) of a place action, None for wait and collect"""
+    if action < ACTION_PLACE:
+        return None
+    index, row = divmod(action - ACTION_PLACE, GRID_ROWS)
+    plant, col = divmod(index, GRID_COLS)
+    return PLACEABLE[plant], col, row
+
+def cell_col(x):
+    """Grid column whose span contains `x`, clamped to the lawn"""
+    return min(GRID_COLS - 1, max(0, int((x - GRID_OFFSET_X) // CELL_WIDTH)))
+
+def make_rng(seed, stream, worker=0, episode=0):
+    """Generator for one stream of one episode on one worker
+    
+    Streams are derived from the seed by name, so adding draws to one
+    subsystem never shifts another and workers can be run in any order.
+    """
+    return random.Random(f"{seed}/{worker}/{episode}/{stream}")
+
+class Scheduler:
+    """Priority queue of game events keyed on the tick they are due
+    
+    Events due on the same tick run in phase order, then in the order they
+    were scheduled. Cancelled events stay queued and are skipped when popped.
+    """
+    def __init__(self):
+        self.queue = []
+        self.counter = 0
+
+    def schedule(self, due, phase, callback, target=None):
+        event = [due, phase, self.counter, callback, target]
+        self.counter += 1
+        heapq.heappush(self.queue, event)
+        return event
+
+    def cancel(self, event):
+        event[3] = None
+
+    def run_due(self, now, phase):
+        """Run every event due by `now` up to and including `phase`"""
+        queue = self.queue
+        while queue and (queue[0][0] < now or (queue[0][0] == now and queue[0][1] <= phase)):
+            callback, target = heapq.heappop(queue)[3:]
+            if callback is not None:
+                callback(target)
+
+    def next_due(self):
+        """Tick of the earliest queued event, or None"""
+        return self.queue[0][0] if self.queue else None
+
+class PhaseTimer:
+    """Rolling per-phase timings of Game.update and Game.draw
+    
+    Off by default: while `enabled` is False the game never reads the clock.
+    Each phase keeps its last `window` samples in microseconds, and every
+    timed update also records the entity counts on the board.
+    """
+    UPDATE_PHASES = ("ai", "spawn", "wave", "economy", "plants", "bites",
+                     "zombies", "peas", "shots", "suns")
+    DRAW_PHASES = ("grid", "plants", "zombies", "peas", "suns", "ui")
+
+    def __init__(self, window=300):
+        self.enabled = False
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.samples = {}
+        self.entity_counts = deque(maxlen=self.window)
+
+    def lap(self, phase, start):
+        """Record the time since `start` under `phase`; returns the new start"""
+        now = time.perf_counter_ns()
+        samples = self.samples.get(phase)
+        if samples is None:
+            samples = self.samples[phase] = deque(maxlen=self.window)
+        samples.append((now - start) / 1000)
+        return now
+
+    def count(self, game):
+        self.entity_counts.append({
+            "tick": game.ticks,
+            "plants": len(game.plants),
+            "zombies": len(game.zombies),
+            "peas": len(game.peas) + sum(len(shots) for shots in game.shots),
+            "suns": len(game.suns),
+        })
+
+    def stats(self, phase):
+        """Mean, median, 95th percentile and max of a phase, in microseconds"""
+        samples = sorted(self.samples.get(phase, ()))
+        if not samples:
+            return None
+        n = len(samples)
+        return {
+            "mean_us": sum(samples) / n,
+            "p50_us": samples[n // 2],
+            "p95_us": samples[min(n - 1, int(n * 0.95))],
+            "max_us": samples[-1],
+            "samples": n,
+        }
+
+    def summary(self):
+        """Stats for every recorded phase, keyed like "update.zombies" or "draw" """
+        return {phase: self.stats(phase) for phase in sorted(self.samples)}
+
+    def histogram(self, phase, bins=10):
+        """Sample counts in `bins` equal-width buckets from 0 to the max; returns (edges, counts)"""
+        samples = self.samples.get(phase, ())
+        top = max(samples, default=0) or 1
+        width = top / bins
+        counts = [0] * bins
+        for sample in samples:
+            counts[min(bins - 1, int(sample / width))] += 1
+        return [i * width for i in range(bins + 1)], counts
+
 class Plant:
-    def __init__(self, col, row, plant_type):
+    def __init__(self, col, row, plant_type, rng=random):
         self.col = col
         self.row = row
         self.type = plant_type
@@ -90,23 +280,22 @@ class Plant:
         if plant_type == "sunflower":
             self.hp = 80
             self.cost = 50
-            self.last_sun = time.time()
         elif plant_type == "peashooter":
             self.hp = 100
             self.cost = 100
-            self.last_shot = time.time()
         elif plant_type == "repeater":
             self.hp = 150
             self.cost = 200
-            self.last_shot = time.time()
         elif plant_type == "wallnut":
             self.hp = 400
             self.cost = 50
         
         self.max_hp = self.hp
-        self.anim_offset = random.random() * math.pi * 2
+        self.anim_offset = rng.random() * math.pi * 2
+        self.sun_due = None  # Tick of the next sun, set by the game
 
-    def draw(self, surface):
+    def draw(self, surface, now):
+        _, _, small_font = fonts()
         bounce = math.sin(time.time() * 2 + self.anim_offset) * 3
         
         if self.type == "sunflower":
@@ -158,7 +347,7 @@ class Plant:
             pygame.draw.lines(surface, BLACK, False, smile_points, 2)
             
             # Countdown timer for sun production
-            time_until_sun = 15 - (time.time() - self.last_sun)
+            time_until_sun = (self.sun_due - now) / FPS if self.sun_due is not None else 0
             if time_until_sun > 0:
                 timer_text = small_font.render(f"{int(time_until_sun)}", True, YELLOW_PENCIL)
                 # Draw timer above sunflower with black outline for visibility
@@ -335,7 +524,7 @@ class Plant:
                             (bar_width - 4) * hp_percent, bar_height - 4))
 
 class Zombie:
-    def __init__(self, row, zombie_type="normal"):
+    def __init__(self, row, zombie_type="normal", rng=random):
         self.row = row
         self.zombie_type = zombie_type
         self.x = SCREEN_WIDTH + 50
@@ -356,22 +545,37 @@ class Zombie:
         
         self.damage = 1.5
         self.eating = False
-        self.last_attack = time.time()
+        self.target = None  # Plant being eaten
+        self.next_attack = 0  # Tick the next bite is allowed
+        self.attack_armed = False  # A bite event is queued
         self.attack_speed = 0.5
         self.walk_cycle = 0
-        self.blink_timer = random.random() * 3
+        self.rng = rng  # Cosmetic stream for blinking
+        self.blink_timer = rng.random() * 3
         self.dying = False
         self.death_timer = 0
         self.death_duration = 1.5  # Death animation duration in seconds
+        
+        # Positions are derived from step counts so that advancing n ticks
+        # at once lands on exactly the same values as n single steps
+        self.start_x = self.x
+        self.steps = 0
+        self.death_steps = 0
+        
+        # Cell column counted in Game.planes, and the x that leaves it
+        self.bucket = GRID_COLS - 1
+        self.bucket_x = -math.inf
 
-    def move(self):
+    def move(self, steps=1):
         if not self.eating and not self.dying:
-            self.x -= self.speed
-            self.walk_cycle += 0.12
+            self.steps += steps
+            self.x = self.start_x - self.speed * self.steps
+            self.walk_cycle = self.steps * 0.12
         
         # Update death animation
         if self.dying:
-            self.death_timer += 0.016
+            self.death_steps += steps
+            self.death_timer = self.death_steps * 0.016
 
     def draw_skeleton(self, surface, x, y, alpha=255):
         """Draw a skeleton version of the zombie"""
@@ -614,7 +818,7 @@ class Zombie:
         
         self.blink_timer -= 0.016
         if self.blink_timer <= 0:
-            self.blink_timer = random.random() * 4 + 2
+            self.blink_timer = self.rng.random() * 4 + 2
         
         is_blinking = self.blink_timer < 0.15
         
@@ -669,17 +873,19 @@ class Zombie:
                          (bar_width - 4) * hp_percent, bar_height - 4))
 
 class Pea:
-    def __init__(self, x, y, row):
+    def __init__(self, x, y, row, rng=random):
         self.x = x
         self.y = y
         self.row = row
         self.speed = 8
         self.damage = 25
         self.active = True
-        self.wobble = random.random() * math.pi * 2
+        self.wobble = rng.random() * math.pi * 2
+        self.bucket = 0  # Cell column counted in Game.planes, and the x that leaves it
+        self.bucket_x = math.inf
 
-    def move(self):
-        self.x += self.speed
+    def move(self, steps=1):
+        self.x += self.speed * steps
         if self.x > SCREEN_WIDTH:
             self.active = False
 
@@ -694,7 +900,7 @@ class Pea:
             trail_surface = pygame.Surface((trail_size * 2, trail_size * 2), pygame.SRCALPHA)
             pygame.draw.circle(trail_surface, (*LIGHT_GREEN, alpha), 
                              (trail_size, trail_size), trail_size)
-            screen.blit(trail_surface, (trail_x - trail_size, self.y + wobble_y - trail_size))
+            surface.blit(trail_surface, (trail_x - trail_size, self.y + wobble_y - trail_size))
         
         # Main pea
         pea_y = int(self.y + wobble_y)
@@ -704,26 +910,42 @@ class Pea:
         pygame.draw.circle(surface, (180, 255, 180), 
                          (self.x - 3, pea_y - 3), 4)
 
+class Shot:
+    """A pea in headless mode: never stepped, only resolved to a scheduled hit"""
+    def __init__(self, x, row, fired):
+        self.x = x  # Position when fired; the pea moves 8 px per tick from here
+        self.row = row
+        self.fired = fired  # Tick the shot was fired on
+        self.speed = 8
+        self.damage = 25
+        self.target = None
+        self.event = None
+        # Last tick the pea is still checked for hits before leaving the screen
+        self.last_tick = fired + (SCREEN_WIDTH - x) // self.speed
+
+    def x_at(self, tick):
+        """Pea position during the pea phase of `tick`"""
+        return self.x + self.speed * (tick - self.fired + 1)
+
 class Sun:
-    def __init__(self, x, y, value=25, is_bright=False):
+    def __init__(self, x, y, value=25, is_bright=False, target_y=None, rng=random):
+        if target_y is None:
+            target_y = y if y > 50 else rng.randint(120, SCREEN_HEIGHT - 100)
         self.x = x
         self.y = y
         self.value = value
         self.radius = 28
         self.active = True
-        self.spawn_time = time.time()
-        self.target_y = y if y > 50 else random.randint(120, SCREEN_HEIGHT - 100)
-        self.pulse_offset = random.random() * math.pi * 2
+        self.target_y = target_y
+        self.pulse_offset = rng.random() * math.pi * 2
         self.rotation = 0
         self.is_bright = is_bright
 
-    def update(self):
+    def update(self, steps=1):
         if self.y < self.target_y:
-            self.y += 1.5
-        self.rotation += 2
-        
-        if time.time() - self.spawn_time > 12:
-            self.active = False
+            falling = min(steps, math.ceil((self.target_y - self.y) / 1.5))
+            self.y += 1.5 * falling
+        self.rotation += 2 * steps
 
     def draw(self, surface):
         pulse = math.sin(time.time() * 2.5 + self.pulse_offset) * 2
@@ -786,32 +1008,102 @@ class Sun:
         pygame.draw.lines(surface, BLACK, False, smile_points, 2)
 
 class Game:
-    def __init__(self):
+    def __init__(self, headless=False, seed=None, worker=0, episode=0):
+        self.headless = headless  # Simulation only: peas become analytic shots
+        
+        # Per-subsystem random streams; unseeded games still get a seed to record
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.worker = worker
+        self.episode = episode
+        self.spawn_rng, self.economy_rng, self.cosmetic_rng, self.agent_rng = (
+            make_rng(self.seed, stream, worker, episode) for stream in RNG_STREAMS)
+        
         self.grid = [[None for _ in range(GRID_ROWS)] for _ in range(GRID_COLS)]
         self.plants = []
         self.zombies = []
         self.peas = []
         self.suns = []
+        self._plant_arrays = None  # (rows, xs) of self.plants for the array kernels
+        
+        # Per-cell planes, changed in place as the board changes; see observation()
+        self.planes = np.zeros((GRID_ROWS, GRID_COLS, len(PLANES)))
+        
+        # Legal actions, aligned with the action space; kept current on placement,
+        # plant death, sun spawn/collection and sun_count changes
+        self.action_mask = np.zeros(NUM_ACTIONS, dtype=bool)
+        self.action_mask[ACTION_WAIT] = True
+        self.place_mask = self.action_mask[ACTION_PLACE:].reshape(len(PLACEABLE), GRID_COLS, GRID_ROWS)
+        self.affordable = np.zeros(len(PLACEABLE), dtype=bool)
         self.sun_count = 150
         self.selected_plant = None
         self.game_over = False
         self.paused = False
-        self.ai_mode = False  # AI Mode toggle
+        self._ai_mode = False  # AI Mode toggle
+        self.ai_event = None
         self.wave = 1
         self.zombies_spawned = 0
         self.zombies_to_spawn = 3
-        self.last_spawn = time.time()
         self.spawn_interval = 12  # Slower initial spawn
-        self.last_sun_spawn = time.time()
-        self.last_ai_action = time.time()
-        self.ai_action_interval = 0.5  # AI makes decisions every 0.5 seconds
+        
+        # Game clock and timed events
+        self.timer = PhaseTimer()
+        self.ticks = 0
+        self.scheduler = Scheduler()
+        self.last_spawn = 0
+        self.spawn_event = self.scheduler.schedule(
+            self.spawn_interval * FPS, PHASE_SPAWN, self._spawn_tick)
+        self.scheduler.schedule(SUN_PRODUCTION_TICKS, PHASE_ECONOMY, self.spawn_natural_sun)
+        
+        # Shooters with nothing to shoot at, re-armed when a zombie enters the row
+        self.idle_shooters = [[] for _ in range(GRID_ROWS)]
+        
+        # Headless shots in flight per row, and rows whose zombies changed motion
+        self.shots = [[] for _ in range(GRID_ROWS)]
+        self.dirty_lanes = [False] * GRID_ROWS
+        
+        # Running board statistics, updated on place/death/spawn/collect
+        self.plant_counts = {ptype: [0] * GRID_ROWS for ptype in PLANT_TYPES}
+        self.plant_totals = {ptype: 0 for ptype in PLANT_TYPES}
+        self.zombies_by_row = [0] * GRID_ROWS
+        self.live_zombies = 0
+        self.events = np.zeros(len(EVENTS), dtype=np.int64)
+        self.suns_available = 0
+        self.zombies_left = self.zombies_to_spawn  # Unspawned + still on the lawn
+        
+        # Placements and sun collections as (tick, action, *args), for replays
+        self.action_log = []
         
         # AI logging system
         self.ai_logs = []
         self.max_logs = 8  # Keep last 8 actions on screen
         
-        # Pre-generate grass textures to avoid constant refreshing
-        self.grass_textures = []
+        # Grass tiles, see grass_textures
+        self._grass_textures = None
+    
+    @property
+    def sun_count(self):
+        return self._sun_count
+    
+    @sun_count.setter
+    def sun_count(self, value):
+        self._sun_count = value
+        affordable = value >= PLACE_COSTS
+        changed = affordable != self.affordable
+        if changed.any():
+            self.affordable = affordable
+            empty = self.planes[:, :, PLANE_PLANT].T == 0
+            self.place_mask[changed] = affordable[changed, None, None] & empty
+    
+    @property
+    def grass_textures(self):
+        """Grass tiles, generated on first draw from their own stream"""
+        if self._grass_textures is None:
+            self._grass_textures = self._make_grass()
+        return self._grass_textures
+    
+    def _make_grass(self):
+        rng = make_rng(self.seed, GRASS_STREAM, self.worker, self.episode)
+        textures = []
         for col in range(GRID_COLS):
             for row in range(GRID_ROWS):
                 color_idx = (col + row) % 3
@@ -828,10 +1120,10 @@ class Game:
                 
                 # Add static grass blades (only generated once)
                 for i in range(5):
-                    gx = random.randint(5, CELL_WIDTH - 10)
-                    gy = random.randint(5, CELL_HEIGHT - 10)
-                    grass_height = random.randint(8, 15)
-                    grass_angle = random.uniform(-0.3, 0.3)
+                    gx = rng.randint(5, CELL_WIDTH - 10)
+                    gy = rng.randint(5, CELL_HEIGHT - 10)
+                    grass_height = rng.randint(8, 15)
+                    grass_angle = rng.uniform(-0.3, 0.3)
                     
                     end_x = gx + math.sin(grass_angle) * grass_height
                     end_y = gy - grass_height
@@ -839,8 +1131,282 @@ class Game:
                     grass_color = (bg_color[0] - 30, bg_color[1] - 30, bg_color[2] - 30)
                     pygame.draw.line(grass_surf, grass_color, (gx, gy), (end_x, end_y), 2)
                 
-                self.grass_textures.append(grass_surf)
+                textures.append(grass_surf)
+        return textures
     
+    def _add_plant(self, plant):
+        """Put a plant on the board, update the counters and start its timers"""
+        self.plants.append(plant)
+        self._plant_arrays = None
+        self.grid[plant.col][plant.row] = plant
+        cell = self.planes[plant.row, plant.col]
+        cell[PLANE_PLANT] = PLANT_TYPES.index(plant.type) + 1
+        cell[PLANE_PLANT_HP] = plant.hp
+        self.place_mask[:, plant.col, plant.row] = False
+        self.plant_counts[plant.type][plant.row] += 1
+        self.plant_totals[plant.type] += 1
+        
+        if plant.type == "sunflower":
+            plant.sun_due = self.ticks + SUN_PRODUCTION_TICKS
+            self.scheduler.schedule(plant.sun_due, PHASE_ECONOMY, self._produce_sun, plant)
+        elif plant.type in ("peashooter", "repeater"):
+            self.scheduler.schedule(self.ticks + SHOT_COOLDOWN_TICKS, PHASE_PLANTS,
+                                    self._shoot, plant)
+
+    def _on_board(self, plant):
+        return self.grid[plant.col][plant.row] is plant
+
+    def _remove_plant(self, plant):
+        """Take a dead plant off the board and update the counters"""
+        self.plants.remove(plant)
+        self._plant_arrays = None
+        self.grid[plant.col][plant.row] = None
+        self.planes[plant.row, plant.col, PLANE_PLANT:PLANE_PLANT_HP + 1] = 0
+        self.place_mask[:, plant.col, plant.row] = self.affordable
+        self.events[EVENT_PLANTS_LOST] += 1
+        self.plant_counts[plant.type][plant.row] -= 1
+        self.plant_totals[plant.type] -= 1
+
+    def _add_zombie(self, zombie):
+        self.zombies.append(zombie)
+        self.zombies_spawned += 1
+        self.zombies_by_row[zombie.row] += 1
+        self.live_zombies += 1
+        self._lane_changed(zombie.row)
+        self._zombie_entered(zombie)
+        
+        # The new zombie is a target for every idle shooter in its row
+        for plant in self.idle_shooters[zombie.row]:
+            self.scheduler.schedule(self.ticks, PHASE_PLANTS, self._shoot, plant)
+        self.idle_shooters[zombie.row] = []
+
+    def _kill_zombie(self, zombie):
+        """Start the death animation; the zombie no longer counts as live"""
+        zombie.dying = True
+        self.zombies_by_row[zombie.row] -= 1
+        self.live_zombies -= 1
+        self.events[EVENT_KILLS] += 1
+        self._lane_changed(zombie.row)
+        cell = self.planes[zombie.row, zombie.bucket]
+        cell[PLANE_ZOMBIES] -= 1
+        cell[PLANE_ZOMBIE_HP] -= zombie.hp
+
+    def _zombie_entered(self, zombie):
+        """Count a live zombie in the cell it has walked into"""
+        zombie.bucket = col = cell_col(zombie.x)
+        # Crossing this x moves it into the next cell to the left
+        zombie.bucket_x = GRID_OFFSET_X + col * CELL_WIDTH if col > 0 else -math.inf
+        cell = self.planes[zombie.row, col]
+        cell[PLANE_ZOMBIES] += 1
+        cell[PLANE_ZOMBIE_HP] += zombie.hp
+
+    def _zombie_moved(self, zombie):
+        cell = self.planes[zombie.row, zombie.bucket]
+        cell[PLANE_ZOMBIES] -= 1
+        cell[PLANE_ZOMBIE_HP] -= zombie.hp
+        self._zombie_entered(zombie)
+
+    def _damage_zombie(self, zombie, damage):
+        zombie.hp -= damage
+        if not zombie.dying:
+            self.events[EVENT_DAMAGE] += damage
+            self.planes[zombie.row, zombie.bucket, PLANE_ZOMBIE_HP] -= damage
+
+    def _pea_entered(self, pea):
+        pea.bucket = col = cell_col(pea.x)
+        # Crossing this x moves it into the next cell to the right
+        pea.bucket_x = GRID_OFFSET_X + (col + 1) * CELL_WIDTH if col < GRID_COLS - 1 else math.inf
+        self.planes[pea.row, col, PLANE_PEAS] += 1
+
+    def _pea_moved(self, pea):
+        self.planes[pea.row, pea.bucket, PLANE_PEAS] -= 1
+        self._pea_entered(pea)
+
+    def _add_pea(self, pea):
+        self.peas.append(pea)
+        self._pea_entered(pea)
+
+    def _remove_zombie(self, zombie):
+        """Remove a zombie whose death animation has finished"""
+        self.zombies.remove(zombie)
+        self.zombies_left -= 1
+        self._lane_changed(zombie.row)
+
+    def _add_sun(self, sun):
+        self.suns.append(sun)
+        self.suns_available += 1
+        self.action_mask[ACTION_COLLECT] = True
+        self.scheduler.schedule(self.ticks + SUN_LIFETIME_TICKS, PHASE_SUNS, self._expire_sun, sun)
+
+    def _remove_sun(self, sun):
+        """Remove a collected or expired sun"""
+        self.suns.remove(sun)
+        self.suns_available -= 1
+        self.action_mask[ACTION_COLLECT] = self.suns_available > 0
+        sun.active = False
+
+    # ---- Timed events ----
+
+    @property
+    def ai_mode(self):
+        return self._ai_mode
+
+    @ai_mode.setter
+    def ai_mode(self, enabled):
+        # The AI timer only runs while AI mode is on, so idle games can skip ahead
+        self._ai_mode = enabled
+        if enabled and self.ai_event is None:
+            self.ai_event = self.scheduler.schedule(self.ticks, PHASE_AI, self._ai_tick)
+
+    def _ai_tick(self, _):
+        if not self.ai_mode:
+            self.ai_event = None
+            return
+        self.ai_decide()
+        self.ai_event = self.scheduler.schedule(self.ticks + AI_ACTION_TICKS, PHASE_AI, self._ai_tick)
+
+    def _spawn_tick(self, _):
+        self.spawn_zombie()
+        self.last_spawn = self.ticks
+        self._schedule_spawn()
+
+    def _schedule_spawn(self):
+        """(Re)schedule the next spawn using the current spawn interval"""
+        self.scheduler.cancel(self.spawn_event)
+        due = max(self.ticks + 1, self.last_spawn + int(self.spawn_interval * FPS))
+        self.spawn_event = self.scheduler.schedule(due, PHASE_SPAWN, self._spawn_tick)
+
+    def _produce_sun(self, plant):
+        if not self._on_board(plant):
+            return
+        self._add_sun(Sun(plant.x, plant.y - 30, is_bright=True, rng=self.cosmetic_rng))
+        plant.sun_due = self.ticks + SUN_PRODUCTION_TICKS
+        self.scheduler.schedule(plant.sun_due, PHASE_ECONOMY, self._produce_sun, plant)
+
+    def _shoot(self, plant):
+        if not self._on_board(plant):
+            return
+        
+        has_zombie = any(z.row == plant.row and z.x > plant.x for z in self.zombies)
+        if not has_zombie:
+            # Nothing to shoot at until another zombie spawns in this row
+            self.idle_shooters[plant.row].append(plant)
+            return
+        
+        if self.headless:
+            for _ in range(2 if plant.type == "repeater" else 1):
+                self.shots[plant.row].append(Shot(plant.x + 20, plant.row, self.ticks))
+            self._lane_changed(plant.row)
+        elif plant.type == "repeater":
+            # Shoot two peas rapidly!
+            self._add_pea(Pea(plant.x + 20, plant.y - 18, plant.row, self.cosmetic_rng))
+            # Second pea comes shortly after
+            self._add_pea(Pea(plant.x + 20, plant.y - 12, plant.row, self.cosmetic_rng))
+        else:
+            self._add_pea(Pea(plant.x + 20, plant.y - 15, plant.row, self.cosmetic_rng))
+        self.scheduler.schedule(self.ticks + SHOT_COOLDOWN_TICKS, PHASE_PLANTS, self._shoot, plant)
+
+    def _bite(self, zombie):
+        """Zombie attack, re-armed every attack_speed seconds while it keeps eating"""
+        plant = zombie.target
+        if zombie.dying or not zombie.eating or not self._on_board(plant):
+            zombie.attack_armed = False
+            return
+        
+        plant.hp -= zombie.damage
+        self.planes[plant.row, plant.col, PLANE_PLANT_HP] = max(0, plant.hp)
+        if plant.hp <= 0 and plant.hp + zombie.damage > 0:
+            self.scheduler.schedule(self.ticks + 1, PHASE_PLANT_DEATH, self._plant_died, plant)
+        
+        zombie.next_attack = self.ticks + int(zombie.attack_speed * FPS)
+        zombie.attack_armed = True
+        self.scheduler.schedule(zombie.next_attack, PHASE_ZOMBIES, self._bite, zombie)
+
+    def _plant_died(self, plant):
+        if self._on_board(plant):
+            self._remove_plant(plant)
+
+    def _expire_sun(self, sun):
+        if sun.active:
+            self._remove_sun(sun)
+
+    # ---- Headless shots ----
+
+    def _lane_changed(self, row):
+        """A zombie in this row spawned, stopped, started moving or left"""
+        if self.headless:
+            self.dirty_lanes[row] = True
+
+    def _replan_lanes(self):
+        """Re-resolve every shot in flight in the rows whose zombies changed"""
+        for row in range(GRID_ROWS):
+            if not self.dirty_lanes[row]:
+                continue
+            self.dirty_lanes[row] = False
+            
+            # Drop shots that have left the screen without hitting anything
+            shots = [shot for shot in self.shots[row] if shot.last_tick >= self.ticks]
+            self.shots[row] = shots
+            
+            lane = [z for z in self.zombies if z.row == row]
+            for shot in shots:
+                self._resolve_shot(shot, lane)
+
+    def _resolve_shot(self, shot, lane):
+        """Work out which zombie the shot meets first, and when"""
+        if shot.event is not None:
+            self.scheduler.cancel(shot.event)
+            shot.event = None
+        
+        first = max(self.ticks, shot.fired)
+        best_tick = None
+        for zombie in lane:  # Ties go to the earlier zombie, like the pea loop
+            tick = self._pea_contact(shot, zombie, first)
+            if tick is not None and (best_tick is None or tick < best_tick):
+                best_tick = tick
+                shot.target = zombie
+        
+        if best_tick is not None:
+            shot.event = self.scheduler.schedule(best_tick, PHASE_PEAS, self._pea_hit, shot)
+
+    def _pea_contact(self, shot, zombie, first):
+        """First tick from `first` on where the shot is within 25 px of the zombie
+        
+        Zombie positions are evaluated with the same expression Zombie.move
+        uses, so the result matches stepping the pea one tick at a time.
+        """
+        now = self.ticks
+        moving = not (zombie.eating or zombie.dying)
+        
+        def gap(tick):
+            if moving:
+                zombie_x = zombie.start_x - zombie.speed * (zombie.steps + tick - now)
+            else:
+                zombie_x = zombie.x
+            return zombie_x - shot.x_at(tick)
+        
+        start_gap = gap(first)
+        if start_gap <= -25:
+            return None  # Already past this zombie
+        if start_gap < 25:
+            return first
+        
+        closing = shot.speed + (zombie.speed if moving else 0)
+        tick = first + math.ceil((start_gap - 25) / closing)
+        while tick > first and gap(tick - 1) < 25:
+            tick -= 1
+        while gap(tick) >= 25:
+            tick += 1
+        
+        if tick > shot.last_tick or gap(tick) <= -25:
+            return None
+        return tick
+
+    def _pea_hit(self, shot):
+        self._damage_zombie(shot.target, shot.damage)
+        shot.event = None
+        self.shots[shot.row].remove(shot)
+
     def ai_log(self, message):
         """Add a log message and keep only the most recent ones"""
         timestamp = time.strftime("%H:%M:%S")
@@ -848,10 +1414,13 @@ class Game:
         if len(self.ai_logs) > self.max_logs:
             self.ai_logs.pop(0)
         
-        # Also print to console for debugging
-        print(f"AI: {message}")
+        # Also print to console for debugging (headless runs stay quiet)
+        if not self.headless:
+            print(f"AI: {message}")
 
     def draw_top_bar(self):
+        screen = display()
+        font, _, small_font = fonts()
         # Top bar background
         pygame.draw.rect(screen, PAPER_COLOR, (0, 0, SCREEN_WIDTH, TOP_BAR_HEIGHT))
         pygame.draw.line(screen, BLACK, (0, TOP_BAR_HEIGHT), (SCREEN_WIDTH, TOP_BAR_HEIGHT), 3)
@@ -888,7 +1457,7 @@ class Game:
         pygame.draw.rect(screen, (230, 230, 230), (wave_x, progress_y, progress_width, progress_height))
         pygame.draw.rect(screen, BLACK, (wave_x, progress_y, progress_width, progress_height), 2)
         
-        zombies_killed = self.zombies_spawned - len(self.zombies)
+        zombies_killed = self.zombies_to_spawn - self.zombies_left
         total_zombies = self.zombies_to_spawn
         progress_percent = zombies_killed / total_zombies if total_zombies > 0 else 0
         
@@ -901,7 +1470,7 @@ class Game:
         
         # Controls help (right)
         help_x = wave_x + 120
-        help_text = small_font.render("[1-3] Plant  [P] Pause  [R] Restart", True, GRAY_PENCIL)
+        help_text = small_font.render("[1-3] Plant  [P] Pause  [R] Restart  [F3] Perf", True, GRAY_PENCIL)
         screen.blit(help_text, (help_x, 22))
 
     def draw_plant_icon(self, surface, plant_type, x, y, size=0.6):
@@ -1014,6 +1583,8 @@ class Game:
             pygame.draw.lines(surface, BLACK, False, mouth_points, 1)
 
     def draw_sidebar(self):
+        screen = display()
+        font, title_font, small_font = fonts()
         # Sidebar background
         sidebar_rect = pygame.Rect(0, 0, SIDEBAR_WIDTH, SCREEN_HEIGHT)
         pygame.draw.rect(screen, PAPER_COLOR, sidebar_rect)
@@ -1099,6 +1670,7 @@ class Game:
                 screen.blit(cost_surf, (SIDEBAR_WIDTH//2 - cost_surf.get_width()//2, y + 90))
 
     def draw_grid(self):
+        screen = display()
         # Draw pre-generated grass textures
         texture_idx = 0
         for col in range(GRID_COLS):
@@ -1110,6 +1682,8 @@ class Game:
                 texture_idx += 1
 
     def draw_ui(self):
+        screen = display()
+        font, title_font, small_font = fonts()
         self.draw_top_bar()
         self.draw_sidebar()
         
@@ -1157,6 +1731,8 @@ class Game:
         # Store button rect for click detection
         self.ai_button_rect = pygame.Rect(button_x, button_y, button_width, button_height)
         
+        self.draw_perf_overlay(button_x - 30, button_y)
+        
         # AI Action Logs (bottom right corner)
         if self.ai_mode and self.ai_logs:
             log_width = 400
@@ -1186,38 +1762,80 @@ class Game:
                 log_text = small_font.render(log, True, (50, 50, 50))
                 screen.blit(log_text, (log_x + 10, log_start_y + i * line_height))
 
-    def ai_decide(self):
-        """AI makes decisions about what to do"""
-        current_time = time.time()
-        
-        # Only act at intervals
-        if current_time - self.last_ai_action < self.ai_action_interval:
+    def draw_perf_overlay(self, right, top):
+        """Perf toggle left of the AI Mode button, and the phase timings below it"""
+        screen = display()
+        _, _, small_font = fonts()
+        button_width = 64
+        button_height = 28
+        button_x = right - button_width
+        enabled = self.timer.enabled
+        
+        pygame.draw.rect(screen, (255, 245, 200) if enabled else (250, 250, 250),
+                         (button_x, top, button_width, button_height), border_radius=5)
+        pygame.draw.rect(screen, ORANGE_PENCIL if enabled else (150, 150, 150),
+                         (button_x, top, button_width, button_height), 2, border_radius=5)
+        button_text = small_font.render("Perf", True, BLACK if enabled else (100, 100, 100))
+        screen.blit(button_text, (button_x + button_width//2 - button_text.get_width()//2, top + 5))
+        self.perf_button_rect = pygame.Rect(button_x, top, button_width, button_height)
+        
+        if not enabled:
             return
         
-        self.last_ai_action = current_time
-        
-        # Count plants by type and row
-        sunflowers = sum(1 for p in self.plants if p.type == "sunflower")
-        peashooters_by_row = [0] * GRID_ROWS
-        wallnuts_by_row = [0] * GRID_ROWS
-        
-        for plant in self.plants:
-            if plant.type == "peashooter":
-                peashooters_by_row[plant.row] += 1
-            elif plant.type == "wallnut":
-                wallnuts_by_row[plant.row] += 1
+        # Mean and p95 per phase, in milliseconds, over the rolling window
+        lines = []
+        for prefix, phases in (("update", PhaseTimer.UPDATE_PHASES), ("draw", PhaseTimer.DRAW_PHASES)):
+            total = self.timer.stats(prefix)
+            if total is None:
+                continue
+            lines.append((f"{prefix}", total, True))
+            for phase in phases:
+                stats = self.timer.stats(f"{prefix}.{phase}")
+                if stats is not None:
+                    lines.append((f"  {phase}", stats, False))
+        if self.timer.entity_counts:
+            counts = self.timer.entity_counts[-1]
+            lines.append((f"P{counts['plants']} Z{counts['zombies']} "
+                          f"peas {counts['peas']} suns {counts['suns']}", None, True))
+        
+        line_height = 20
+        panel_width = 280
+        panel_x = SCREEN_WIDTH - panel_width - 10
+        panel_y = top + button_height + 8
+        panel = pygame.Surface((panel_width, len(lines) * line_height + 30), pygame.SRCALPHA)
+        panel.fill((255, 255, 255, 220))
+        screen.blit(panel, (panel_x, panel_y))
+        pygame.draw.rect(screen, GRAY_PENCIL, (panel_x, panel_y, panel_width, panel.get_height()), 1)
+        
+        screen.blit(small_font.render("phase", True, GRAY_PENCIL), (panel_x + 8, panel_y + 4))
+        header = small_font.render("ms  mean    p95", True, GRAY_PENCIL)
+        screen.blit(header, (panel_x + panel_width - header.get_width() - 8, panel_y + 4))
+        for i, (label, stats, bold) in enumerate(lines):
+            y = panel_y + 26 + i * line_height
+            color = BLACK if bold else (60, 60, 60)
+            screen.blit(small_font.render(label, True, color), (panel_x + 8, y))
+            if stats is not None:
+                value = f"{stats['mean_us'] / 1000:6.2f} {stats['p95_us'] / 1000:6.2f}"
+                value_text = small_font.render(value, True, color)
+                screen.blit(value_text, (panel_x + panel_width - value_text.get_width() - 8, y))
+
+    def ai_decide(self):
+        """AI makes decisions about what to do (runs every AI_ACTION_TICKS)"""
+        # Plant counts by type and row come from the running board statistics
+        sunflowers = self.plant_totals["sunflower"]
+        peashooters_by_row = self.plant_counts["peashooter"]
+        wallnuts_by_row = self.plant_counts["wallnut"]
         
         # Log current state
-        active_zombies = len([z for z in self.zombies if not z.dying])
-        self.ai_log(f"Wave {self.wave} | Sun: {self.sun_count} | Sunflowers: {sunflowers} | Zombies: {active_zombies}")
+        self.ai_log(f"Wave {self.wave} | Sun: {self.sun_count} | Sunflowers: {sunflowers} | Zombies: {self.live_zombies}")
         
         # Priority 1: Collect ALL suns immediately
-        for sun in self.suns[:]:
-            if sun.active:
-                self.sun_count += sun.value
-                self.suns.remove(sun)
-                self.ai_log(f"Collected sun (+{sun.value}) = {self.sun_count}")
-                return  # One action per tick
+        if self.suns_available > 0:
+            for sun in self.suns:
+                if sun.active:
+                    self.collect_sun(sun)
+                    self.ai_log(f"Collected sun (+{sun.value}) = {self.sun_count}")
+                    return  # One action per tick
         
         # Priority 2: Early defense - prepare before zombies arrive
         if self.wave == 1 and sunflowers < 2:
@@ -1293,40 +1911,108 @@ class Game:
             self.ai_log("Waiting for sun...")
     
     def place_plant(self, col, row, plant_type):
-        """Place a plant at the specified grid position"""
+        """Place a plant at the specified grid position; returns whether it was placed"""
         if self.grid[col][row] is None:
-            costs = {"sunflower": 50, "peashooter": 100, "wallnut": 50}
-            if self.sun_count >= costs[plant_type]:
-                plant = Plant(col, row, plant_type)
-                self.plants.append(plant)
-                self.grid[col][row] = plant
-                self.sun_count -= costs[plant_type]
+            if self.sun_count >= PLANT_COSTS[plant_type]:
+                self.action_log.append((self.ticks, "place", plant_type, col, row))
+                self._add_plant(Plant(col, row, plant_type, self.cosmetic_rng))
+                self.sun_count -= PLANT_COSTS[plant_type]
+                self.events[EVENT_SUN_SPENT] += PLANT_COSTS[plant_type]
+                return True
+        return False
+
+    def collect_sun(self, sun):
+        """Bank a sun's value and take it off the lawn"""
+        self.action_log.append((self.ticks, "collect", self.suns.index(sun)))
+        self.sun_count += sun.value
+        self.events[EVENT_SUN_GAINED] += sun.value
+        self._remove_sun(sun)
+
+    def act(self, action):
+        """Take one action of the agent action space; returns whether it did anything
+        
+        ACTION_COLLECT banks the oldest sun on the lawn. Illegal actions (see
+        action_mask) do nothing.
+        """
+        if action == ACTION_WAIT or not self.action_mask[action]:
+            return False
+        if action == ACTION_COLLECT:
+            self.collect_sun(self.suns[0])
+            return True
+        plant_type, col, row = decode_action(action)
+        return self.place_plant(col, row, plant_type)
 
     def spawn_zombie(self):
         if self.zombies_spawned < self.zombies_to_spawn:
-            row = random.randint(0, GRID_ROWS - 1)
+            row = self.spawn_rng.randint(0, GRID_ROWS - 1)
             
             # Determine zombie type based on wave
             # Wave 1-2: Only normal + cone
             # Wave 3+: Add football zombies
-            if self.wave >= 3 and random.random() < 0.15:
+            if self.wave >= 3 and self.spawn_rng.random() < 0.15:
                 zombie_type = "football"
             else:
                 # 30% chance to spawn conehead zombie (increases with waves)
                 cone_chance = 0.2 + (self.wave * 0.05)
-                if random.random() < min(cone_chance, 0.5):
+                if self.spawn_rng.random() < min(cone_chance, 0.5):
                     zombie_type = "cone"
                 else:
                     zombie_type = "normal"
             
-            self.zombies.append(Zombie(row, zombie_type))
-            self.zombies_spawned += 1
+            self._add_zombie(Zombie(row, zombie_type, self.cosmetic_rng))
+
+    def spawn_natural_sun(self, _=None):
+        x = self.economy_rng.randint(GRID_OFFSET_X, GRID_OFFSET_X + GRID_COLS * CELL_WIDTH - 50)
+        target_y = self.economy_rng.randint(120, SCREEN_HEIGHT - 100)
+        self._add_sun(Sun(x, -30, target_y=target_y, rng=self.cosmetic_rng))
+        self.scheduler.schedule(self.ticks + SUN_PRODUCTION_TICKS, PHASE_ECONOMY, self.spawn_natural_sun)
+
+    def memory_structures(self):
+        """What a memory report measures: entities, the scheduler, timing and logs"""
+        return {
+            "plants": self.plants,
+            "zombies": self.zombies,
+            "peas": self.peas,
+            "shots": self.shots,
+            "suns": self.suns,
+            "scheduler": self.scheduler.queue,
+            "timer": self.timer.samples,
+            "action_log": self.action_log,
+            "ai_logs": self.ai_logs,
+            "planes": self.planes,
+            "action_mask": self.action_mask,
+            "events": self.events,
+        }
 
-    def spawn_natural_sun(self):
-        if time.time() - self.last_sun_spawn > 15:
-            x = random.randint(GRID_OFFSET_X, GRID_OFFSET_X + GRID_COLS * CELL_WIDTH - 50)
-            self.suns.append(Sun(x, -30))
-            self.last_sun_spawn = time.time()
+    def observation(self, out=None):
+        """The board as a rows x cols x PLANES array (see PLANES)
+        
+        The planes are kept current as plants, zombies and peas change, so
+        this only fills in headless shots, whose positions are never stepped,
+        and copies into `out` (a float32 buffer, say) if one is given. Without
+        `out` the array returned is the game's own and changes as it runs.
+        """
+        if self.headless:
+            self._count_shots()
+        if out is None:
+            return self.planes
+        np.copyto(out, self.planes, casting="same_kind")
+        return out
+
+    def _count_shots(self):
+        """Fill the pea plane from the headless shots in flight"""
+        peas = self.planes[:, :, PLANE_PEAS]
+        last = self.ticks - 1  # Shots are where the pea phase of the last tick left them
+        # A stepped pea leaves the screen on its last tick, so such shots are gone too
+        for row, shots in enumerate(self.shots):
+            xs = np.fromiter((shot.x_at(last) for shot in shots if shot.last_tick > last), float)
+            cols = np.clip((xs - GRID_OFFSET_X) // CELL_WIDTH, 0, GRID_COLS - 1).astype(np.intp)
+            peas[row] = np.bincount(cols, minlength=GRID_COLS)
+
+    def toggle_timer(self):
+        """Switch phase timing and its overlay on or off, starting a fresh window"""
+        self.timer.enabled = not self.timer.enabled
+        self.timer.reset()
 
     def handle_click(self, pos):
         if self.game_over or self.paused:
@@ -1334,6 +2020,11 @@ class Game:
         
         x, y = pos
         
+        # Check perf overlay toggle
+        if hasattr(self, 'perf_button_rect') and self.perf_button_rect.collidepoint(x, y):
+            self.toggle_timer()
+            return
+        
         # Check AI Mode toggle button
         if hasattr(self, 'ai_button_rect') and self.ai_button_rect.collidepoint(x, y):
             self.ai_mode = not self.ai_mode
@@ -1360,8 +2051,7 @@ class Game:
             if sun.active:
                 distance = math.sqrt((x - sun.x)**2 + (y - sun.y)**2)
                 if distance < sun.radius + 15:
-                    self.sun_count += sun.value
-                    self.suns.remove(sun)
+                    self.collect_sun(sun)
                     return
         
         # Check grid
@@ -1372,138 +2062,343 @@ class Game:
                 
                 if self.selected_plant is not None:
                     plant_types = ["sunflower", "peashooter", "wallnut"]
-                    costs = [50, 100, 50]
                     
-                    if self.sun_count >= costs[self.selected_plant]:
-                        if self.grid[col][row] is None:
-                            plant_type = plant_types[self.selected_plant]
-                            plant = Plant(col, row, plant_type)
-                            self.plants.append(plant)
-                            self.grid[col][row] = plant
-                            self.sun_count -= costs[self.selected_plant]
-                            self.selected_plant = None
+                    if self.place_plant(col, row, plant_types[self.selected_plant]):
+                        self.selected_plant = None
 
     def update(self):
         if self.game_over or self.paused:
             return
         
-        # AI Mode: Let AI make decisions
-        if self.ai_mode:
-            self.ai_decide()
+        now = self.ticks
+        run_due = self.scheduler.run_due
         
-        current_time = time.time()
+        # Phase timing; `t` stays 0 and every lap is skipped while it is off
+        timer = self.timer
+        start = t = time.perf_counter_ns() if timer.enabled else 0
+        
+        # AI Mode: Let AI make decisions
+        run_due(now, PHASE_AI)
+        if t:
+            t = timer.lap("update.ai", t)
         
         # Spawn zombies
-        if current_time - self.last_spawn > self.spawn_interval:
-            self.spawn_zombie()
-            self.last_spawn = current_time
+        run_due(now, PHASE_SPAWN)
+        if t:
+            t = timer.lap("update.spawn", t)
         
         # Wave completion
-        if self.zombies_spawned >= self.zombies_to_spawn and len(self.zombies) == 0:
+        if self.zombies_left == 0:
             self.wave += 1
+            self.events[EVENT_WAVES_CLEARED] += 1
             self.zombies_spawned = 0
             self.zombies_to_spawn = 3 + self.wave
+            self.zombies_left = self.zombies_to_spawn
             self.spawn_interval = max(5, 12 - self.wave * 0.5)
+            self._schedule_spawn()
+        if t:
+            t = timer.lap("update.wave", t)
+        
+        # Natural sun and sunflower production
+        run_due(now, PHASE_ECONOMY)
+        if t:
+            t = timer.lap("update.economy", t)
+        
+        # Shooters that are off cooldown, then plants that were eaten
+        run_due(now, PHASE_PLANTS)
+        run_due(now, PHASE_PLANT_DEATH)
+        if t:
+            t = timer.lap("update.plants", t)
+        
+        # Zombie bites that are off cooldown
+        run_due(now, PHASE_ZOMBIES)
+        if t:
+            t = timer.lap("update.bites", t)
+        
+        # Contact, movement and deaths; stepped peas; headless shots
+        self._update_zombies()
+        if t:
+            t = timer.lap("update.zombies", t)
+        self._update_peas()
+        if t:
+            t = timer.lap("update.peas", t)
+        self._replan_lanes()
+        run_due(now, PHASE_PEAS)
+        if t:
+            t = timer.lap("update.shots", t)
+        
+        # Expire old suns, then animate the rest
+        run_due(now, PHASE_SUNS)
+        self._update_suns()
+        if t:
+            timer.lap("update.suns", t)
+            timer.lap("update", start)
+            timer.count(self)
+        
+        self.ticks += 1
+
+    def _update_zombies(self):
+        """Move zombies, start bites on contact and retire finished deaths"""
+        kernel = pvz_kernels.first_contact
+        if kernel is not None:
+            self._update_zombies_kernel(kernel)
+            return
         
-        # Natural sun
-        self.spawn_natural_sun()
-        
-        # Update plants
-        for plant in self.plants[:]:
-            if plant.type == "sunflower":
-                if current_time - plant.last_sun > 15:
-                    self.suns.append(Sun(plant.x, plant.y - 30, is_bright=True))
-                    plant.last_sun = current_time
-            
-            elif plant.type == "peashooter":
-                has_zombie = any(z.row == plant.row and z.x > plant.x for z in self.zombies)
-                if has_zombie and current_time - plant.last_shot > 1.5:
-                    self.peas.append(Pea(plant.x + 20, plant.y - 15, plant.row))
-                    plant.last_shot = current_time
-            
-            elif plant.type == "repeater":
-                has_zombie = any(z.row == plant.row and z.x > plant.x for z in self.zombies)
-                if has_zombie and current_time - plant.last_shot > 1.5:
-                    # Shoot two peas rapidly!
-                    self.peas.append(Pea(plant.x + 20, plant.y - 18, plant.row))
-                    # Second pea comes shortly after
-                    self.peas.append(Pea(plant.x + 20, plant.y - 12, plant.row))
-                    plant.last_shot = current_time
-            
-            if plant.hp <= 0:
-                self.plants.remove(plant)
-                self.grid[plant.col][plant.row] = None
-        
-        # Update zombies
         for zombie in self.zombies[:]:
             # Skip dying zombies for game logic
             if zombie.dying:
                 zombie.move()
                 # Remove death animation finished
                 if zombie.death_timer >= zombie.death_duration:
-                    self.zombies.remove(zombie)
+                    self._remove_zombie(zombie)
                 continue
             
+            was_eating = zombie.eating
             zombie.eating = False
             
             for plant in self.plants:
                 if plant.row == zombie.row:
                     if abs(zombie.x - plant.x) < 30:
                         zombie.eating = True
-                        if current_time - zombie.last_attack > zombie.attack_speed:
-                            plant.hp -= zombie.damage
-                            zombie.last_attack = current_time
+                        zombie.target = plant
+                        if not zombie.attack_armed:
+                            self._bite(zombie)
                         break
             
+            if zombie.eating != was_eating:
+                self._lane_changed(zombie.row)
+            
             zombie.move()
+            if zombie.x < zombie.bucket_x:
+                self._zombie_moved(zombie)
             
             if zombie.hp <= 0 and not zombie.dying:
                 # Trigger death animation instead of removing
-                zombie.dying = True
+                self._kill_zombie(zombie)
                 continue
             
             if zombie.x < GRID_OFFSET_X - 20:
                 self.game_over = True
+
+    def _update_zombies_kernel(self, kernel):
+        """_update_zombies with the plant search done by an array kernel
+        
+        Contacts are found for every zombie up front: a zombie only moves
+        after its own test and plants only die in a later phase, so each
+        test sees the same positions as in the loop above.
+        """
+        zombies = self.zombies[:]
+        if self._plant_arrays is None:
+            self._plant_arrays = (np.array([p.row for p in self.plants], dtype=np.int64),
+                                  np.array([p.x for p in self.plants], dtype=np.float64))
+        plant_rows, plant_xs = self._plant_arrays
+        contacts = kernel(np.array([z.row for z in zombies], dtype=np.int64),
+                          np.array([z.x for z in zombies], dtype=np.float64),
+                          plant_rows, plant_xs, 30)
+        plants = self.plants
+        
+        for zombie, contact in zip(zombies, contacts.tolist()):
+            if zombie.dying:
+                zombie.move()
+                if zombie.death_timer >= zombie.death_duration:
+                    self._remove_zombie(zombie)
+                continue
+            
+            was_eating = zombie.eating
+            zombie.eating = contact >= 0
+            if zombie.eating:
+                zombie.target = plants[contact]
+                if not zombie.attack_armed:
+                    self._bite(zombie)
+            
+            if zombie.eating != was_eating:
+                self._lane_changed(zombie.row)
+            
+            zombie.move()
+            if zombie.x < zombie.bucket_x:
+                self._zombie_moved(zombie)
+            
+            if zombie.hp <= 0 and not zombie.dying:
+                self._kill_zombie(zombie)
+                continue
+            
+            if zombie.x < GRID_OFFSET_X - 20:
+                self.game_over = True
+
+    def _update_peas(self):
+        """Step windowed peas and apply their hits"""
+        kernel = pvz_kernels.first_contact
+        if kernel is not None and self.peas:
+            self._update_peas_kernel(kernel)
+            return
         
-        # Update peas
         for pea in self.peas[:]:
             pea.move()
+            if pea.x >= pea.bucket_x:
+                self._pea_moved(pea)
             
             for zombie in self.zombies:
                 if zombie.row == pea.row and abs(zombie.x - pea.x) < 25:
-                    zombie.hp -= pea.damage
+                    self._damage_zombie(zombie, pea.damage)
                     pea.active = False
                     break
             
             if not pea.active:
                 self.peas.remove(pea)
-        
-        # Update suns
-        for sun in self.suns[:]:
+                self.planes[pea.row, pea.bucket, PLANE_PEAS] -= 1
+
+    def _update_peas_kernel(self, kernel):
+        """_update_peas with the zombie search done by an array kernel
+        
+        A hit only lowers hp, which no pea tests, so every pea can be
+        matched against the zombies at once.
+        """
+        peas = self.peas
+        for pea in peas:
+            pea.move()
+            if pea.x >= pea.bucket_x:
+                self._pea_moved(pea)
+        zombies = self.zombies
+        hits = kernel(np.array([p.row for p in peas], dtype=np.int64),
+                      np.array([p.x for p in peas], dtype=np.float64),
+                      np.array([z.row for z in zombies], dtype=np.int64),
+                      np.array([z.x for z in zombies], dtype=np.float64), 25)
+        
+        for pea, hit in zip(peas, hits.tolist()):
+            if hit >= 0:
+                self._damage_zombie(zombies[hit], pea.damage)
+                pea.active = False
+            if not pea.active:
+                self.planes[pea.row, pea.bucket, PLANE_PEAS] -= 1
+        self.peas = [pea for pea in peas if pea.active]
+
+    def _update_suns(self):
+        for sun in self.suns:
             sun.update()
-            if not sun.active:
-                self.suns.remove(sun)
+
+    def simulate(self, until):
+        """Run headlessly up to tick `until` (or game over)
+        
+        Stretches where nothing can happen except zombies, peas and suns
+        moving at constant speed are jumped over in one step; everything
+        else runs through the normal per-tick update, so the outcome is the
+        same as calling update() once per tick.
+        """
+        while self.ticks < until and not self.game_over and not self.paused:
+            quiet = self._quiet_ticks(until - self.ticks - 1)
+            if quiet > 0:
+                self._skip(quiet)
+            self.update()
+        return self.ticks
+
+    def _quiet_ticks(self, limit):
+        """How many upcoming ticks are guaranteed to be pure motion (at most `limit`)"""
+        if self.zombies_left == 0:
+            return 0  # Wave completes on the next update
+        
+        quiet = limit
+        next_due = self.scheduler.next_due()
+        if next_due is not None:
+            quiet = min(quiet, next_due - self.ticks)
+        
+        # Pea x positions per row, sorted, plus the pea closest to leaving the screen
+        peas_by_row = [[] for _ in range(GRID_ROWS)]
+        for pea in self.peas:
+            peas_by_row[pea.row].append(pea.x)
+            quiet = min(quiet, int((SCREEN_WIDTH - pea.x) / pea.speed) - 1)
+        for row_peas in peas_by_row:
+            row_peas.sort()
+        pea_speed = 8
+        
+        for zombie in self.zombies:
+            if zombie.dying:
+                # Death animation finishing
+                remaining = zombie.death_duration - zombie.death_timer
+                quiet = min(quiet, int(remaining / 0.016) - 1)
+                speed = 0
+            elif zombie.hp <= 0:
+                return 0  # Starts dying on the next update
+            elif zombie.eating:
+                speed = 0
+            else:
+                speed = zombie.speed
+                
+                # Reaching the house
+                quiet = min(quiet, int((zombie.x - (GRID_OFFSET_X - 20)) / speed) - 1)
+                
+                # Reaching the nearest plant ahead in its row
+                col = min(GRID_COLS - 1, int((zombie.x + 30 - GRID_OFFSET_X) // CELL_WIDTH))
+                while col >= 0:
+                    plant = self.grid[col][zombie.row]
+                    if plant is not None and plant.x < zombie.x + 30:
+                        quiet = min(quiet, int((zombie.x - plant.x - 30) / speed) - 1)
+                        break
+                    col -= 1
+            
+            # The nearest pea still coming at this zombie
+            row_peas = peas_by_row[zombie.row]
+            i = bisect.bisect_left(row_peas, zombie.x + 25)
+            if i > 0:
+                gap = zombie.x - row_peas[i - 1]
+                quiet = min(quiet, int((gap - 25) / (pea_speed + speed)) - 1)
+            
+            if quiet <= 0:
+                return 0
+        
+        return max(0, quiet)
+
+    def _skip(self, ticks):
+        """Advance constant motion by `ticks` without running any game logic"""
+        for zombie in self.zombies:
+            zombie.move(ticks)
+            if zombie.x < zombie.bucket_x and not zombie.dying:
+                self._zombie_moved(zombie)
+        for pea in self.peas:
+            pea.move(ticks)
+            if pea.x >= pea.bucket_x:
+                self._pea_moved(pea)
+        for sun in self.suns:
+            sun.update(ticks)
+        self.ticks += ticks
 
     def draw(self):
+        screen = display()
+        font, title_font, _ = fonts()
+        timer = self.timer
+        start = t = time.perf_counter_ns() if timer.enabled else 0
+        
         # Plain paper background (no grid lines)
         screen.fill(PAPER_COLOR)
         
         self.draw_grid()
+        if t:
+            t = timer.lap("draw.grid", t)
         
         # Draw entities
         for plant in self.plants:
-            plant.draw(screen)
+            plant.draw(screen, self.ticks)
+        if t:
+            t = timer.lap("draw.plants", t)
         
         for zombie in self.zombies:
             zombie.draw(screen)
+        if t:
+            t = timer.lap("draw.zombies", t)
         
         for pea in self.peas:
             pea.draw(screen)
+        if t:
+            t = timer.lap("draw.peas", t)
         
         for sun in self.suns:
             sun.draw(screen)
+        if t:
+            t = timer.lap("draw.suns", t)
         
         self.draw_ui()
+        if t:
+            timer.lap("draw.ui", t)
+            timer.lap("draw", start)
         
         # Game over
         if self.game_over:
@@ -1519,9 +2414,21 @@ class Game:
             screen.blit(wave_text, (SCREEN_WIDTH//2 - wave_text.get_width()//2, SCREEN_HEIGHT//2))
             screen.blit(restart_text, (SCREEN_WIDTH//2 - restart_text.get_width()//2, SCREEN_HEIGHT//2 + 50))
 
-def main():
+def main(on_game_end=None):
+    """Run the interactive game; `on_game_end(game)` is called on restart and quit"""
+    open_display()
+    clock = pygame.time.Clock()
     game = Game()
     
+    # F9: cProfile, F10: tracemalloc; press again to stop early
+    captures = {
+        pygame.K_F9: Capture("cprofile", seconds=PROFILE_SECONDS),
+        pygame.K_F10: Capture("tracemalloc", seconds=PROFILE_SECONDS),
+    }
+    # F11: memory report at every new wave until pressed again
+    memory = None
+    memory_wave = 0
+    
     running = True
     while running:
         for event in pygame.event.get():
@@ -1543,17 +2450,44 @@ def main():
                 elif event.key == pygame.K_p:
                     game.paused = not game.paused
                 elif event.key == pygame.K_r:
+                    if on_game_end is not None:
+                        on_game_end(game)
                     game = Game()
                 elif event.key == pygame.K_a:
                     game.ai_mode = not game.ai_mode
                     game.selected_plant = None  # Clear selection when toggling AI
+                elif event.key == pygame.K_F3:
+                    game.toggle_timer()
+                elif event.key in captures:
+                    captures[event.key].toggle()
+                elif event.key == pygame.K_F11:
+                    if memory is None:
+                        memory = MemoryReport()
+                        memory.start()
+                        memory.sample(f"wave {game.wave}", game.memory_structures())
+                        memory_wave = game.wave
+                    else:
+                        memory.stop()
+                        memory = None
         
         game.update()
         game.draw()
         
         pygame.display.flip()
-        clock.tick(60)
+        clock.tick(FPS)
+        
+        for capture in captures.values():
+            capture.poll()
+        if memory is not None and game.wave != memory_wave:
+            memory.sample(f"wave {game.wave}", game.memory_structures())
+            memory_wave = game.wave
     
+    for capture in captures.values():
+        capture.stop()
+    if memory is not None:
+        memory.stop()
+    if on_game_end is not None:
+        on_game_end(game)
     pygame.quit()
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+PVZ Kernels - contact tests of the per-tick zombie and pea steps
+
+Every tick each walking zombie looks for the first plant in its row within
+30 px, and each pea for the first zombie in its row within 25 px. Both are the
+same question asked of two arrays:
+
+    first_contact(a_row, a_x, b_row, b_x, reach)[i]
+        = index of the first j with b_row[j] == a_row[i] and |a_x[i] - b_x[j]| < reach,
+          or -1
+
+Backends:
+  python  Game's own object loops; no arrays are built (default, fastest on small boards)
+  numpy   one broadcast comparison per step
+  numba   the reference loop compiled with Numba, if it is installed
+
+All three give identical results: check() runs every installed array kernel
+against the reference loop on random rows (python src/pvz_kernels.py does the
+same and exits 1 on a mismatch). Pick a backend with set_backend(), the
+PVZ_KERNELS environment variable or --kernels; bench/pvz_bench.py
+--compare-kernels times every installed backend on the bench boards.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BACKENDS = ("python", "numpy", "numba")
+
+backend = "python"
+first_contact = None  # The array kernel of the current backend; None for "python"
+
+
+def first_contact_loop(a_row, a_x, b_row, b_x, reach):
+    """Reference kernel: plain loops, also what the numba backend compiles"""
+    out = np.full(len(a_row), -1, dtype=np.int64)
+    for i in range(len(a_row)):
+        for j in range(len(b_row)):
+            if b_row[j] == a_row[i] and abs(a_x[i] - b_x[j]) < reach:
+                out[i] = j
+                break
+    return out
+
+
+def first_contact_numpy(a_row, a_x, b_row, b_x, reach):
+    if len(a_row) == 0 or len(b_row) == 0:
+        return np.full(len(a_row), -1, dtype=np.int64)
+    hit = (a_row[:, None] == b_row[None, :]) & (np.abs(a_x[:, None] - b_x[None, :]) < reach)
+    out = hit.argmax(axis=1)
+    out[~hit.any(axis=1)] = -1
+    return out
+
+
+_compiled = None
+
+
+def _numba_kernel():
+    global _compiled
+    if _compiled is None:
+        _compiled = numba.njit(cache=True, nogil=True)(first_contact_loop)
+    return _compiled
+
+
+def available():
+    """Backends that can be selected here"""
+    return [name for name in BACKENDS if name != "numba" or numba is not None]
+
+
+def set_backend(name):
+    """Switch every game to backend `name`; takes effect on the next tick"""
+    global backend, first_contact
+    if name not in BACKENDS:
+        raise ValueError(f"unknown kernel backend {name!r}, expected one of {BACKENDS}")
+    if name == "numba":
+        if numba is None:
+            raise RuntimeError("the numba kernel backend needs Numba: pip install numba")
+        first_contact = _numba_kernel()
+    elif name == "numpy":
+        first_contact = first_contact_numpy
+    else:
+        first_contact = None
+    backend = name
+    return name
+
+
+def check(cases=500, seed=0):
+    """Mismatches of each installed array kernel against first_contact_loop
+
+    Runs `cases` random inputs, empty sides and exact-reach ties included, and
+    returns {backend: cases that differ}.
+    """
+    kernels = {"numpy": first_contact_numpy}
+    if numba is not None:
+        kernels["numba"] = _numba_kernel()
+    rng = np.random.default_rng(seed)
+    mismatches = dict.fromkeys(kernels, 0)
+    for _ in range(cases):
+        a_n, b_n = rng.integers(0, 12, size=2)
+        a_row, b_row = rng.integers(0, 5, a_n), rng.integers(0, 5, b_n)
+        # Half-pixel grid, so some distances land exactly on the reach
+        a_x, b_x = rng.integers(0, 400, a_n) / 2.0, rng.integers(0, 400, b_n) / 2.0
+        reach = float(rng.choice([25, 30]))
+        expected = first_contact_loop(a_row, a_x, b_row, b_x, reach)
+        for name, kernel in kernels.items():
+            if not np.array_equal(kernel(a_row, a_x, b_row, b_x, reach), expected):
+                mismatches[name] += 1
+    return mismatches
+
+
+def add_arguments(parser):
+    """Add the --kernels option shared by the trainers and benchmarks"""
+    parser.add_argument("--kernels", choices=BACKENDS,
+                        help="contact kernels for the simulation (default: PVZ_KERNELS or python)")
+
+
+def from_args(args):
+    if args.kernels:
+        set_backend(args.kernels)
+        os.environ["PVZ_KERNELS"] = args.kernels  # Spawned workers import this module afresh
+
+
+set_backend(os.environ.get("PVZ_KERNELS", "python"))
+
+
+if __name__ == "__main__":
+    results = check()
+    for name in BACKENDS[1:]:
+        print(f"{name}: " + ("not installed" if name not in results
+                             else "ok" if not results[name] else f"{results[name]} mismatches"))
+    sys.exit(1 if any(results.values()) else 0)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+PVZ Memory - per-structure sizes and allocation growth for long sessions
+
+Each sample measures the deep size and length of the structures a game or
+trainer names, plus the memory traced by tracemalloc and its growth since the
+previous sample, so a session that keeps growing shows which structure grows.
+
+    report = MemoryReport(every=10)
+    report.start()
+    ...
+    report.episode_done("episode 12", game.memory_structures())  # every 10th is kept
+    report.sample("wave 3", game.memory_structures())             # always kept
+
+Samples are printed as they are taken and, with out=PATH, appended to a JSON
+lines file that survives the process being killed.
+"""
+
+import json
+import sys
+import tracemalloc
+import types
+from collections import deque
+
+from pvz_profile import start_tracing, stop_tracing
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+# Shared program objects, never counted as part of a structure
+_SKIP = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+         types.MethodType, types.CodeType)
+
+
+def deep_size(obj, seen=None):
+    """Bytes held by `obj` and everything it references, shared objects counted once
+
+    Follows containers, instance __dict__s and __slots__. Pass the same `seen`
+    set to several calls to leave out what an earlier structure already counted.
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SKIP):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        if hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+        for name in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, name):
+                stack.append(getattr(obj, name))
+    return total
+
+
+def max_rss():
+    """Peak resident set size of this process in bytes, or None where unknown"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # Linux reports KiB
+
+
+class MemoryReport:
+    """Samples of structure sizes and traced memory, taken per wave or episode"""
+
+    def __init__(self, every=1, out=None, trace=True, keep=100):
+        self.every = max(1, every)
+        self.out = out
+        self.trace = trace
+        self.rows = deque(maxlen=keep)  # The report must not grow without bound itself
+        self._episodes_done = 0
+        self._last_traced = None
+        self._started_tracing = False
+
+    @classmethod
+    def from_args(cls, args):
+        """Build a report from add_arguments() options, or None if not requested"""
+        if not args.memory_report:
+            return None
+        return cls(args.memory_report, args.memory_out)
+
+    def start(self):
+        if self.trace and not self._started_tracing:
+            start_tracing()
+            self._started_tracing = True
+        self._last_traced = self._traced()[0]
+
+    def stop(self):
+        if self._started_tracing:
+            stop_tracing()
+            self._started_tracing = False
+
+    def _traced(self):
+        if tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()
+        return None, None
+
+    def sample(self, label, structures):
+        """Measure `structures` ({name: object}) now; returns the new row"""
+        seen = set()
+        sizes = {}
+        for name, obj in structures.items():
+            entry = {"bytes": deep_size(obj, seen)}
+            if hasattr(obj, "__len__"):
+                entry["len"] = len(obj)
+            sizes[name] = entry
+
+        traced, peak = self._traced()
+        growth = None
+        if traced is not None and self._last_traced is not None:
+            growth = traced - self._last_traced
+        self._last_traced = traced
+        row = {"label": label, "structures": sizes, "traced": traced, "growth": growth,
+               "peak": peak, "max_rss": max_rss()}
+        self.rows.append(row)
+
+        print(self.format(row))
+        if self.out:
+            with open(self.out, 'a') as f:
+                f.write(json.dumps(row) + "\n")
+        return row
+
+    def episode_done(self, label, structures):
+        """Count a finished episode and sample every `every`-th one"""
+        self._episodes_done += 1
+        if self._episodes_done % self.every == 0:
+            return self.sample(label, structures)
+        return None
+
+    @staticmethod
+    def format(row):
+        def kib(value):
+            return "?" if value is None else f"{value / 1024:.1f} KiB"
+
+        growth = "?" if row["growth"] is None else f"{row['growth'] / 1024:+.1f} KiB"
+        lines = [f"[memory] {row['label']}: traced {kib(row['traced'])} ({growth}),"
+                 f" peak {kib(row['peak'])}, max RSS {kib(row['max_rss'])}"]
+        for name, entry in sorted(row["structures"].items(), key=lambda item: -item[1]["bytes"]):
+            count = f"{entry['len']:>8}" if "len" in entry else f"{'':>8}"
+            lines.append(f"  {name:<24} {count} {kib(entry['bytes']):>14}")
+        return "\n".join(lines)
+
+
+def add_arguments(parser):
+    """Add the --memory-report options shared by the trainers"""
+    group = parser.add_argument_group("memory")
+    group.add_argument("--memory-report", type=int, nargs="?", const=1, metavar="N",
+                       help="report structure sizes and traced memory every N episodes")
+    group.add_argument("--memory-out", metavar="PATH",
+                       help="also append each report to PATH as JSON lines")
+    return group
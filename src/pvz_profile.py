@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+PVZ Profiling - on-demand cProfile and tracemalloc captures
+
+A capture runs until it is stopped, or until a number of seconds or episodes
+has passed. It then writes a .pstats file (cProfile) or a .snapshot file
+(tracemalloc) plus a .txt file with the top entries, and prints that summary.
+
+    capture = Capture("cprofile", seconds=10)
+    capture.start()
+    ...
+    capture.poll()           # once per frame: stops when the time is up
+    capture.episode_done()   # once per episode: stops after N episodes
+
+Load the results with pstats.Stats(path) or tracemalloc.Snapshot.load(path).
+
+tracemalloc is one trace per process; start_tracing()/stop_tracing() share it
+between captures and pvz_memory reports, so one stopping does not end the
+other's trace.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+KINDS = ("cprofile", "tracemalloc")
+
+_tracing_users = 0
+_tracing_owned = False  # Whether start_tracing() started the running trace
+
+
+def start_tracing(frames=1):
+    """Start tracemalloc or join the running trace; pair each call with stop_tracing()
+
+    `frames` only applies if this call starts the trace.
+    """
+    global _tracing_users, _tracing_owned
+    if _tracing_users == 0:
+        _tracing_owned = not tracemalloc.is_tracing()
+        if _tracing_owned:
+            tracemalloc.start(frames)
+    _tracing_users += 1
+
+
+def stop_tracing():
+    """Leave the trace; it stops with the last user, unless someone else started it"""
+    global _tracing_users, _tracing_owned
+    if _tracing_users == 0:
+        return
+    _tracing_users -= 1
+    if _tracing_users == 0 and _tracing_owned:
+        tracemalloc.stop()
+        _tracing_owned = False
+
+
+class Capture:
+    """One profiling capture, limited by time and/or episode count"""
+
+    def __init__(self, kind="cprofile", seconds=None, episodes=None, out_dir="profiles", top=20):
+        if kind not in KINDS:
+            raise ValueError(f"unknown capture kind {kind!r}, expected one of {KINDS}")
+        self.kind = kind
+        self.seconds = seconds
+        self.episodes = episodes
+        self.out_dir = out_dir
+        self.top = top
+        self.active = False
+        self.path = None  # Last file written
+        self._profiler = None
+        self._started = 0.0
+        self._episodes_done = 0
+
+    @classmethod
+    def from_args(cls, args):
+        """Build a capture from add_arguments() options, or None if not requested"""
+        if not args.profile:
+            return None
+        return cls(args.profile, args.profile_seconds, args.profile_episodes,
+                   args.profile_dir, args.profile_top)
+
+    def start(self):
+        if self.active:
+            return
+        self.active = True
+        self._started = time.perf_counter()
+        self._episodes_done = 0
+        if self.kind == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            start_tracing(25)
+        print(f"[profile] {self.kind} capture started{self._limit_text()}")
+
+    def stop(self):
+        """End the capture and write its files; returns the capture file path"""
+        if not self.active:
+            return None
+        self.active = False
+        elapsed = time.perf_counter() - self._started
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"{self.kind}-{time.strftime('%Y%m%d-%H%M%S')}")
+
+        if self.kind == "cprofile":
+            self._profiler.disable()
+            self.path = base + ".pstats"
+            self._profiler.dump_stats(self.path)
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(self.top)
+            summary = out.getvalue()
+            self._profiler = None
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+            stop_tracing()
+            self.path = base + ".snapshot"
+            snapshot.dump(self.path)
+            lines = [f"Traced {traced / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB", ""]
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                lines.append(str(stat))
+            summary = "\n".join(lines) + "\n"
+
+        header = (f"{self.kind} capture: {elapsed:.1f}s, {self._episodes_done} episodes\n"
+                  f"Saved {self.path}\n\n")
+        with open(base + ".txt", 'w') as f:
+            f.write(header + summary)
+        print(f"[profile] {header}{summary}")
+        return self.path
+
+    def toggle(self):
+        if self.active:
+            return self.stop()
+        self.start()
+        return None
+
+    def poll(self):
+        """Stop once the time limit has passed; call this regularly"""
+        if self.active and self.seconds is not None:
+            if time.perf_counter() - self._started >= self.seconds:
+                self.stop()
+
+    def episode_done(self):
+        """Count a finished episode and stop once the episode limit is reached"""
+        if not self.active:
+            return
+        self._episodes_done += 1
+        if self.episodes is not None and self._episodes_done >= self.episodes:
+            self.stop()
+        else:
+            self.poll()
+
+    def _limit_text(self):
+        limits = []
+        if self.seconds is not None:
+            limits.append(f"{self.seconds:g}s")
+        if self.episodes is not None:
+            limits.append(f"{self.episodes} episodes")
+        return f" for {' or '.join(limits)}" if limits else ""
+
+
+def add_arguments(parser):
+    """Add the --profile options shared by the game and the trainers"""
+    group = parser.add_argument_group("profiling")
+    group.add_argument("--profile", choices=KINDS,
+                       help="capture a cProfile or tracemalloc profile from the start")
+    group.add_argument("--profile-seconds", type=float, metavar="N",
+                       help="stop the capture after N seconds")
+    group.add_argument("--profile-episodes", type=int, metavar="N",
+                       help="stop the capture after N episodes")
+    group.add_argument("--profile-dir", default="profiles", help="where captures are written")
+    group.add_argument("--profile-top", type=int, default=20, metavar="N",
+                       help="entries in the printed summary")
+    return group
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Plants vs Zombies - Replays
+A replay is the game seed plus the player's actions, so a whole game can be
+re-simulated from a few hundred bytes instead of recorded frames.
+
+    python src/pvz_replay.py record game.pvzr       # play, save on quit/restart
+    python src/pvz_replay.py play game.pvzr         # watch it again
+    python src/pvz_replay.py play game.pvzr -s 8    # ... at 8x speed
+    python src/pvz_replay.py check game.pvzr        # re-simulate headlessly
+"""
+
+import argparse
+import time
+
+import pygame
+
+import pvz_game
+from pvz_game import Game, FPS, PLANT_TYPES, GRID_ROWS
+
+# File layout, all integers unsigned LEB128 varints:
+#   MAGIC, VERSION byte, seed, worker, episode,
+#   then records of (tick delta, opcode, args...) ending with an END record
+#   whose tick delta leads to the final tick of the game
+MAGIC = b"PVZR"
+VERSION = 1
+
+OP_PLACE = 0  # args: plant type index, col * GRID_ROWS + row
+OP_COLLECT = 1  # args: index of the sun in the game's sun list
+OP_END = 255
+
+
+class ReplayError(ValueError):
+    """Raised for files that are not replays or do not match the game"""
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ReplayError("truncated replay")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class Replay:
+    """Seed plus the action log of one game, as (tick, action, *args) tuples"""
+
+    def __init__(self, seed, worker=0, episode=0, actions=(), end_tick=0):
+        self.seed = seed
+        self.worker = worker
+        self.episode = episode
+        self.actions = list(actions)
+        self.end_tick = end_tick
+
+    @classmethod
+    def from_game(cls, game):
+        return cls(game.seed, game.worker, game.episode, game.action_log, game.ticks)
+
+    def to_bytes(self):
+        out = bytearray(MAGIC)
+        out.append(VERSION)
+        for value in (self.seed, self.worker, self.episode):
+            _write_varint(out, value)
+
+        last = 0
+        for tick, action, *args in self.actions:
+            _write_varint(out, tick - last)
+            last = tick
+            if action == "place":
+                plant_type, col, row = args
+                out.append(OP_PLACE)
+                out.append(PLANT_TYPES.index(plant_type))
+                _write_varint(out, col * GRID_ROWS + row)
+            elif action == "collect":
+                out.append(OP_COLLECT)
+                _write_varint(out, args[0])
+            else:
+                raise ReplayError(f"unknown action {action!r}")
+
+        _write_varint(out, self.end_tick - last)
+        out.append(OP_END)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ReplayError("not a replay file")
+        pos = len(MAGIC)
+        if pos >= len(data) or data[pos] != VERSION:
+            raise ReplayError("unsupported replay version")
+        pos += 1
+        seed, pos = _read_varint(data, pos)
+        worker, pos = _read_varint(data, pos)
+        episode, pos = _read_varint(data, pos)
+
+        actions = []
+        tick = 0
+        while True:
+            delta, pos = _read_varint(data, pos)
+            tick += delta
+            if pos >= len(data):
+                raise ReplayError("truncated replay")
+            op = data[pos]
+            pos += 1
+            if op == OP_PLACE:
+                if pos >= len(data):
+                    raise ReplayError("truncated replay")
+                plant_type = PLANT_TYPES[data[pos]]
+                cell, pos = _read_varint(data, pos + 1)
+                actions.append((tick, "place", plant_type, cell // GRID_ROWS, cell % GRID_ROWS))
+            elif op == OP_COLLECT:
+                index, pos = _read_varint(data, pos)
+                actions.append((tick, "collect", index))
+            elif op == OP_END:
+                return cls(seed, worker, episode, actions, tick)
+            else:
+                raise ReplayError(f"unknown opcode {op}")
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+def apply_action(game, action):
+    """Re-issue one recorded action on `game`, which must be at its tick"""
+    tick, kind, *args = action
+    if kind == "place":
+        placed = game.place_plant(args[1], args[2], args[0])
+    else:
+        placed = args[0] < len(game.suns)
+        if placed:
+            game.collect_sun(game.suns[args[0]])
+    if not placed:
+        raise ReplayError(f"tick {tick}: {kind} {args} is not possible, replay out of sync")
+
+
+def run_replay(replay, until=None):
+    """Re-simulate a replay headlessly at full speed; returns the finished Game"""
+    until = replay.end_tick if until is None else until
+    game = Game(headless=True, seed=replay.seed, worker=replay.worker, episode=replay.episode)
+    for action in replay.actions:
+        if action[0] > until:
+            break
+        game.simulate(action[0])
+        if game.game_over:
+            break
+        apply_action(game, action)
+    game.simulate(until)
+    return game
+
+
+def play_replay(replay, speed=1.0):
+    """Render a replay in the game window, `speed` times faster than real time"""
+    pvz_game.open_display()
+    clock = pygame.time.Clock()
+    game = Game(seed=replay.seed, worker=replay.worker, episode=replay.episode)
+    actions = iter(replay.actions)
+    pending = next(actions, None)
+    budget = 0.0
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                game.paused = not game.paused
+
+        if not game.paused:
+            budget += speed
+            while budget >= 1 and game.ticks < replay.end_tick and not game.game_over:
+                while pending is not None and pending[0] == game.ticks:
+                    apply_action(game, pending)
+                    pending = next(actions, None)
+                game.update()
+                budget -= 1
+
+        game.draw()
+        pygame.display.flip()
+        clock.tick(FPS)
+
+    pygame.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay Plants vs Zombies games")
+    parser.add_argument("command", choices=["record", "play", "check"])
+    parser.add_argument("path", help="replay file")
+    parser.add_argument("-s", "--speed", type=float, default=1.0, help="playback speed for 'play'")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        pvz_game.main(on_game_end=lambda game: Replay.from_game(game).save(args.path))
+    elif args.command == "play":
+        play_replay(Replay.load(args.path), args.speed)
+    else:
+        replay = Replay.load(args.path)
+        start = time.perf_counter()
+        game = run_replay(replay)
+        elapsed = time.perf_counter() - start
+        print(f"{len(replay.actions)} actions, {replay.end_tick} ticks "
+              f"({replay.end_tick / FPS / 60:.1f} min) replayed in {elapsed:.3f}s")
+        print(f"Wave {game.wave} | Sun {game.sun_count} | Plants {len(game.plants)} | "
+              f"Zombies {len(game.zombies)} | {'Game over' if game.game_over else 'Alive'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+PVZ Vector Env - many headless games stepped in worker processes
+
+    env = VecEnv(num_envs=32, workers=8, seed=7)
+    obs = env.reset()                       # (num_envs, OBS_SIZE) float32
+    while training:
+        obs, rewards, dones = env.step(actions)   # actions: (num_envs,) ints, see Game.act
+        legal = env.masks                       # (num_envs, NUM_ACTIONS) bool, Game.action_mask
+    env.close()
+
+Each worker process owns a contiguous slice of the games. Observations,
+legal-action masks, rewards, done flags and actions live in
+multiprocessing.shared_memory arrays that the parent and the workers map
+directly; the pipes only carry one-word commands ("step", "reset", "close")
+and their acknowledgements, so no game state is ever pickled.
+
+A step applies each game's action, then runs it headlessly for
+`decision_ticks` ticks. A game that is lost or reaches `max_ticks` is done:
+its reward includes the loss, and it is replaced by the next episode of the
+same env at once, so `obs` already shows the new game. Env i plays episodes
+0, 1, 2, ... as worker i of `seed`, whatever the number of processes.
+
+Observation layout (OBS_SIZE floats):
+  sun, wave, suns on the lawn, live zombies        OBS_SCALARS
+  live zombies per row                             GRID_ROWS
+  the engine's cell planes, row-major              GRID_ROWS * GRID_COLS * len(PLANES)
+  (Game.observation: plant type, plant hp,
+  zombies, zombie hp, peas per cell)
+
+planes(obs) views the last part as a rows x cols x PLANES array.
+"""
+
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from pvz_game import (Game, AI_ACTION_TICKS, EVENT_KILLS, EVENT_WAVES_CLEARED, FPS, GRID_COLS,
+                      GRID_ROWS, NUM_ACTIONS, PLANES)
+
+OBS_SCALARS = ("sun", "wave", "suns", "zombies")
+OBS_ROWS = len(OBS_SCALARS)  # Offset of the per-row zombie counts
+OBS_PLANES = OBS_ROWS + GRID_ROWS  # Offset of the cell planes
+OBS_SIZE = OBS_PLANES + GRID_ROWS * GRID_COLS * len(PLANES)
+MAX_TICKS = 10 * 60 * FPS  # Ten minutes of game time per episode
+
+# Rewards: per kill, per wave reached, for losing
+KILL_REWARD = 1.0
+WAVE_REWARD = 5.0
+LOSS_REWARD = -50.0
+
+
+def planes(obs):
+    """The cell planes of an observation row (or rows), as [..., row, col, plane]"""
+    return obs[..., OBS_PLANES:].reshape(*obs.shape[:-1], GRID_ROWS, GRID_COLS, len(PLANES))
+
+
+def observe(game, out):
+    """Write `game`'s observation into the float32 row `out`"""
+    out[0] = game.sun_count
+    out[1] = game.wave
+    out[2] = game.suns_available
+    out[3] = game.live_zombies
+    out[OBS_ROWS:OBS_PLANES] = game.zombies_by_row
+    game.observation(planes(out))
+
+
+def step_game(game, action, decision_ticks=AI_ACTION_TICKS, max_ticks=MAX_TICKS):
+    """Act, run `decision_ticks` ticks; returns (reward, done)"""
+    before = game.events.copy()
+    game.act(action)
+    game.simulate(min(game.ticks + decision_ticks, max_ticks))
+    events = game.events - before
+    reward = KILL_REWARD * events[EVENT_KILLS] + WAVE_REWARD * events[EVENT_WAVES_CLEARED]
+    if game.game_over:
+        reward += LOSS_REWARD
+    return float(reward), game.game_over or game.ticks >= max_ticks
+
+
+class _Arrays:
+    """The shared arrays of one VecEnv, created by the parent and attached by workers"""
+
+    LAYOUT = {
+        "obs": (np.float32, (OBS_SIZE,)),
+        "masks": (np.bool_, (NUM_ACTIONS,)),
+        "rewards": (np.float32, ()),
+        "dones": (np.bool_, ()),
+        "actions": (np.int32, ()),
+        "episodes": (np.int64, ()),  # Episodes finished per env
+    }
+
+    def __init__(self, num_envs, names=None):
+        self.blocks = {}
+        for key, (dtype, shape) in self.LAYOUT.items():
+            shape = (num_envs, *shape)
+            if names is None:
+                size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+                block = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                block = shared_memory.SharedMemory(name=names[key])
+            self.blocks[key] = block
+            array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            if names is None:
+                array[...] = 0
+            setattr(self, key, array)
+
+    @property
+    def names(self):
+        return {key: block.name for key, block in self.blocks.items()}
+
+    def close(self, unlink=False):
+        for key in self.LAYOUT:
+            setattr(self, key, None)  # Views must go before the mapping closes
+        for block in self.blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+
+
+def _worker(conn, names, num_envs, envs, seed, decision_ticks, max_ticks):
+    """Worker loop: own games `envs` (a range) and serve commands until "close" """
+    arrays = _Arrays(num_envs, names)
+    games = {}
+
+    def new_game(i):
+        games[i] = Game(headless=True, seed=seed, worker=i, episode=int(arrays.episodes[i]))
+        publish(i)
+
+    def publish(i):
+        observe(games[i], arrays.obs[i])
+        arrays.masks[i] = games[i].action_mask
+
+    try:
+        while True:
+            command = conn.recv()
+            if command == "step":
+                for i in envs:
+                    reward, done = step_game(games[i], int(arrays.actions[i]), decision_ticks,
+                                             max_ticks)
+                    arrays.rewards[i] = reward
+                    arrays.dones[i] = done
+                    if done:
+                        arrays.episodes[i] += 1
+                        new_game(i)
+                    else:
+                        publish(i)
+            elif command == "reset":
+                for i in envs:
+                    new_game(i)
+            elif command == "close":
+                break
+            conn.send(command)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        arrays.close()
+        conn.close()
+
+
+class VecEnv:
+    """`num_envs` headless games stepped in lockstep by `workers` processes"""
+
+    def __init__(self, num_envs, workers=None, seed=0, decision_ticks=AI_ACTION_TICKS,
+                 max_ticks=MAX_TICKS, context=None):
+        workers = max(1, min(workers or os.cpu_count() or 1, num_envs))
+        self.num_envs = num_envs
+        self.seed = seed
+        self._arrays = _Arrays(num_envs)
+        self.obs = self._arrays.obs
+        self.masks = self._arrays.masks
+        self.rewards = self._arrays.rewards
+        self.dones = self._arrays.dones
+        self.actions = self._arrays.actions
+        self.episodes = self._arrays.episodes
+
+        ctx = multiprocessing.get_context(context)
+        self._conns = []
+        self._procs = []
+        bounds = np.linspace(0, num_envs, workers + 1).astype(int)
+        for w in range(workers):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_worker, name=f"pvz-env-{w}", daemon=True,
+                               args=(child, self._arrays.names, num_envs,
+                                     range(bounds[w], bounds[w + 1]), seed, decision_ticks,
+                                     max_ticks))
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+        self.closed = False
+
+    def _command(self, command):
+        for conn in self._conns:
+            conn.send(command)
+        for conn in self._conns:
+            if conn.recv() != command:
+                raise RuntimeError(f"vector env worker out of sync after {command!r}")
+
+    def reset(self):
+        """Start a game in every env; returns the observations"""
+        self._command("reset")
+        return self.obs
+
+    def step(self, actions):
+        """Apply one action per env; returns (obs, rewards, dones)
+
+        The arrays are shared and overwritten by the next step; copy what must
+        outlive it.
+        """
+        self.actions[:] = actions
+        self._command("step")
+        return self.obs, self.rewards, self.dones
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for conn in self._conns:
+            try:
+                conn.send("close")
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        for conn in self._conns:
+            conn.close()
+        self.obs = self.masks = self.rewards = self.dones = self.actions = self.episodes = None
+        self._arrays.close(unlink=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass